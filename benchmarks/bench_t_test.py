@@ -0,0 +1,111 @@
+"""Compare the current t_test() with the previous implementation.
+
+The previous implementation aggregated mean/var/count with three separate groupby passes,
+merged them, and called scipy.stats.ttest_ind_from_stats() row by row.
+
+usage: python -m benchmarks.bench_t_test --sample-size 1000000 --n-metric 50 --n-variant 5
+"""
+
+import argparse
+import time
+from typing import Callable
+
+import numpy as np
+import pandas as pd
+from scipy.stats import ttest_ind_from_stats
+
+from casual_inference.statistical_testing import t_test
+
+
+def legacy_t_test(data: pd.DataFrame, unit_col: str, variant_col: str, metrics: list[str]) -> pd.DataFrame:
+    if data.shape[0] != data[unit_col].nunique():
+        raise ValueError("passed dataframe hasn't been aggregated by the randomization unit.")
+    means = (
+        data.groupby(variant_col)[metrics].mean().stack().reset_index().rename(columns={"level_1": "metric", 0: "mean"})
+    )
+    vars = (
+        data.groupby(variant_col)[metrics].var().stack().reset_index().rename(columns={"level_1": "metric", 0: "var"})
+    )
+    counts = (
+        data.groupby(variant_col)[metrics]
+        .count()
+        .stack()
+        .reset_index()
+        .rename(columns={"level_1": "metric", 0: "count"})
+    )
+    stats = means.merge(vars, on=[variant_col, "metric"]).merge(counts, on=[variant_col, "metric"])
+    stats["std"] = np.sqrt(stats["var"])
+    stats["stderr"] = np.sqrt(stats["var"] / stats["count"])
+    stats = stats.merge(stats.loc[stats[variant_col] == 1], on="metric", suffixes=["", "_c"]).drop(
+        f"{variant_col}_c", axis=1
+    )
+    stats["abs_diff_mean"] = stats["mean"] - stats["mean_c"]
+    stats["abs_diff_std"] = np.sqrt(stats["stderr"] ** 2 + stats["stderr_c"] ** 2)
+    stats["rel_diff_mean"] = stats["mean"] / stats["mean_c"] - 1
+    stats["rel_diff_std"] = (
+        np.sqrt((stats["stderr"] ** 2 + (stats["mean"] ** 2 / stats["mean_c"] ** 2) * stats["stderr_c"] ** 2))
+        / stats["mean_c"]
+    )
+    stats["t_value"] = stats["abs_diff_mean"] / stats["abs_diff_std"]
+    stats["dof"] = stats["abs_diff_std"] ** 4 / (
+        stats["stderr"] ** 4 / (stats["count"] - 1) + stats["stderr_c"] ** 4 / (stats["count_c"] - 1)
+    )
+    stats["p_value"] = stats.apply(
+        lambda x: ttest_ind_from_stats(
+            mean1=x["mean"],
+            std1=x["std"],
+            nobs1=x["count"],
+            mean2=x["mean_c"],
+            std2=x["std_c"],
+            nobs2=x["count_c"],
+            equal_var=False,
+        ).pvalue,
+        axis=1,
+    )
+    return stats
+
+
+def make_data(sample_size: int, n_metric: int, n_variant: int, seed: int = 0) -> tuple[pd.DataFrame, list[str]]:
+    rng = np.random.default_rng(seed)
+    metrics = [f"metric_{i}" for i in range(n_metric)]
+    columns = {
+        "rand_unit": np.arange(sample_size),
+        "variant": rng.integers(low=1, high=n_variant + 1, size=sample_size),
+    }
+    for metric in metrics:
+        columns[metric] = rng.poisson(lam=1.0, size=sample_size).astype(np.float64)
+    return pd.DataFrame(columns), metrics
+
+
+def measure(func: Callable[[], pd.DataFrame], repeat: int) -> tuple[float, pd.DataFrame]:
+    best = np.inf
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sample-size", type=int, default=1_000_000)
+    parser.add_argument("--n-metric", type=int, default=50)
+    parser.add_argument("--n-variant", type=int, default=5)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    data, metrics = make_data(args.sample_size, args.n_metric, args.n_variant)
+    legacy_sec, legacy = measure(lambda: legacy_t_test(data, "rand_unit", "variant", metrics), args.repeat)
+    current_sec, current = measure(lambda: t_test(data, "rand_unit", "variant", metrics), args.repeat)
+
+    assert (legacy.columns == current.columns).all()
+    pd.testing.assert_frame_equal(legacy, current, check_exact=False, rtol=1e-9)
+
+    print(f"rows={args.sample_size} metrics={args.n_metric} variants={args.n_variant}")
+    print(f"legacy : {legacy_sec:.3f} sec")
+    print(f"current: {current_sec:.3f} sec")
+    print(f"speedup: {legacy_sec / current_sec:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
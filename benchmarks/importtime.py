@@ -0,0 +1,69 @@
+"""Measure the import time of the package, and guard it against heavy dependencies loaded at startup.
+
+Each module is imported in a fresh interpreter with `python -X importtime`, and its cumulative import time is
+reported with the slowest modules imported by it. Plotting (plotly), statsmodels and scipy.stats are loaded lazily
+by the methods using them, so importing them at startup is reported as a failure.
+The command exits with status 1 when the import time is over --budget-ms, or a heavy module is imported.
+
+usage:
+    python -m benchmarks.importtime --budget-ms 1500
+    python -m benchmarks.importtime --module casual_inference.evaluator.abtest --top 20
+"""
+
+import argparse
+import subprocess
+import sys
+
+MODULES = ["casual_inference", "casual_inference.evaluator", "casual_inference.dataset"]
+# top level packages (or modules) which shouldn't be imported at startup
+HEAVY_MODULES = ["plotly", "statsmodels", "patsy", "sklearn", "scipy.stats"]
+
+
+def import_times(module: str, repeat: int) -> tuple[dict[str, float], list[str]]:
+    """return the best cumulative import time (ms) of each module imported by importing the module,
+    and heavy modules imported by it."""
+    best: dict[str, float] = {}
+    code = f"import sys; import {module}; print('\\n'.join(sys.modules))"
+    for _ in range(repeat):
+        result = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", code], capture_output=True, text=True, check=True
+        )
+        for line in result.stderr.splitlines():
+            if not line.startswith("import time:") or "cumulative" in line:
+                continue
+            _, cumulative, name = line[len("import time:") :].split("|")
+            name = name.strip()
+            best[name] = min(best.get(name, float("inf")), int(cumulative) / 1000)
+    loaded = result.stdout.split()
+    heavy = [name for name in loaded if any(name == heavy or name.startswith(f"{heavy}.") for heavy in HEAVY_MODULES)]
+    return best, heavy
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--module", action="append", default=None, help="module to import, by default MODULES")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--top", type=int, default=10, help="the number of the slowest modules reported")
+    parser.add_argument("--budget-ms", type=float, default=None, help="allowed import time of each module")
+    args = parser.parse_args()
+
+    failures = []
+    for module in args.module or MODULES:
+        times, heavy = import_times(module, args.repeat)
+        print(f"{module:<40} {times[module]:9.1f} ms", file=sys.stderr)
+        slowest = sorted(((ms, name) for name, ms in times.items() if name != module), reverse=True)[: args.top]
+        for ms, name in slowest:
+            print(f"    {name:<50} {ms:9.1f} ms", file=sys.stderr)
+        if args.budget_ms is not None and times[module] > args.budget_ms:
+            failures.append(f"{module}: {times[module]:.1f} ms is over the budget {args.budget_ms:.1f} ms")
+        if heavy:
+            failures.append(f"{module}: imports heavy modules at startup, {', '.join(sorted(heavy)[:5])}")
+
+    for message in failures:
+        print(f"FAILURE {message}", file=sys.stderr)
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,245 @@
+"""Benchmark suite timing every evaluator, and recording peak memory.
+
+Inputs are generated by create_sample_ab_result() and create_sample_biased(), then widened to the number of metrics
+of each size. Each case is timed (the best of --repeat runs), then run again under tracemalloc to record peak memory.
+Results are written as JSON, so runs on different commits can be compared.
+
+When --baseline is passed, cases slower than the baseline by more than --threshold percent are reported,
+and the command exits with status 1.
+
+usage:
+    python -m benchmarks.suite --profile default --output bench.json
+    python -m benchmarks.suite --profile default --baseline bench.json --threshold 10
+"""
+
+import argparse
+import contextlib
+import datetime
+import gc
+import json
+import platform
+import re
+import subprocess
+import sys
+import time
+import tracemalloc
+from dataclasses import dataclass
+from typing import Any, Callable, Optional
+
+import numpy as np
+import pandas as pd
+
+from casual_inference.dataset import create_sample_ab_result, create_sample_biased
+from casual_inference.evaluator import (
+    AATestEvaluator,
+    ABTestEvaluator,
+    BootstrapEvaluator,
+    LinearRegressionEvaluator,
+    SampleSizeEvaluator,
+)
+from casual_inference.statistical_testing import t_test
+
+# (the number of rows, the number of metrics) of each profile
+PROFILES: dict[str, list[tuple[int, int]]] = {
+    "quick": [(10**4, 1), (10**4, 10)],
+    "default": [(10**5, 10), (10**6, 1), (10**6, 50)],
+    "production": [(10**7, 1), (10**7, 10), (10**6, 100), (10**5, 500)],
+}
+
+
+@dataclass
+class Case:
+    name: str
+    # build inputs of the measured function from (rows, n_metric), it's not measured.
+    setup: Callable[[int, int], Callable[[], Any]]
+    max_rows: int = 10**7
+
+
+def make_ab_data(rows: int, n_metric: int, seed: int = 0) -> tuple[pd.DataFrame, list[str]]:
+    """sample A/B test result having n_metric metrics. metrics other than the original two are noisy copies of them."""
+    data = create_sample_ab_result(n_variant=3, sample_size=rows, simulated_lift=[0.01, 0.02], random_state=seed)
+    rng = np.random.default_rng(seed + 1)
+    metrics = ["metric_bin", "metric_cont"][:n_metric]
+    for i in range(n_metric - len(metrics)):
+        base = data["metric_cont"].to_numpy(dtype=np.float64)
+        data[f"metric_{i}"] = base + rng.normal(size=rows)
+        metrics.append(f"metric_{i}")
+    return data, metrics
+
+
+def make_biased_data(rows: int, n_metric: int, seed: int = 0) -> tuple[pd.DataFrame, list[str]]:
+    """sample biased dataset having n_metric targets. targets other than the original one are noisy copies of it."""
+    data = create_sample_biased(sample_size=rows, random_state=seed)
+    rng = np.random.default_rng(seed + 1)
+    metrics = ["target"]
+    for i in range(n_metric - 1):
+        data[f"target_{i}"] = data["target"].to_numpy() + rng.normal(size=rows)
+        metrics.append(f"target_{i}")
+    return data, metrics
+
+
+def _setup_t_test(rows: int, n_metric: int) -> Callable[[], Any]:
+    data, metrics = make_ab_data(rows, n_metric)
+    return lambda: t_test(data, "rand_unit", "variant", metrics)
+
+
+def _setup_abtest(rows: int, n_metric: int) -> Callable[[], Any]:
+    data, metrics = make_ab_data(rows, n_metric)
+    return lambda: ABTestEvaluator().evaluate(data, "rand_unit", metrics)
+
+
+def _setup_abtest_segment(rows: int, n_metric: int) -> Callable[[], Any]:
+    data, metrics = make_ab_data(rows, n_metric)
+    return lambda: ABTestEvaluator().evaluate(data, "rand_unit", metrics, segment_col="segment_str")
+
+
+def _setup_abtest_summary_table(rows: int, n_metric: int) -> Callable[[], Any]:
+    data, metrics = make_ab_data(rows, n_metric)
+    evaluator = ABTestEvaluator().evaluate(data, "rand_unit", metrics, segment_col="segment_str")
+    return lambda: evaluator.summary_table()
+
+
+def _setup_aatest(rows: int, n_metric: int) -> Callable[[], Any]:
+    data, metrics = make_ab_data(rows, n_metric)
+    return lambda: AATestEvaluator(n_simulation=100, random_state=0).evaluate(data, "rand_unit", metrics)
+
+
+def _setup_bootstrap(rows: int, n_metric: int) -> Callable[[], Any]:
+    data, metrics = make_ab_data(rows, n_metric)
+    return lambda: BootstrapEvaluator(n_bootstrap=200, random_state=0).evaluate(data, "rand_unit", metrics)
+
+
+def _setup_samplesize(rows: int, n_metric: int) -> Callable[[], Any]:
+    data, metrics = make_ab_data(rows, n_metric)
+    return lambda: SampleSizeEvaluator().evaluate(data, "rand_unit", metrics)
+
+
+def _setup_linear_regression(rows: int, n_metric: int) -> Callable[[], Any]:
+    data, metrics = make_biased_data(rows, n_metric)
+    return lambda: LinearRegressionEvaluator().evaluate(
+        data, "unit", metrics, covariates=["covar_numer1", "covar_numer2", "covar_cat"]
+    )
+
+
+CASES = [
+    Case("t_test", _setup_t_test),
+    Case("abtest.evaluate", _setup_abtest),
+    Case("abtest.evaluate_segment", _setup_abtest_segment),
+    Case("abtest.summary_table", _setup_abtest_summary_table),
+    # 100 A/A tests on 10^7 rows take minutes, so it's measured up to 10^6 rows.
+    Case("aatest.evaluate", _setup_aatest, max_rows=10**6),
+    Case("bootstrap.evaluate", _setup_bootstrap, max_rows=10**6),
+    Case("samplesize.evaluate", _setup_samplesize),
+    Case("linear_regression.evaluate", _setup_linear_regression),
+]
+
+
+def measure(func: Callable[[], Any], repeat: int) -> tuple[float, float]:
+    """return the best elapsed seconds of repeated runs, and peak memory (MiB) of another run traced by tracemalloc."""
+    best = np.inf
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+
+    gc.collect()
+    tracemalloc.start()
+    try:
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return best, peak / 2**20
+
+
+def run(profile: str, repeat: int, pattern: Optional[str] = None) -> list[dict[str, Any]]:
+    results = []
+    for rows, n_metric in PROFILES[profile]:
+        for case in CASES:
+            if rows > case.max_rows or (pattern is not None and re.search(pattern, case.name) is None):
+                continue
+            # evaluators print warnings (e.g., SRM), keep stdout for the JSON result.
+            with contextlib.redirect_stdout(sys.stderr):
+                func = case.setup(rows, n_metric)
+                seconds, peak_memory_mb = measure(func, repeat)
+            del func
+            result = {
+                "name": case.name,
+                "rows": rows,
+                "n_metric": n_metric,
+                "seconds": seconds,
+                "peak_memory_mb": peak_memory_mb,
+            }
+            print(
+                f"{case.name:<28} rows={rows:<9} metrics={n_metric:<4} "
+                f"{seconds:9.3f} sec {peak_memory_mb:10.1f} MiB",
+                file=sys.stderr,
+            )
+            results.append(result)
+    return results
+
+
+def compare(results: list[dict[str, Any]], baseline: list[dict[str, Any]], threshold: float) -> list[str]:
+    """return messages of cases slower than the baseline by more than threshold percent."""
+    baseline_seconds = {(r["name"], r["rows"], r["n_metric"]): r["seconds"] for r in baseline}
+    regressions = []
+    for result in results:
+        key = (result["name"], result["rows"], result["n_metric"])
+        if key not in baseline_seconds:
+            continue
+        change = (result["seconds"] / baseline_seconds[key] - 1) * 100
+        if change > threshold:
+            regressions.append(
+                f"{result['name']} rows={result['rows']} metrics={result['n_metric']}: "
+                f"{baseline_seconds[key]:.3f} sec -> {result['seconds']:.3f} sec (+{change:.1f}%)"
+            )
+    return regressions
+
+
+def environment() -> dict[str, Any]:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "commit": commit,
+        "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "platform": platform.platform(),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--profile", choices=list(PROFILES.keys()), default="default")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--filter", default=None, help="regular expression selecting case names")
+    parser.add_argument("--output", default=None, help="path of the JSON result, by default stdout")
+    parser.add_argument("--baseline", default=None, help="path of the JSON result compared with")
+    parser.add_argument("--threshold", type=float, default=10.0, help="allowed slowdown in percent")
+    args = parser.parse_args()
+
+    results = run(args.profile, args.repeat, args.filter)
+    report = {"environment": environment(), "profile": args.profile, "repeat": args.repeat, "results": results}
+    if args.output is None:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    else:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if args.baseline is not None:
+        with open(args.baseline) as f:
+            baseline = json.load(f)["results"]
+        regressions = compare(results, baseline, args.threshold)
+        for message in regressions:
+            print(f"REGRESSION {message}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
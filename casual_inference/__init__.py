@@ -1 +1 @@
-__all__ = ["dataset", "evaluator", "statistical_testing"]
+__all__ = ["accumulator", "cache", "dataset", "evaluator", "sql", "statistical_testing", "validation"]
@@ -0,0 +1,409 @@
+from typing import Iterable, Optional
+
+import numpy as np
+import pandas as pd
+from typing_extensions import Self
+
+from .statistical_testing import (
+    RatioMetrics,
+    aggregate_comoments,
+    aggregate_moments,
+    delta_method,
+    metric_values,
+)
+
+
+class MomentAccumulator:
+    """Mergeable accumulator of count, mean and M2 (sum of squared deviations) of each metric per group.
+
+    Each update() aggregates a chunk of data and combines it with the accumulated moments by
+    the Chan et al. parallel algorithm, so the result doesn't depend on how the data was split.
+    Accumulators built on different shards (or processes) can be combined by merge().
+    Ratio metrics accumulate the co-moment (sum of cross deviations) of the numerator and denominator as well.
+    See: https://en.wikipedia.org/wiki/Algorithms_for_calculating_variance#Parallel_algorithm
+
+    Attributes
+    ----------
+    moments : pd.DataFrame
+        A long DataFrame has group columns, "metric", "count", "mean" and "m2" columns.
+    comoments : pd.DataFrame
+        A long DataFrame of ratio metrics has group columns, "metric", "count", "mean_num", "mean_den",
+        "m2_num", "m2_den" and "c" (co-moment) columns.
+    """
+
+    def __init__(self, group_cols: list[str], metrics: list[str], ratio_metrics: Optional[RatioMetrics] = None) -> None:
+        """
+        Parameters
+        ----------
+        group_cols : list[str]
+            Columns used as the group keys. e.g., [variant_col], [variant_col, segment_col]
+        metrics : list[str]
+            Columns stores metrics you want to aggregate.
+        ratio_metrics : Optional[dict[str, tuple[str, str]]], optional
+            Ratio metrics, mapping from the name to (numerator column, denominator column), by default None
+        """
+        ratio_metrics = ratio_metrics or {}
+        if len(metrics) == 0 and len(ratio_metrics) == 0:
+            raise ValueError("metrics hasn't been specified.")
+        self.group_cols = list(group_cols)
+        self.metrics = list(metrics)
+        self.ratio_metrics = dict(ratio_metrics)
+        self.moments: pd.DataFrame = pd.DataFrame(columns=self.group_cols + ["metric"] + _MOMENT_COLS)
+        self.comoments: pd.DataFrame = pd.DataFrame(columns=self.group_cols + ["metric"] + _COMOMENT_COLS)
+
+    def update(self, data: pd.DataFrame) -> Self:
+        """aggregate a chunk of data and fold it into the accumulated moments.
+
+        Parameters
+        ----------
+        data : pd.DataFrame
+            A chunk has group columns and metrics columns.
+
+        Returns
+        -------
+        self : object
+            Accumulator storing updated moments.
+        """
+        if len(self.metrics) > 0:
+            chunk = aggregate_moments(data, self.group_cols, self.metrics)
+            chunk["m2"] = chunk["var"].fillna(0.0) * np.maximum(chunk["count"] - 1, 0)
+            self.moments = self._combine(self.moments, chunk.drop(columns="var"), self.metrics, _MOMENT_COLS)
+        if len(self.ratio_metrics) > 0:
+            chunk = aggregate_comoments(data, self.group_cols, self.ratio_metrics)
+            dof = np.maximum(chunk["count"] - 1, 0)
+            chunk["m2_num"] = chunk["var_num"].fillna(0.0) * dof
+            chunk["m2_den"] = chunk["var_den"].fillna(0.0) * dof
+            chunk["c"] = chunk["cov"].fillna(0.0) * dof
+            chunk = chunk.drop(columns=["var_num", "var_den", "cov"])
+            self.comoments = self._combine(self.comoments, chunk, list(self.ratio_metrics), _COMOMENT_COLS)
+        return self
+
+    def update_chunks(self, chunks: Iterable[pd.DataFrame]) -> Self:
+        """call update() with each chunk. e.g., pd.read_csv(..., chunksize=100000)"""
+        for chunk in chunks:
+            self.update(chunk)
+        return self
+
+    def merge(self, other: "MomentAccumulator") -> Self:
+        """combine moments accumulated by another accumulator. (e.g., built on another shard)
+
+        Parameters
+        ----------
+        other : MomentAccumulator
+            An accumulator has the same group columns and metrics.
+
+        Returns
+        -------
+        self : object
+            Accumulator storing merged moments.
+        """
+        if (
+            self.group_cols != other.group_cols
+            or set(self.metrics) != set(other.metrics)
+            or self.ratio_metrics != other.ratio_metrics
+        ):
+            raise ValueError("accumulators having different group columns or metrics can't be merged.")
+        if len(self.metrics) > 0:
+            self.moments = self._combine(self.moments, other.moments, self.metrics, _MOMENT_COLS)
+        if len(self.ratio_metrics) > 0:
+            self.comoments = self._combine(self.comoments, other.comoments, list(self.ratio_metrics), _COMOMENT_COLS)
+        return self
+
+    def to_frame(self) -> pd.DataFrame:
+        """return accumulated moments as mean, variance and count.
+
+        Returns
+        -------
+        pd.DataFrame
+            A DataFrame has the same schema with the returned value of aggregate_moments().
+            Ratio metrics are converted by the delta method, and follow the ordinary metrics in each group.
+        """
+        moments = self.moments.loc[:, self.group_cols + ["metric", "mean"]].copy()
+        count = self.moments["count"].to_numpy(dtype=np.int64)
+        moments["var"] = _unbias(self.moments["m2"], count)
+        moments["count"] = count
+        if len(self.ratio_metrics) > 0:
+            comoments = self.comoments.loc[:, self.group_cols + ["metric", "count", "mean_num", "mean_den"]].copy()
+            count = self.comoments["count"].to_numpy(dtype=np.int64)
+            for col, comoment in [("var_num", "m2_num"), ("var_den", "m2_den"), ("cov", "c")]:
+                comoments[col] = _unbias(self.comoments[comoment], count)
+            comoments["count"] = count
+            moments = pd.concat([moments, delta_method(comoments)], ignore_index=True)
+            if len(self.group_cols) > 0:
+                moments = moments.sort_values(self.group_cols, kind="stable")
+        moments["metric"] = moments["metric"].astype(object)
+        return moments.reset_index(drop=True)
+
+    def _combine(
+        self, current: pd.DataFrame, moments: pd.DataFrame, metrics: list[str], cols: list[str]
+    ) -> pd.DataFrame:
+        merged = pd.concat([current, moments], ignore_index=True) if current.shape[0] > 0 else moments
+        merged = merged.astype({"metric": pd.CategoricalDtype(metrics)})
+
+        # metric is a categorical having the passed order, so rows keep the order of aggregate_moments().
+        grouped = merged.groupby(self.group_cols + ["metric"], observed=True, sort=True)
+        combined = grouped.size().index.to_frame(index=False)
+        codes = grouped.ngroup().to_numpy()
+        n_group = combined.shape[0]
+
+        count = merged["count"].to_numpy(dtype=np.float64)
+        total = np.bincount(codes, weights=count, minlength=n_group)
+        combined["count"] = total.astype(np.int64)
+        deviations = {}
+        for col in [col for col in cols if col.startswith("mean")]:
+            mean = np.nan_to_num(merged[col].to_numpy(dtype=np.float64))
+            with np.errstate(divide="ignore", invalid="ignore"):
+                pooled_mean = np.bincount(codes, weights=count * mean, minlength=n_group) / total
+            deviations[col] = np.where(count > 0, mean - pooled_mean[codes], 0.0)
+            combined[col] = np.where(total > 0, pooled_mean, np.nan)
+        for col, (mean_a, mean_b) in _SECOND_MOMENTS.items():
+            if col in cols:
+                second = merged[col].to_numpy(dtype=np.float64) + count * deviations[mean_a] * deviations[mean_b]
+                combined[col] = np.bincount(codes, weights=second, minlength=n_group)
+        return combined
+
+
+class UnitAccumulator:
+    """Accumulator of per-unit sums of metrics over increments of data (e.g., daily data of a running experiment),
+    where the same unit can appear in many increments.
+
+    The sum of each metric is kept for each unit, and the count, sum and sum of squares of them are kept per group.
+    When a unit returns, its previous sum is replaced with the new one in the group statistics,
+    so each update() costs O(rows of the increment) besides looking up the units (O(log(units)) each),
+    amortized over updates, instead of re-aggregating the whole cumulative data. The statistics are the same with aggregate_moments() on the data
+    aggregated by the unit. The accumulator can be persisted by pickle between runs.
+
+    Attributes
+    ----------
+    n_units : int
+        The number of units accumulated.
+    """
+
+    def __init__(self, unit_col: str, group_cols: list[str], metrics: list[str]) -> None:
+        """
+        Parameters
+        ----------
+        unit_col : str
+            A column name stores the randomization unit. something like user_id, session_id, ...
+        group_cols : list[str]
+            Columns used as the group keys, which shouldn't change for each unit. e.g., [variant_col]
+        metrics : list[str]
+            Columns stores metrics you want to aggregate. Missing values are regarded as 0 in the sum.
+        """
+        if len(metrics) == 0:
+            raise ValueError("metrics hasn't been specified.")
+        self.unit_col = unit_col
+        self.group_cols = list(group_cols)
+        self.metrics = list(metrics)
+        n_metric = len(self.metrics)
+
+        # per-unit buffers in the order of their first appearance. only the first _n_units rows are used,
+        # and the capacity is doubled when it's full, so appending new units doesn't copy all units every update.
+        self._n_units = 0
+        self._units = np.empty(0)
+        self._unit_groups = np.empty(0, dtype=np.intp)
+        self._unit_sums = np.empty((0, n_metric))
+        # sorted runs of (units, positions) to look up positions by binary search. a new run is merged with the
+        # smaller runs before it (like a binary counter), so each unit is merged O(log(units)) times in total,
+        # while a single sorted array would be copied entirely whenever new units come.
+        self._runs: list[tuple[np.ndarray, np.ndarray]] = []
+        self._group_codes: dict[tuple, int] = {}
+        # statistics of per-unit sums per group. sums are shifted by the first observed mean to keep the precision.
+        self._shift = np.zeros(n_metric)
+        self._count = np.empty(0, dtype=np.int64)
+        self._sum = np.empty((0, n_metric))
+        self._sum_sq = np.empty((0, n_metric))
+
+    @property
+    def n_units(self) -> int:
+        return self._n_units
+
+    def update(self, data: pd.DataFrame) -> Self:
+        """fold an increment of data into the per-unit sums and the group statistics.
+
+        Parameters
+        ----------
+        data : pd.DataFrame
+            An increment has unit column, group columns and metrics columns.
+            It doesn't have to be aggregated by the unit, the rows of the same unit are summed up.
+
+        Returns
+        -------
+        self : object
+            Accumulator storing updated statistics.
+        """
+        for col in [self.unit_col] + self.group_cols + self.metrics:
+            if col not in data.columns:
+                raise ValueError(f"Necessary column does not exist: {col}")
+        if data.shape[0] == 0:
+            return self
+
+        unit_codes, unique_units = pd.factorize(data[self.unit_col])
+        units = np.asarray(unique_units)
+        if (unit_codes < 0).any():
+            raise ValueError("unit column has missing values.")
+        row_groups = self._encode_groups(data)
+        n_unit = units.shape[0]
+        groups = np.empty(n_unit, dtype=np.intp)
+        groups[unit_codes] = row_groups
+        if (groups[unit_codes] != row_groups).any():
+            raise ValueError("a unit is assigned to more than one group.")
+
+        sums = np.empty((n_unit, len(self.metrics)))
+        for j, metric in enumerate(self.metrics):
+            values = np.nan_to_num(metric_values(data[metric]).astype(np.float64, copy=False))
+            sums[:, j] = np.bincount(unit_codes, weights=values, minlength=n_unit)
+        if self.n_units == 0:
+            self._shift = sums.mean(axis=0)
+
+        position = self._lookup(units)
+        returning = position >= 0
+        if (self._unit_groups[position[returning]] != groups[returning]).any():
+            raise ValueError("a unit is assigned to a different group from the previous data.")
+
+        # the previous sums of returning units are replaced with the new ones in the group statistics.
+        previous = self._unit_sums[position[returning]]
+        sums[returning] += previous
+        self._add(groups[returning], previous, sign=-1.0)
+        self._add(groups, sums, sign=1.0)
+        self._count += np.bincount(groups[~returning], minlength=self._count.shape[0])
+
+        self._unit_sums[position[returning]] = sums[returning]
+        if not returning.all():
+            self._append(units[~returning], groups[~returning], sums[~returning])
+        return self
+
+    def to_frame(self) -> pd.DataFrame:
+        """return mean, variance and count of per-unit sums of each metric per group.
+
+        Returns
+        -------
+        pd.DataFrame
+            A DataFrame has the same schema with the returned value of aggregate_moments().
+        """
+        keys = self._group_keys()
+        order = keys.sort_values(self.group_cols, kind="stable").index.to_numpy() if self.group_cols else keys.index
+        n_group, n_metric = len(order), len(self.metrics)
+
+        count = np.repeat(self._count[order], n_metric).reshape(n_group, n_metric)
+        sum_, sum_sq = self._sum[order], self._sum_sq[order]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            mean = np.where(count > 0, self._shift + sum_ / count, np.nan)
+            var = np.where(count > 1, np.maximum(sum_sq - sum_**2 / count, 0.0) / (count - 1), np.nan)
+
+        moments = keys.loc[np.repeat(order, n_metric)].reset_index(drop=True)
+        moments["metric"] = np.tile(np.asarray(self.metrics, dtype=object), n_group)
+        moments["mean"] = mean.ravel()
+        moments["var"] = var.ravel()
+        moments["count"] = count.ravel()
+        return moments
+
+    def unit_sums(self) -> pd.DataFrame:
+        """return the accumulated sums of metrics of each unit, indexed by the unit, with group columns."""
+        n = self._n_units
+        sums = self._group_keys().loc[self._unit_groups[:n]].set_axis(pd.Index(self._units[:n], name=self.unit_col))
+        for j, metric in enumerate(self.metrics):
+            sums[metric] = self._unit_sums[:n, j]
+        return sums
+
+    def _lookup(self, units: np.ndarray) -> np.ndarray:
+        """return positions of units in the accumulated ones, -1 for new units."""
+        position = np.full(units.shape[0], -1, dtype=np.intp)
+        if self.n_units == 0:
+            return position
+        # units are searched in the sorted order, it's much more cache friendly than searching in random order.
+        order = np.argsort(units)
+        sorted_units = units[order]
+        for run_units, run_positions in self._runs:
+            index = np.minimum(np.searchsorted(run_units, sorted_units), run_units.shape[0] - 1)
+            found = run_units[index] == sorted_units
+            position[order[found]] = run_positions[index[found]]
+        return position
+
+    def _append(self, units: np.ndarray, groups: np.ndarray, sums: np.ndarray) -> None:
+        """append new units to the per-unit buffers and the sorted runs."""
+        start, stop = self._n_units, self._n_units + units.shape[0]
+        dtype = units.dtype if start == 0 else np.promote_types(self._units.dtype, units.dtype)
+        if stop > self._units.shape[0] or dtype != self._units.dtype:
+            capacity = max(stop, 2 * self._units.shape[0])
+            self._units = _resized(self._units[:start], capacity, dtype)
+            self._unit_groups = _resized(self._unit_groups[:start], capacity, self._unit_groups.dtype)
+            self._unit_sums = _resized(self._unit_sums[:start], capacity, self._unit_sums.dtype)
+        self._units[start:stop] = units
+        self._unit_groups[start:stop] = groups
+        self._unit_sums[start:stop] = sums
+        self._n_units = stop
+
+        order = np.argsort(units)
+        run_units, run_positions = units[order], np.arange(start, stop)[order]
+        while len(self._runs) > 0 and self._runs[-1][0].shape[0] <= 2 * run_units.shape[0]:
+            previous_units, previous_positions = self._runs.pop()
+            merged_units = np.concatenate([previous_units, run_units])
+            # both are sorted, so the stable sort detects the two runs and merges them in linear time
+            order = np.argsort(merged_units, kind="stable")
+            run_units, run_positions = merged_units[order], np.concatenate([previous_positions, run_positions])[order]
+        self._runs.append((run_units, run_positions))
+
+    def _group_keys(self) -> pd.DataFrame:
+        """return group keys in the order of their codes."""
+        return pd.DataFrame(list(self._group_codes), columns=self.group_cols, index=range(len(self._group_codes)))
+
+    def _encode_groups(self, data: pd.DataFrame) -> np.ndarray:
+        """return the code of the group of each row. codes of groups appearing first are appended."""
+        if len(self.group_cols) == 0:
+            codes = np.zeros(data.shape[0], dtype=np.intp)
+            keys: list[tuple] = [()]
+        else:
+            # each column is factorized, then the combinations observed (a few) are numbered.
+            factorized = [pd.factorize(data[col]) for col in self.group_cols]
+            if any((col_codes < 0).any() for col_codes, _ in factorized):
+                raise ValueError("group columns have missing values.")
+            combined = np.ravel_multi_index(
+                [col_codes for col_codes, _ in factorized], [len(uniques) for _, uniques in factorized]
+            )
+            observed, codes = np.unique(combined, return_inverse=True)
+            unraveled = np.unravel_index(observed, [len(uniques) for _, uniques in factorized])
+            keys = list(zip(*[uniques[i].tolist() for (_, uniques), i in zip(factorized, unraveled)]))
+        mapping = np.empty(len(keys), dtype=np.intp)
+        for i, key in enumerate(keys):
+            if key not in self._group_codes:
+                self._group_codes[key] = len(self._group_codes)
+            mapping[i] = self._group_codes[key]
+
+        n_new = len(self._group_codes) - self._count.shape[0]
+        if n_new > 0:
+            n_metric = len(self.metrics)
+            self._count = np.concatenate([self._count, np.zeros(n_new, dtype=np.int64)])
+            self._sum = np.vstack([self._sum, np.zeros((n_new, n_metric))])
+            self._sum_sq = np.vstack([self._sum_sq, np.zeros((n_new, n_metric))])
+        return mapping[codes]
+
+    def _add(self, groups: np.ndarray, sums: np.ndarray, sign: float) -> None:
+        n_group = self._count.shape[0]
+        shifted = sums - self._shift
+        for j in range(shifted.shape[1]):
+            self._sum[:, j] += sign * np.bincount(groups, weights=shifted[:, j], minlength=n_group)
+            self._sum_sq[:, j] += sign * np.bincount(groups, weights=shifted[:, j] ** 2, minlength=n_group)
+
+
+_MOMENT_COLS = ["count", "mean", "m2"]
+_COMOMENT_COLS = ["count", "mean_num", "mean_den", "m2_num", "m2_den", "c"]
+# second moment column -> the mean columns of the deviations multiplied
+_SECOND_MOMENTS = {
+    "m2": ("mean", "mean"),
+    "m2_num": ("mean_num", "mean_num"),
+    "m2_den": ("mean_den", "mean_den"),
+    "c": ("mean_num", "mean_den"),
+}
+
+
+def _unbias(m2: pd.Series, count: np.ndarray) -> np.ndarray:
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(count > 1, m2.to_numpy(dtype=np.float64) / (count - 1), np.nan)
+
+
+def _resized(values: np.ndarray, capacity: int, dtype: np.dtype) -> np.ndarray:
+    """return a buffer of the capacity (along the first axis), starting with the values."""
+    buffer = np.empty((capacity,) + values.shape[1:], dtype=dtype)
+    buffer[: values.shape[0]] = values
+    return buffer
@@ -0,0 +1,185 @@
+import hashlib
+import os
+import pickle
+import tempfile
+from collections import OrderedDict
+from typing import Any, Optional, Union
+
+import pandas as pd
+
+from .native import NativeFrame, column, is_native_frame, to_polars
+
+# bumped when the layout of cached results changes, so results cached by older versions are never restored.
+CACHE_VERSION = 1
+
+
+def fingerprint(data: Union[pd.DataFrame, NativeFrame], columns: list[str], **params: Any) -> str:
+    """return a content-addressed key of an evaluation, calculated from the columns used by it and its parameters.
+
+    Values of each column are hashed by pd.util.hash_pandas_object (without the index), so the key doesn't depend on
+    the other columns or the index of the data. Columns not in the data are skipped, the evaluation reports them.
+
+    Parameters
+    ----------
+    data : Union[pd.DataFrame, pyarrow.Table, polars.DataFrame]
+        Data passed to the evaluation.
+    columns : list[str]
+        Columns used by the evaluation. e.g., the unit, variant, segment and metrics columns.
+    **params : Any
+        Parameters affecting the result, e.g., arguments of evaluate() and the evaluator.
+        They're identified by their repr, so they should be built-in values like str, float, list and dict.
+
+    Returns
+    -------
+    str
+        hex digest of SHA-256.
+    """
+    digest = hashlib.sha256(repr((CACHE_VERSION, data.shape[0], sorted(params.items()))).encode())
+    names = to_polars(data).columns if is_native_frame(data) else data.columns
+    for col in dict.fromkeys(columns):
+        if col not in names:
+            continue
+        values = column(data, col) if is_native_frame(data) else data[col]
+        digest.update(f"{col!r}:{values.dtype!r}".encode())
+        digest.update(pd.util.hash_pandas_object(values, index=False).to_numpy().tobytes())
+    return digest.hexdigest()
+
+
+class ResultCache:
+    """cache of evaluation results keyed by fingerprint(), with an in-memory LRU tier and an optional on-disk tier.
+
+    Results are stored as pickled bytes, so a result restored from the cache is a copy,
+    and modifying an evaluator doesn't affect the cached one.
+    The on-disk tier can be shared by processes (e.g., workers of a dashboard), and the least recently used files
+    are removed when the total size is over max_disk_mb.
+    The directory must be trusted: files are restored by pickle.loads, which can execute arbitrary code,
+    so it should be writable only by the processes sharing the cache.
+
+    e.g.,
+        cache = ResultCache(directory="/var/cache/casual_inference")
+        evaluator = AATestEvaluator(random_state=0)
+        evaluator.result_cache = cache
+        evaluator.evaluate(data, unit_col="user_id", metrics=["purchases"])  # loaded when evaluated before
+    """
+
+    def __init__(self, max_entries: int = 32, directory: Optional[str] = None, max_disk_mb: float = 1024.0) -> None:
+        """initialize tiers of the cache.
+
+        Parameters
+        ----------
+        max_entries : int, optional
+            The number of results kept in memory, by default 32
+        directory : Optional[str], optional
+            Directory storing results on disk, by default None (memory only)
+            It's created when it doesn't exist.
+        max_disk_mb : float, optional
+            Upper bound of the total size of files in the directory, by default 1024.0
+        """
+        if max_entries <= 0:
+            raise ValueError("max_entries should be positive number.")
+        if max_disk_mb <= 0:
+            raise ValueError("max_disk_mb should be positive number.")
+
+        self.max_entries = max_entries
+        self.directory = directory
+        self.max_disk_mb = max_disk_mb
+        self.hits = 0
+        self.misses = 0
+        self._memory: OrderedDict[str, bytes] = OrderedDict()
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+
+    def __len__(self) -> int:
+        return len(self._memory)
+
+    def get(self, key: str) -> Optional[dict[str, Any]]:
+        """return the result stored for the key, or None. A result found on disk is promoted to the memory tier."""
+        payload = self._memory.get(key)
+        if payload is not None:
+            self._memory.move_to_end(key)
+        elif self.directory is not None:
+            payload = self._read(key)
+            if payload is not None:
+                self._remember(key, payload)
+        if payload is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return pickle.loads(payload)
+
+    def put(self, key: str, result: dict[str, Any]) -> None:
+        """store the result (mapping from attribute names of the evaluator to their values) for the key."""
+        payload = pickle.dumps(result, protocol=pickle.HIGHEST_PROTOCOL)
+        self._remember(key, payload)
+        if self.directory is not None:
+            self._write(key, payload)
+            self._evict_files()
+
+    def clear(self) -> None:
+        """remove all results from the memory tier and the directory."""
+        self._memory.clear()
+        for path, _, _ in self._files():
+            _remove(path)
+
+    def _remember(self, key: str, payload: bytes) -> None:
+        self._memory[key] = payload
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(str(self.directory), f"{key}.pkl")
+
+    def _read(self, key: str) -> Optional[bytes]:
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                payload = f.read()
+            # the modification time is used as the last access time of the LRU eviction.
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return payload
+
+    def _write(self, key: str, payload: bytes) -> None:
+        # written into a temporary file then renamed, so other processes never read a partially written file.
+        fd, temp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(payload)
+            os.replace(temp_path, self._path(key))
+        except BaseException:
+            _remove(temp_path)
+            raise
+
+    def _files(self) -> list[tuple[str, float, int]]:
+        """(path, modification time, size) of each result file in the directory. Empty when it's memory only."""
+        files: list[tuple[str, float, int]] = []
+        if self.directory is None:
+            return files
+        for entry in os.scandir(str(self.directory)):
+            if not entry.name.endswith(".pkl"):
+                continue
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            files.append((entry.path, stat.st_mtime, stat.st_size))
+        return files
+
+    def _evict_files(self) -> None:
+        files = sorted(self._files(), key=lambda file: file[1])
+        total = sum(size for _, _, size in files)
+        budget = self.max_disk_mb * 2**20
+        for path, _, size in files:
+            if total <= budget:
+                break
+            _remove(path)
+            total -= size
+
+
+def _remove(path: str) -> None:
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
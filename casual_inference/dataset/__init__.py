@@ -1,4 +1,11 @@
-from .sample_abtest import create_sample_ab_result
-from .sample_biased import create_sample_biased
+from .sample_abtest import create_sample_ab_result, generate_ab_chunks
+from .sample_biased import create_sample_biased, generate_biased_chunks
+from .writer import write_chunks
 
-__all__ = ["create_sample_ab_result", "create_sample_biased"]
+__all__ = [
+    "create_sample_ab_result",
+    "create_sample_biased",
+    "generate_ab_chunks",
+    "generate_biased_chunks",
+    "write_chunks",
+]
@@ -1,11 +1,25 @@
+from typing import Callable, Iterator, Optional, Union
+
 import numpy as np
 import pandas as pd
+from scipy import special
+
+RandomState = Optional[Union[int, np.random.Generator]]
 
 
 def create_sample_ab_result(
-    n_variant: int = 2, sample_size: int = 1000, metric_base: float = 0.1, simulated_lift: list[float] = []
+    n_variant: int = 2,
+    sample_size: int = 1000,
+    metric_base: float = 0.1,
+    simulated_lift: list[float] = [],
+    random_state: RandomState = None,
 ) -> pd.DataFrame:
     """
+    Parameters
+    ----------
+    random_state : Optional[Union[int, np.random.Generator]], optional
+        Seed or generator of random numbers, by default None
+
     Returns
     -------
     pd.DataFrame
@@ -17,26 +31,147 @@ def create_sample_ab_result(
             - segment_str: simulated unit group defined in advance. Used for more detailed analysis.
             - segment_numer: simulated metrics that hasn't been divided by groups want to use more detailed analysis.
     """
+    chunks = generate_ab_chunks(
+        sample_size=sample_size,
+        chunk_size=max(sample_size, 1),
+        n_variant=n_variant,
+        metric_base=metric_base,
+        simulated_lift=simulated_lift,
+        random_state=random_state,
+    )
+    return next(chunks)
+
+
+def generate_ab_chunks(
+    sample_size: int,
+    chunk_size: int = 1_000_000,
+    n_variant: int = 2,
+    metric_base: float = 0.1,
+    simulated_lift: list[float] = [],
+    metrics: Optional[dict[str, str]] = None,
+    pre_period_corr: Optional[float] = None,
+    random_state: RandomState = None,
+) -> Iterator[pd.DataFrame]:
+    """Generate sample A/B test result as a stream of DataFrame chunks, so the whole data doesn't need to fit in memory.
+    Each chunk draws random numbers from its own generator spawned from random_state,
+    so the result is reproducible with the same seed and chunk_size.
+
+    Parameters
+    ----------
+    sample_size : int
+        The number of randomization units in total.
+    chunk_size : int, optional
+        The number of rows in each chunk, by default 1_000_000
+    n_variant : int, optional
+        The number of variants including the control, by default 2
+    metric_base : float, optional
+        The base rate of metrics in the control variant, by default 0.1
+    simulated_lift : list[float], optional
+        The relative lift of each treatment variant, by default 0.05, 0.10, ... for each treatment variant.
+    metrics : Optional[dict[str, str]], optional
+        Mapping from metric names to metric families, by default {"metric_bin": "binary", "metric_cont": "count"}
+        Available families are as follows
+            - binary: Bernoulli with the probability metric_base. e.g., Click, Purchase, ...
+            - count: Poisson with the mean metric_base * 10. e.g., Clicks, Purchases, ...
+            - heavy_tailed: Log-normal with the mean metric_base * 10. e.g., Revenue, Dwell time, ...
+            - zero_inflated: heavy_tailed, but 80% of units are 0. e.g., Revenue of mostly non-paying users
+            - ratio: "{name}_num" and "{name}_den" columns. e.g., Clicks / Sessions
+    pre_period_corr : Optional[float], optional
+        When it's specified, "{column}_pre" columns of pre-period metrics are added, by default None
+        Pre-period metrics have the passed correlation with the metrics (on the latent normal scale), and no lift.
+    random_state : Optional[Union[int, np.random.Generator]], optional
+        Seed or generator of random numbers, by default None
+
+    Yields
+    ------
+    pd.DataFrame
+        Chunk has the same columns with create_sample_ab_result(), but metric columns follow the metrics argument.
+    """
     if n_variant <= 1:
         raise ValueError("n_variant should be more than or equal 2.")
     if len(simulated_lift) >= 1 and len(simulated_lift) != n_variant - 1:
         raise ValueError("The length of simulated_lift doesn't equal to the number of treatment variants.")
+    if chunk_size <= 0:
+        raise ValueError("chunk_size should be positive number.")
+    if pre_period_corr is not None and not -1.0 <= pre_period_corr <= 1.0:
+        raise ValueError("pre_period_corr should be in [-1, 1].")
+    if metrics is None:
+        metrics = {"metric_bin": "binary", "metric_cont": "count"}
+    for family in metrics.values():
+        if family not in METRIC_FAMILIES:
+            raise ValueError(f"Specified metric family {family} is invalid.")
+
+    # lift of the control variant is inserted for convenience. (without modifying the passed list)
+    lifts = np.array([0.0] + (list(simulated_lift) or [0.05 * i for i in range(1, n_variant)]))
+
+    n_chunk = max(-(-sample_size // chunk_size), 1)
+    generators = np.random.default_rng(random_state).spawn(n_chunk)
+    for i, rng in enumerate(generators):
+        offset = i * chunk_size
+        size = min(chunk_size, sample_size - offset)
+
+        chunk = pd.DataFrame()
+        chunk["rand_unit"] = np.arange(offset, offset + size)
+        chunk["variant"] = rng.integers(low=1, high=n_variant + 1, size=size)
+        chunk["segment_str"] = np.array(["1", "2", "3"], dtype=object)[rng.choice(3, p=[0.7, 0.2, 0.1], size=size)]
+        chunk["segment_numer"] = rng.uniform(size=size)
+
+        lift = lifts[chunk["variant"].to_numpy() - 1]
+        for name, family in metrics.items():
+            latent = rng.standard_normal(size=size)
+            for col, values in METRIC_FAMILIES[family](name, latent, metric_base * (1 + lift), rng).items():
+                chunk[col] = values
+            if pre_period_corr is not None:
+                noise = rng.standard_normal(size=size)
+                latent_pre = pre_period_corr * latent + np.sqrt(1 - pre_period_corr**2) * noise
+                for col, values in METRIC_FAMILIES[family](name, latent_pre, np.full(size, metric_base), rng).items():
+                    chunk[f"{col}_pre"] = values
+        yield chunk
+
+
+def _binary(name: str, latent: np.ndarray, base: np.ndarray, rng: np.random.Generator) -> dict[str, np.ndarray]:
+    return {name: (special.ndtr(latent) < base).astype(np.int64)}
+
+
+def _count(name: str, latent: np.ndarray, base: np.ndarray, rng: np.random.Generator) -> dict[str, np.ndarray]:
+    return {name: _poisson_quantile(special.ndtr(latent), base * 10)}
+
+
+def _heavy_tailed(name: str, latent: np.ndarray, base: np.ndarray, rng: np.random.Generator) -> dict[str, np.ndarray]:
+    # log-normal with sigma=1.5 scaled to have the mean base * 10
+    return {name: base * 10 * np.exp(1.5 * latent - 1.5**2 / 2)}
+
+
+def _zero_inflated(name: str, latent: np.ndarray, base: np.ndarray, rng: np.random.Generator) -> dict[str, np.ndarray]:
+    # 80% of units are 0, the rest is scaled to keep the mean base * 10
+    nonzero = rng.uniform(size=latent.shape[0]) < 0.2
+    return {name: np.where(nonzero, _heavy_tailed(name, latent, base, rng)[name] / 0.2, 0.0)}
+
+
+def _ratio(name: str, latent: np.ndarray, base: np.ndarray, rng: np.random.Generator) -> dict[str, np.ndarray]:
+    # e.g., sessions (at least 1) and clicks on them with the click through rate base
+    denominator = 1 + _poisson_quantile(special.ndtr(latent), np.full(latent.shape[0], 3.0))
+    return {f"{name}_num": rng.binomial(n=denominator, p=np.clip(base, 0.0, 1.0)), f"{name}_den": denominator}
+
+
+def _poisson_quantile(quantile: np.ndarray, lam: np.ndarray) -> np.ndarray:
+    """inverse CDF of Poisson distribution. lam takes only a few values (one for each variant),
+    so quantiles are looked up from a cumulative table of each lam, it's much faster than poisson.ppf()."""
+    from scipy.stats import poisson
+
+    values = np.empty(quantile.shape[0], dtype=np.int64)
+    unique_lam, inverse = np.unique(lam, return_inverse=True)
+    for i, lam_ in enumerate(unique_lam):
+        mask = inverse == i
+        cdf = special.pdtr(np.arange(int(poisson.ppf(1 - 1e-12, lam_)) + 1), lam_)
+        values[mask] = np.minimum(np.searchsorted(cdf, quantile[mask], side="left"), cdf.shape[0] - 1)
+    return values
+
 
-    ab_result = pd.DataFrame()
-    ab_result["rand_unit"] = [i for i in range(sample_size)]
-    ab_result["variant"] = np.random.choice(a=[i + 1 for i in range(n_variant)], size=sample_size)
-    ab_result["segment_str"] = np.random.choice(a=[str(i + 1) for i in range(3)], p=[0.7, 0.2, 0.1], size=sample_size)
-    ab_result["segment_numer"] = np.random.uniform(size=sample_size)
-    ab_result["metric_bin"] = 0
-    ab_result["metric_cont"] = 0
-
-    if len(simulated_lift) == 0:
-        simulated_lift = [0.05 * i for i in range(n_variant) if i != 0]
-    simulated_lift.insert(0, 0)  # insert lift of control variant for convenience
-
-    for i in range(n_variant):
-        p = metric_base * (1 + simulated_lift[i])
-        size = ab_result.loc[ab_result["variant"] == i + 1].shape[0]
-        ab_result.loc[ab_result["variant"] == i + 1, "metric_bin"] = np.random.binomial(n=1, p=p, size=size)
-        ab_result.loc[ab_result["variant"] == i + 1, "metric_cont"] = np.random.poisson(lam=p * 10, size=size)
-    return ab_result
+METRIC_FAMILIES: dict[str, Callable[[str, np.ndarray, np.ndarray, np.random.Generator], dict[str, np.ndarray]]] = {
+    "binary": _binary,
+    "count": _count,
+    "heavy_tailed": _heavy_tailed,
+    "zero_inflated": _zero_inflated,
+    "ratio": _ratio,
+}
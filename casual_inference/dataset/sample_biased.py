@@ -1,14 +1,20 @@
+from typing import Iterator
+
 import numpy as np
 import pandas as pd
 
+from .sample_abtest import RandomState
+
 
-def create_sample_biased(sample_size: int = 1000) -> pd.DataFrame:
+def create_sample_biased(sample_size: int = 1000, random_state: RandomState = None) -> pd.DataFrame:
     """Generate sample biased dataset for testing advanced causal inference approach. (e.g., linear regression, propensity score matching, ...)
 
     Parameters
     ----------
     sample_size : int, optional
         number of samples you want, by default 1000
+    random_state : Optional[Union[int, np.random.Generator]], optional
+        Seed or generator of random numbers, by default None
 
     Returns
     -------
@@ -21,27 +27,57 @@ def create_sample_biased(sample_size: int = 1000) -> pd.DataFrame:
         - treatment: indicator variable that each unit received treatment or not
         - target: dummy target variable, interested in the treatment impact on
     """
-    result = pd.DataFrame()
-    result["unit"] = [i for i in range(sample_size)]
-    result["covar_numer1"] = np.random.normal(size=sample_size)
-    result["covar_numer2"] = np.random.exponential(size=sample_size)
-    result["covar_cat"] = np.random.choice(a=[str(i + 1) for i in range(5)], size=sample_size)
-
-    # generate probability of receiving treatment by subjective relationships
-    relationship = (
-        np.random.normal(loc=-1.0, scale=2.0, size=sample_size)
-        + np.random.normal(loc=-2.0, scale=1.0, size=sample_size) * result["covar_numer1"]
-        + np.random.normal(loc=5.0, scale=5.0, size=sample_size) * result["covar_numer2"]
-    )
-    treatment_prob = 1 / (1 + np.exp(-1.0 * relationship))
-    result["treatment"] = (treatment_prob >= 0.5).astype("int")
-
-    # generate target by subjective relationships
-    result["target"] = (
-        np.random.normal(loc=3.0, scale=5.0, size=sample_size)
-        + np.random.normal(loc=1.0, scale=1.0, size=sample_size) * result["treatment"]
-        + np.random.normal(loc=-0.5, scale=1.0, size=sample_size) * result["covar_numer1"]
-        + np.random.normal(loc=2.0, scale=2.0, size=sample_size) * result["covar_numer2"]
-    )
-
-    return result
+    return next(generate_biased_chunks(sample_size, chunk_size=max(sample_size, 1), random_state=random_state))
+
+
+def generate_biased_chunks(
+    sample_size: int, chunk_size: int = 1_000_000, random_state: RandomState = None
+) -> Iterator[pd.DataFrame]:
+    """Generate sample biased dataset as a stream of DataFrame chunks. See create_sample_biased() for the columns.
+
+    Parameters
+    ----------
+    sample_size : int
+        number of samples in total.
+    chunk_size : int, optional
+        number of rows in each chunk, by default 1_000_000
+    random_state : Optional[Union[int, np.random.Generator]], optional
+        Seed or generator of random numbers, by default None
+        Each chunk draws random numbers from its own generator spawned from it.
+
+    Yields
+    ------
+    pd.DataFrame
+        Chunk of sample biased dataset.
+    """
+    if chunk_size <= 0:
+        raise ValueError("chunk_size should be positive number.")
+
+    n_chunk = max(-(-sample_size // chunk_size), 1)
+    for i, rng in enumerate(np.random.default_rng(random_state).spawn(n_chunk)):
+        offset = i * chunk_size
+        size = min(chunk_size, sample_size - offset)
+
+        result = pd.DataFrame()
+        result["unit"] = np.arange(offset, offset + size)
+        result["covar_numer1"] = rng.normal(size=size)
+        result["covar_numer2"] = rng.exponential(size=size)
+        result["covar_cat"] = np.array(["1", "2", "3", "4", "5"], dtype=object)[rng.integers(5, size=size)]
+
+        # generate probability of receiving treatment by subjective relationships
+        relationship = (
+            rng.normal(loc=-1.0, scale=2.0, size=size)
+            + rng.normal(loc=-2.0, scale=1.0, size=size) * result["covar_numer1"]
+            + rng.normal(loc=5.0, scale=5.0, size=size) * result["covar_numer2"]
+        )
+        treatment_prob = 1 / (1 + np.exp(-1.0 * relationship))
+        result["treatment"] = (treatment_prob >= 0.5).astype("int")
+
+        # generate target by subjective relationships
+        result["target"] = (
+            rng.normal(loc=3.0, scale=5.0, size=size)
+            + rng.normal(loc=1.0, scale=1.0, size=size) * result["treatment"]
+            + rng.normal(loc=-0.5, scale=1.0, size=size) * result["covar_numer1"]
+            + rng.normal(loc=2.0, scale=2.0, size=size) * result["covar_numer2"]
+        )
+        yield result
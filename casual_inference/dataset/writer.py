@@ -0,0 +1,71 @@
+from typing import Iterable, Optional
+
+import numpy as np
+import pandas as pd
+
+
+def write_chunks(chunks: Iterable[pd.DataFrame], path: str, n_rows: Optional[int] = None) -> None:
+    """Write a stream of DataFrame chunks to a file without holding the whole data in memory.
+    The format is decided by the extension of the path.
+
+    - .parquet: each chunk is written as a row group. (pyarrow is required)
+    - .npy: chunks are written into a memory-mapped structured array, load it by np.load(path, mmap_mode="r").
+      Object (string) columns are stored as fixed width unicode, whose width is decided by the first chunk.
+
+    Parameters
+    ----------
+    chunks : Iterable[pd.DataFrame]
+        DataFrames have the same schema. e.g., generate_ab_chunks(...)
+    path : str
+        Output file path ends with .parquet or .npy
+    n_rows : Optional[int], optional
+        The number of rows in total, required for .npy, by default None
+    """
+    if path.endswith(".parquet"):
+        _write_parquet(chunks, path)
+    elif path.endswith(".npy"):
+        if n_rows is None:
+            raise ValueError("n_rows is required to write .npy file.")
+        _write_npy(chunks, path, n_rows)
+    else:
+        raise ValueError("The path should end with .parquet or .npy")
+
+
+def _write_parquet(chunks: Iterable[pd.DataFrame], path: str) -> None:
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError as e:
+        raise ImportError("pyarrow is required to write parquet file.") from e
+
+    writer = None
+    try:
+        for chunk in chunks:
+            table = pa.Table.from_pandas(chunk, preserve_index=False)
+            if writer is None:
+                writer = pq.ParquetWriter(path, table.schema)
+            writer.write_table(table)
+    finally:
+        if writer is not None:
+            writer.close()
+
+
+def _write_npy(chunks: Iterable[pd.DataFrame], path: str, n_rows: int) -> None:
+    array = None
+    written = 0
+    for chunk in chunks:
+        records = chunk.to_records(index=False)
+        if array is None:
+            fields = []
+            for name in records.dtype.names:
+                field = records.dtype[name]
+                fields.append((name, np.asarray(records[name], dtype=str).dtype if field == object else field))
+            dtype = np.dtype(fields)
+            array = np.lib.format.open_memmap(path, mode="w+", dtype=dtype, shape=(n_rows,))
+        if written + chunk.shape[0] > n_rows:
+            raise ValueError("chunks have more rows than n_rows.")
+        array[written : written + chunk.shape[0]] = records.astype(array.dtype)
+        written += chunk.shape[0]
+    if array is None or written != n_rows:
+        raise ValueError("chunks have less rows than n_rows.")
+    array.flush()
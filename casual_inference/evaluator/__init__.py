@@ -1,6 +1,15 @@
 from .aatest import AATestEvaluator
 from .abtest import ABTestEvaluator
+from .base import StageRecord
+from .bootstrap import BootstrapEvaluator
 from .linear_regression import LinearRegressionEvaluator
 from .samplesize import SampleSizeEvaluator
 
-__all__ = ["ABTestEvaluator", "AATestEvaluator", "SampleSizeEvaluator", "LinearRegressionEvaluator"]
+__all__ = [
+    "ABTestEvaluator",
+    "AATestEvaluator",
+    "SampleSizeEvaluator",
+    "LinearRegressionEvaluator",
+    "BootstrapEvaluator",
+    "StageRecord",
+]
@@ -1,16 +1,30 @@
+import warnings
+from typing import TYPE_CHECKING, Any, Callable, Optional
+
 import numpy as np
 import pandas as pd
-import plotly.express as px
-import plotly.graph_objs as go
-from scipy.stats import kstest
 from typing_extensions import Self
 
-from ..statistical_testing import t_test
-from .base import BaseEvaluator
+from ..statistical_testing import ks_uniform_test, metric_values, welch_t_test
+from .base import BaseEvaluator, evaluation
+from .parallel import map_blocks, resolve_n_jobs
+
+if TYPE_CHECKING:
+    import plotly.graph_objs as go
 
 
 class AATestEvaluator(BaseEvaluator):
-    def __init__(self, n_simulation: int = 1000, sample_rate: float = 1.0) -> None:
+    # the long format stats and summaries are built from results on demand.
+    _result_attributes = ("results", "metrics", "_stats", "_cache")
+
+    def __init__(
+        self,
+        n_simulation: int = 1000,
+        sample_rate: float = 1.0,
+        memory_budget_mb: float = 256.0,
+        n_jobs: Optional[int] = None,
+        random_state: Optional[int] = None,
+    ) -> None:
         """initialize parameters affect result of evaluation.
 
         Parameters
@@ -19,20 +33,49 @@ class AATestEvaluator(BaseEvaluator):
             How many times you want to do simulated A/A test, by default 1000
         sample_rate : float, optional
             How much fraction you want to sample from the dataframe, by default 1.0
+        memory_budget_mb : float, optional
+            Upper bound of the memory used by assignment matrices of a simulation block, by default 256.0
+            Larger budget simulates more A/A tests at once. The budget is applied to each worker process.
+        n_jobs : Optional[int], optional
+            The number of worker processes simulating blocks in parallel, by default None (no worker process)
+            -1 means using all CPUs.
+        random_state : Optional[int], optional
+            Seed of random assignments, by default None
+            The result is reproducible with the same seed, regardless of n_jobs and memory_budget_mb.
         """
         if n_simulation <= 0:
             raise ValueError("The number of simulation should be positive number.")
         if not 0.0 < sample_rate <= 1.0:
             raise ValueError("The sample rate should be in (0, 1]")
+        if memory_budget_mb <= 0:
+            raise ValueError("The memory budget should be positive number.")
+        resolve_n_jobs(n_jobs)
 
+        # statistics of each simulation (row) and metric (column) as dense arrays. see the stats property.
+        self.results: dict[str, np.ndarray] = {}
+        self.metrics: list[str] = []
+        self._stats: Optional[pd.DataFrame] = None
+        self._cache: dict[str, Any] = {}
         super().__init__()
         self.n_simulation = n_simulation
         self.sample_rate = sample_rate
+        self.memory_budget_mb = memory_budget_mb
+        self.n_jobs = n_jobs
+        self.random_state = random_state
 
     # ignore mypy error temporary, because the "Self" type support on mypy is ongoing. https://github.com/python/mypy/pull/11666
-    def evaluate(self, data: pd.DataFrame, unit_col: str, metrics: list[str]) -> Self:  # type: ignore
+    @evaluation
+    def evaluate(  # type: ignore
+        self, data: pd.DataFrame, unit_col: str, metrics: list[str], assume_validated: bool = False
+    ) -> Self:
         """split data n times, and calculate statistics n times, then store it as an attribute.
 
+        Simulations are processed in blocks. For each block, random assignments of all simulations are drawn
+        as a matrix, then sums and sums of squares of every metric in each group are calculated by matrix products.
+        Each unit is sampled with the probability of sample_rate, then assigned to either group with equal probability.
+        Every simulation draws assignments from its own random generator spawned from random_state,
+        so blocks can be simulated by worker processes sharing the metrics through shared memory.
+
         Parameters
         ----------
         data : pd.DataFrame
@@ -41,44 +84,92 @@ class AATestEvaluator(BaseEvaluator):
             A column name stores the randomization unit. something like user_id, session_id, ...
         metrics : list[str]
             Columns stores metrics you want to evaluate.
+        assume_validated : bool, optional
+            Skip checking that the data has been aggregated by the randomization unit, by default False
+            Use it for trusted inputs, e.g., units already aggregated by an upstream pipeline.
 
         Returns
         -------
         self : object
             Evaluator storing statistics calculated.
         """
-        self._validate_passed_data(data, unit_col, metrics)
-
-        # to avoid errors in later steps
-        for metric_col in metrics:
-            data[metric_col] = data[metric_col].astype(np.float64)
-
-        result = pd.DataFrame()
-        sampled_df = data.copy(deep=True)
-        for i in range(self.n_simulation):
-            if self.sample_rate < 1.0:
-                sampled_df = data.sample(frac=self.sample_rate, random_state=i, ignore_index=True)
-            sampled_df["variant"] = np.random.randint(
-                low=1, high=3, size=sampled_df.shape[0]
-            )  # The upper bound is exclusive
-            stats = t_test(sampled_df, unit_col, "variant", metrics)
-            stats["idx"] = i
-            result = pd.concat([result, stats])
-        return_cols = [
-            "idx",
-            "metric",
-            "mean",
-            "count",
-            "stderr",
-            "abs_diff_mean",
-            "abs_diff_std",
-            "rel_diff_mean",
-            "p_value",
-        ]
-        result = result.loc[result["variant"] == 2, return_cols].reset_index(drop=True)
-        self.stats = result
+        key, restored = None, False
+        # results are random without random_state, so they aren't cached.
+        if self.random_state is not None:
+            key, restored = self._load_result(
+                data,
+                [unit_col] + metrics,
+                unit_col=unit_col,
+                metrics=metrics,
+                assume_validated=assume_validated,
+                n_simulation=self.n_simulation,
+                sample_rate=self.sample_rate,
+                random_state=self.random_state,
+            )
+        if restored:
+            return self
+        self._validate_passed_data(data, unit_col, metrics, assume_validated)
+
+        # metrics are centered column by column into float64 matrices, without modifying or copying the data.
+        # centering keeps variances calculated from sums of squares numerically stable.
+        n_unit, n_metric = data.shape[0], len(metrics)
+        with self._stage("prepare", rows=n_unit, n_metric=n_metric):
+            arrays = {"values": np.empty((n_unit, n_metric), order="F")}
+            center = np.empty(n_metric)
+            observed = None
+            for j, metric in enumerate(metrics):
+                values = metric_values(data[metric])
+                missing = np.isnan(values) if values.dtype.kind == "f" else None
+                if missing is not None and missing.any():
+                    if observed is None:
+                        observed = np.ones((n_unit, n_metric), order="F")
+                    observed[:, j] = ~missing
+                    center[j] = np.nanmean(values, dtype=np.float64)
+                    np.subtract(values, center[j], out=arrays["values"][:, j], dtype=np.float64)
+                    arrays["values"][missing, j] = 0.0
+                else:
+                    center[j] = np.mean(values, dtype=np.float64)
+                    np.subtract(values, center[j], out=arrays["values"][:, j], dtype=np.float64)
+            arrays["squared"] = np.square(arrays["values"])
+            if observed is not None:
+                arrays["observed"] = observed
+        # a uniform matrix (float32) and two assignment matrices (float64) are allocated for each simulation
+        block_size = max(1, int(self.memory_budget_mb * 2**20 // (n_unit * 20)))
+        seeds = np.random.SeedSequence(self.random_state).spawn(self.n_simulation)
+        blocks = [seeds[start : start + block_size] for start in range(0, self.n_simulation, block_size)]
+
+        n_jobs = resolve_n_jobs(self.n_jobs)
+        with self._stage("simulate", n_metric=n_metric, n_simulation=self.n_simulation, n_block=len(blocks)):
+            block_results = list(map_blocks(_simulate_block, arrays, blocks, n_jobs, center, self.sample_rate))
+        self.results = {
+            col: np.concatenate([block[col] for block in block_results])
+            for col in ["mean", "count", "stderr", "abs_diff_mean", "abs_diff_std", "rel_diff_mean", "p_value"]
+        }
+        self.results["count"] = self.results["count"].astype(np.int64)
+        self.metrics = list(metrics)
+        self._stats = None
+        self._cache = {}
+        self._store_result(key)
         return self
 
+    @property
+    def stats(self) -> pd.DataFrame:
+        """statistics of simulations in the long format, one row for each simulation (idx) and metric.
+        It's built from results on the first access, since it's several times larger than the arrays."""
+        if self._stats is None:
+            n_simulation, n_metric = self.results["p_value"].shape
+            stats = pd.DataFrame()
+            stats["idx"] = np.repeat(np.arange(n_simulation), n_metric)
+            stats["metric"] = np.tile(np.asarray(self.metrics, dtype=object), n_simulation)
+            for col, values in self.results.items():
+                stats[col] = values.ravel()
+            self._stats = stats
+        return self._stats
+
+    @stats.setter
+    def stats(self, stats: pd.DataFrame) -> None:
+        self._stats = stats
+
     def summary_table(self) -> pd.DataFrame:
         """Apply Kolmogorov Smirnov test to check if the p-value distribution is different from the uniform distribution.
 
@@ -88,21 +179,10 @@ class AATestEvaluator(BaseEvaluator):
             stats summary
         """
         self._validate_evaluate_executed()
+        with self._stage("summary_table", n_metric=len(self.metrics)):
+            return self._cached("summary_table", self._build_summary_table).copy(deep=True)
 
-        stats = self.stats.copy(deep=True)
-        stats_agg = (
-            stats.groupby("metric")[["abs_diff_mean", "rel_diff_mean", "p_value"]].agg(["mean", "std"]).reset_index()
-        )
-        stats_agg["ksstat"] = 0
-        stats_agg["ks_pvalue"] = 0
-        for metric in stats["metric"].unique():
-            result = kstest(stats.loc[stats["metric"] == metric, "p_value"], "uniform")
-            stats_agg.loc[stats_agg["metric"] == metric, "ksstat"] = result.statistic
-            stats_agg.loc[stats_agg["metric"] == metric, "ks_pvalue"] = result.pvalue
-        stats_agg["significance"] = stats_agg["ks_pvalue"].map(lambda x: True if x < 0.05 else False)
-        return stats_agg
-
-    def summary_plot(self) -> go.Figure:
+    def summary_plot(self) -> "go.Figure":
         """Plot histogram of p-value with coloring if the p-value distribution is different from the uniform distribution.
 
         Returns
@@ -110,13 +190,43 @@ class AATestEvaluator(BaseEvaluator):
         go.Figure
         """
         self._validate_evaluate_executed()
+        import plotly.graph_objs as go
 
-        stats = self.stats.copy(deep=True)
-        stats["ks_pvalue"] = 0
-        for metric in stats["metric"].unique():
-            result = kstest(stats.loc[stats["metric"] == metric, "p_value"], "uniform")
-            stats.loc[stats["metric"] == metric, "ks_pvalue"] = result.pvalue
-        stats["significance"] = stats["ks_pvalue"].map(lambda x: True if x < 0.05 else False)
+        with self._stage("summary_plot", n_metric=len(self.metrics)):
+            return go.Figure(self._cached("summary_plot", self._build_summary_plot))
+
+    def _validate_evaluate_executed(self) -> None:
+        if not self.results:
+            raise ValueError("Evaluated statistics haven't been calculated. Please call evaluate() in advance.")
+
+    def _build_summary_table(self) -> pd.DataFrame:
+        # aggregates of all metrics are calculated column-wise, and metrics are sorted like groupby().
+        order = np.argsort(np.asarray(self.metrics, dtype=object), kind="stable")
+        summary = pd.DataFrame({("metric", ""): np.asarray(self.metrics, dtype=object)[order]})
+        for col in ["abs_diff_mean", "rel_diff_mean", "p_value"]:
+            values = self.results[col][:, order]
+            with np.errstate(divide="ignore", invalid="ignore"), warnings.catch_warnings():
+                warnings.simplefilter("ignore", RuntimeWarning)
+                summary[(col, "mean")] = np.nanmean(values, axis=0)
+                summary[(col, "std")] = np.nanstd(values, axis=0, ddof=1)
+        ksstat, ks_pvalue = self._ks_test()
+        summary[("ksstat", "")] = ksstat[order]
+        summary[("ks_pvalue", "")] = ks_pvalue[order]
+        summary[("significance", "")] = ks_pvalue[order] < 0.05
+        summary.columns = pd.MultiIndex.from_tuples(summary.columns)
+        return summary
+
+    def _build_summary_plot(self) -> "go.Figure":
+        n_simulation, n_metric = self.results["p_value"].shape
+        _, ks_pvalue = self._ks_test()
+        stats = pd.DataFrame(
+            {
+                "metric": np.tile(np.asarray(self.metrics, dtype=object), n_simulation),
+                "p_value": self.results["p_value"].ravel(),
+                "significance": np.tile(ks_pvalue < 0.05, n_simulation),
+            }
+        )
+        import plotly.express as px
 
         g = px.histogram(
             data_frame=stats,
@@ -129,3 +239,60 @@ class AATestEvaluator(BaseEvaluator):
         )
         g.add_hline(y=0.01, line_dash="dot", line_width=2)
         return g
+
+    def _ks_test(self) -> tuple[np.ndarray, np.ndarray]:
+        """KS statistics and p-values of p-values of each metric against the uniform distribution."""
+        return self._cached("ks_test", lambda: ks_uniform_test(self.results["p_value"]))
+
+    def _cached(self, key: str, build: Callable[[], Any]) -> Any:
+        """return the result of build() computed once for each evaluation."""
+        if key not in self._cache:
+            self._cache[key] = build()
+        return self._cache[key]
+
+
+def _simulate_block(
+    arrays: dict[str, np.ndarray], center: np.ndarray, sample_rate: float, seeds: list[np.random.SeedSequence]
+) -> dict[str, np.ndarray]:
+    """simulate A/A tests as many as seeds, and return statistics in (n_simulation, n_metric) arrays."""
+    values, squared, observed = arrays["values"], arrays["squared"], arrays.get("observed")
+    n_unit = values.shape[0]
+    uniform = np.empty((n_unit, len(seeds)), dtype=np.float32)
+    for j, seed in enumerate(seeds):
+        uniform[:, j] = np.random.default_rng(seed).random(size=n_unit, dtype=np.float32)
+
+    treatment = _group_sums((uniform < sample_rate / 2).astype(np.float64), values, squared, observed)
+    if sample_rate == 1.0:
+        # every unit is assigned to either group, so the control group is the complement.
+        total = _group_sums(np.ones((n_unit, 1)), values, squared, observed)
+        control = (total[0] - treatment[0], total[1] - treatment[1], total[2] - treatment[2])
+    else:
+        assignment = (uniform >= sample_rate / 2) & (uniform < sample_rate)
+        control = _group_sums(assignment.astype(np.float64), values, squared, observed)
+    del uniform
+
+    mean, stderr, count = _moments(center, *treatment)
+    mean_c, stderr_c, count_c = _moments(center, *control)
+    block = welch_t_test(mean, stderr, count, mean_c, stderr_c, count_c)
+    block.update({"mean": mean, "count": count, "stderr": stderr})
+    return block
+
+
+def _group_sums(
+    assignment: np.ndarray, values: np.ndarray, squared: np.ndarray, observed: Optional[np.ndarray]
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """calculate count, sum and sum of squares of each metric (column) in each simulation (column of assignment)."""
+    if observed is None:
+        count = np.repeat(assignment.sum(axis=0)[:, np.newaxis], values.shape[1], axis=1)
+    else:
+        count = assignment.T @ observed
+    return count, assignment.T @ values, assignment.T @ squared
+
+
+def _moments(
+    center: np.ndarray, count: np.ndarray, sum_: np.ndarray, sum_sq: np.ndarray
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """convert sums of centered metrics into mean, standard error of the mean and count."""
+    with np.errstate(divide="ignore", invalid="ignore"):
+        var = np.maximum(sum_sq - sum_**2 / count, 0.0) / (count - 1)
+        return center + sum_ / count, np.sqrt(var / count), count
@@ -1,17 +1,32 @@
 import warnings
 from dataclasses import dataclass
-from typing import Optional
+from typing import TYPE_CHECKING, Any, Callable, Iterable, Optional, Union
 
 import numpy as np
 import pandas as pd
 import pandas.api.types as pd_types
-import plotly.express as px
-import plotly.graph_objs as go
-from scipy.stats import chisquare
 from typing_extensions import Self
 
-from ..statistical_testing import eval_ttest_significance, t_test
-from .base import BaseEvaluator
+from ..accumulator import MomentAccumulator, UnitAccumulator
+from ..native import NativeFrame, column, is_native_frame
+from ..statistical_testing import (
+    COMOMENT_COLS,
+    RatioMetrics,
+    aggregate_moments,
+    aggregate_moments_multi,
+    comoments_from_sums,
+    confidence_sequence_width,
+    delta_method,
+    eval_ttest_significance,
+    moments_from_sums,
+    msprt_p_value,
+    srm_test,
+    t_test_from_stats,
+)
+from .base import BaseEvaluator, evaluation
+
+if TYPE_CHECKING:
+    import plotly.graph_objs as go
 
 
 @dataclass
@@ -23,37 +38,57 @@ class SRMCheckResult:
     p_value: float
     significant: bool
     segment: Optional[str] = None
+    experiment: Optional[Any] = None
 
     def __repr__(self) -> str:
+        experiment = f"experiment: {self.experiment}, " if self.experiment is not None else ""
         if self.segment:
-            return f"variant: {self.variant}, segment: {self.segment} control:treatment = {self.sample_size_c}:{self.sample_size}, p_value = {self.p_value}"
+            return f"{experiment}variant: {self.variant}, segment: {self.segment} control:treatment = {self.sample_size_c}:{self.sample_size}, p_value = {self.p_value}"
         else:
-            return f"variant: {self.variant} control:treatment = {self.sample_size_c}:{self.sample_size}, p_value = {self.p_value}"
+            return f"{experiment}variant: {self.variant} control:treatment = {self.sample_size_c}:{self.sample_size}, p_value = {self.p_value}"
 
 
 class ABTestEvaluator(BaseEvaluator):
+    _result_attributes = ("stats", "variant_col", "segment_col", "segment_cols", "experiment_col", "unit_accumulator")
+
     def __init__(self) -> None:
         super().__init__()
         self.variant_col: str = ""
         self.segment_col: str = ""
+        self.segment_cols: list[str] = []
+        self.experiment_col: str = ""
+        # per-unit sums kept by update(), and the scale of the mixture of the sequential test
+        self.unit_accumulator: Optional[UnitAccumulator] = None
+        self.sequential_tau: float = 0.0
+        # the standard deviation of the mixture in the scale of the absolute difference ("tau_abs"),
+        # fixed at the first look of each (variant, segment, metric).
+        self.sequential_tau_abs: pd.DataFrame = pd.DataFrame()
+        # derived results of summary methods, cleared by every evaluation. see _cached().
+        self._cache: dict[tuple, Any] = {}
 
     # ignore mypy error temporary, because the "Self" type support on mypy is ongoing. https://github.com/python/mypy/pull/11666
+    @evaluation
     def evaluate(
         self,
-        data: pd.DataFrame,
+        data: Union[pd.DataFrame, NativeFrame],
         unit_col: str,
         metrics: list[str],
         variant_col: str = "variant",
-        segment_col: Optional[str] = None,
+        segment_col: Optional[Union[str, list[str]]] = None,
+        assume_validated: bool = False,
+        ratio_metrics: Optional[RatioMetrics] = None,
+        experiment_col: Optional[str] = None,
+        experiment_metrics: Optional[dict[Any, list[str]]] = None,
     ) -> Self:  # type: ignore
         """calculate stats of A/B test and cache it into the class variable.
         At first, it only assumes metrics can handle by Welch's t-test.
 
         Parameters
         ----------
-        data : pd.DataFrame
+        data : Union[pd.DataFrame, pyarrow.Table, polars.DataFrame]
             Dataframe has randomization unit column, variant assignment column, and metrics columns.
             The data should have been aggregated by the randomization unit.
+            Arrow and Polars frames are aggregated by polars without converting them into pandas.
         unit_col : str
             A column name stores the randomization unit. something like user_id, session_id, ...
         metrics : list[str]
@@ -61,42 +96,343 @@ class ABTestEvaluator(BaseEvaluator):
         variant_col : str
             A column name stores the variant assignment.
             The control variant should have value 1.
-        segment_col : Optional[str]
+        segment_col : Optional[Union[str, list[str]]]
             A column name stores 'segment' you want to break down in the analysis.
             e.g., light users, heavy users, new registers, ...
             When the specified column in dataframe stores numerical values, it automatically binning the values.
+            When a list of column names is passed, the data is broken down by each of them independently.
+            The column of the other segments is filled with NaN in the rows of a segment.
+        assume_validated : bool, optional
+            Skip checking that the data has been aggregated by the randomization unit, by default False
+            Use it for trusted inputs, e.g., units already aggregated by an upstream pipeline.
+        ratio_metrics : Optional[dict[str, tuple[str, str]]], optional
+            Ratio metrics, mapping from the name to (numerator column, denominator column), by default None
+            e.g., {"ctr": ("clicks", "impressions")}, when the analysis unit differs from the randomization unit.
+            They're evaluated by the delta method in the same pass with metrics, and shown after them.
+        experiment_col : Optional[str], optional
+            A column name stores the experiment, by default None
+            When it's specified, many experiments in the data are evaluated at once in a single grouped reduction,
+            instead of filtering the data for each experiment. The unit should be unique within each experiment.
+        experiment_metrics : Optional[dict[Any, list[str]]], optional
+            Metrics evaluated for each experiment, by default None (all metrics for every experiment)
+            It maps from the experiment to metrics and ratio metrics. Experiments not in the mapping are evaluated
+            on all metrics.
 
         Returns
         -------
         self : object
             Evaluator storing statistics calculated.
         """
-        self._validate_passed_data(data, unit_col, metrics)
-
-        # to avoid errors in later steps
-        data[variant_col] = data[variant_col].astype(int)
-        for metric_col in metrics:
-            data[metric_col] = data[metric_col].astype(np.float64)
-
-        if segment_col:
-            segment = data[segment_col]
-            if pd_types.is_numeric_dtype(segment) and not pd_types.is_bool_dtype(segment):
-                segment = pd.qcut(x=segment, q=5, duplicates="drop")
-
-            stats = pd.DataFrame()
-            for s in segment.unique():
-                partial_stats = t_test(data.loc[segment == s], unit_col, variant_col, metrics)
-                partial_stats[segment_col] = s
-                stats = pd.concat([stats, partial_stats])
-            self.stats = stats
-            self.segment_col = segment_col
+        self._cache = {}
+        ratio_metrics = ratio_metrics or {}
+        experiment_metrics = experiment_metrics or {}
+        segment_cols = [segment_col] if isinstance(segment_col, str) else list(segment_col or [])
+        experiment_cols = [experiment_col] if experiment_col else []
+        ratio_cols = [col for cols in ratio_metrics.values() for col in cols]
+        key, restored = self._load_result(
+            data,
+            [unit_col, variant_col] + experiment_cols + segment_cols + metrics + ratio_cols,
+            unit_col=unit_col,
+            metrics=metrics,
+            variant_col=variant_col,
+            segment_col=segment_col,
+            assume_validated=assume_validated,
+            ratio_metrics=ratio_metrics,
+            experiment_col=experiment_col,
+            experiment_metrics=experiment_metrics,
+        )
+        if restored:
+            return self
+        self._validate_passed_data(data, unit_col, metrics + list(ratio_metrics), assume_validated, experiment_col)
+        _validate_experiment_metrics(experiment_col, experiment_metrics, metrics + list(ratio_metrics))
+
+        # the data isn't modified, variants and metrics are converted after (or while) the aggregation.
+        n_metric = len(metrics) + len(ratio_metrics)
+        if len(segment_cols) > 0:
+            with self._stage("aggregate", rows=data.shape[0], n_metric=n_metric) as stage:
+                groupings = []
+                for col in segment_cols:
+                    segment = column(data, col) if is_native_frame(data) else data[col]
+                    if _is_numerical(segment):
+                        segment = pd.qcut(x=segment, q=5, duplicates="drop")
+                    groupings.append(experiment_cols + [variant_col, segment])
+                # all (experiment, segment, variant, metric) statistics are reduced in one pass over the metrics
+                segment_moments = aggregate_moments_multi(data, groupings, metrics, ratio_metrics)
+                stage["n_group"] = sum(moments.shape[0] for moments in segment_moments) // n_metric
+
+            with self._stage("t_test", n_metric=n_metric, n_group=stage["n_group"]):
+                stats = []
+                for col, moments in zip(segment_cols, segment_moments):
+                    moments = _select_experiment_metrics(moments, experiment_col, experiment_metrics)
+                    moments[variant_col] = moments[variant_col].astype(int)
+                    group_cols = experiment_cols + [col]
+                    _validate_control_exists(moments, variant_col, group_cols)
+                    stats.append(
+                        t_test_from_stats(moments, variant_col, group_cols).sort_values(group_cols, kind="stable")
+                    )
+                self.stats = pd.concat(stats, ignore_index=True)
         else:
-            self.stats = t_test(data, unit_col, variant_col, metrics)
+            with self._stage("aggregate", rows=data.shape[0], n_metric=n_metric) as stage:
+                moments = aggregate_moments(data, experiment_cols + [variant_col], metrics, ratio_metrics)
+                stage["n_group"] = moments.shape[0] // n_metric
+
+            with self._stage("t_test", n_metric=n_metric, n_group=stage["n_group"]):
+                moments = _select_experiment_metrics(moments, experiment_col, experiment_metrics)
+                moments[variant_col] = moments[variant_col].astype(int)
+                _validate_control_exists(moments, variant_col, experiment_cols)
+                self.stats = t_test_from_stats(moments, variant_col, experiment_cols)
         self.variant_col = variant_col
+        self.experiment_col = experiment_col or ""
+        self._set_segment_cols(segment_cols)
+        self.unit_accumulator = None
+        self._store_result(key)
+        return self
+
+    # ignore mypy error temporary, because the "Self" type support on mypy is ongoing. https://github.com/python/mypy/pull/11666
+    @evaluation
+    def evaluate_from_stats(
+        self,
+        stats: pd.DataFrame,
+        variant_col: str = "variant",
+        segment_col: Optional[str] = None,
+        ratio_stats: Optional[pd.DataFrame] = None,
+        experiment_col: Optional[str] = None,
+    ) -> Self:  # type: ignore
+        """calculate stats of A/B test from pre-aggregated sufficient statistics, and cache it into the class variable.
+        It gives the same result with evaluate(), without passing the randomization unit level data.
+
+        Parameters
+        ----------
+        stats : pd.DataFrame
+            Dataframe has variant assignment column, "metric", "count", "sum" and "sum_sq" columns.
+            Each row stores the number of units, the sum and the sum of squares of a metric in a variant.
+            e.g., the result of "SELECT variant, COUNT(x), SUM(x), SUM(x * x) ... GROUP BY variant"
+            Dataframe has "mean" and "var" (unbiased variance) columns instead of "sum" and "sum_sq" is also accepted.
+            e.g., the result of MomentAccumulator.to_frame()
+        variant_col : str
+            A column name stores the variant assignment.
+            The control variant should have value 1.
+        segment_col : Optional[str]
+            A column name stores 'segment' you want to break down in the analysis.
+            When it's specified, the statistics should be aggregated by the segment as well.
+        ratio_stats : Optional[pd.DataFrame]
+            Statistics of ratio metrics, evaluated by the delta method, by default None
+            Dataframe has the same key columns with stats, "count", "sum_num", "sum_den", "sum_sq_num", "sum_sq_den"
+            and "sum_xy" (sum of numerator * denominator) columns.
+            e.g., the result of "SELECT variant, COUNT(*), SUM(clicks), SUM(views), ..., SUM(clicks * views) ... GROUP BY variant"
+            Dataframe has "mean_num", "mean_den", "var_num", "var_den" and "cov" columns instead is also accepted.
+            e.g., the result of aggregate_comoments()
+        experiment_col : Optional[str], optional
+            A column name stores the experiment, by default None
+            When it's specified, the statistics of many experiments aggregated by the experiment are evaluated at once.
+
+        Returns
+        -------
+        self : object
+            Evaluator storing statistics calculated.
+        """
+        self._cache = {}
+        experiment_cols = [experiment_col] if experiment_col else []
+        group_cols = experiment_cols + ([segment_col] if segment_col else [])
+        key_cols = [variant_col] + group_cols + ["metric"]
+        for frame in [stats] if ratio_stats is None else [stats, ratio_stats]:
+            for col in key_cols:
+                if col not in frame.columns:
+                    raise ValueError(f"Necessary column does not exist: {col}")
+
+        if "mean" in stats.columns and "var" in stats.columns:
+            moments = stats.loc[:, key_cols + ["mean", "var", "count"]]
+        else:
+            moments = moments_from_sums(stats.loc[:, key_cols + ["count", "sum", "sum_sq"]])
+        if ratio_stats is not None:
+            if "cov" in ratio_stats.columns:
+                comoments = ratio_stats.loc[:, key_cols + COMOMENT_COLS]
+            else:
+                sum_cols = ["count", "sum_num", "sum_den", "sum_sq_num", "sum_sq_den", "sum_xy"]
+                comoments = comoments_from_sums(ratio_stats.loc[:, key_cols + sum_cols])
+            moments = pd.concat([moments, delta_method(comoments)], ignore_index=True)
+        if moments.shape[0] == 0:
+            raise ValueError("passed statistics is empty.")
+        if moments.duplicated(subset=key_cols).any():
+            raise ValueError("passed statistics has duplicated rows for the same variant and metric.")
+        moments[variant_col] = moments[variant_col].astype(int)
+        moments = moments.sort_values(variant_col, kind="stable").reset_index(drop=True)
+        _validate_control_exists(moments, variant_col, group_cols)
+
+        n_metric = moments["metric"].nunique()
+        with self._stage("t_test", n_metric=n_metric, n_group=moments.shape[0] // n_metric):
+            self.stats = t_test_from_stats(moments, variant_col, group_cols)
+        self.variant_col = variant_col
+        self.experiment_col = experiment_col or ""
+        self._set_segment_cols(group_cols[len(experiment_cols) :])
+        self.unit_accumulator = None
+        return self
+
+    # ignore mypy error temporary, because the "Self" type support on mypy is ongoing. https://github.com/python/mypy/pull/11666
+    @evaluation
+    def evaluate_chunks(
+        self,
+        chunks: Iterable[pd.DataFrame],
+        unit_col: str,
+        metrics: list[str],
+        variant_col: str = "variant",
+        segment_col: Optional[str] = None,
+        assume_validated: bool = False,
+        ratio_metrics: Optional[RatioMetrics] = None,
+        experiment_col: Optional[str] = None,
+        experiment_metrics: Optional[dict[Any, list[str]]] = None,
+    ) -> Self:  # type: ignore
+        """calculate stats of A/B test from an iterator of DataFrame chunks, and cache it into the class variable.
+        Only the accumulated moments are kept in memory, so the data doesn't have to fit in memory at once.
+
+        Parameters
+        ----------
+        chunks : Iterable[pd.DataFrame]
+            DataFrames have the same schema with the data passed to evaluate().
+            e.g., pd.read_csv(..., chunksize=100000), or DataFrames converted from each Parquet row group.
+            Each randomization unit should appear only once across all chunks.
+        unit_col : str
+            A column name stores the randomization unit. something like user_id, session_id, ...
+        metrics : list[str]
+            Columns stores metrics you want to evaluate.
+        variant_col : str
+            A column name stores the variant assignment.
+            The control variant should have value 1.
+        segment_col : Optional[str]
+            A column name stores 'segment' you want to break down in the analysis.
+            Numerical segments can't be binned chunk by chunk, so please bin them in advance.
+        assume_validated : bool, optional
+            Skip checking that each chunk has been aggregated by the randomization unit, by default False
+        ratio_metrics : Optional[dict[str, tuple[str, str]]], optional
+            Ratio metrics, mapping from the name to (numerator column, denominator column), by default None
+        experiment_col : Optional[str], optional
+            A column name stores the experiment, by default None
+            Each randomization unit should appear only once in each experiment across all chunks.
+        experiment_metrics : Optional[dict[Any, list[str]]], optional
+            Metrics evaluated for each experiment, by default None (all metrics for every experiment)
+
+        Returns
+        -------
+        self : object
+            Evaluator storing statistics calculated.
+        """
+        self._cache = {}
+        ratio_metrics = ratio_metrics or {}
+        experiment_metrics = experiment_metrics or {}
+        _validate_experiment_metrics(experiment_col, experiment_metrics, metrics + list(ratio_metrics))
+        experiment_cols = [experiment_col] if experiment_col else []
+        group_cols = experiment_cols + ([variant_col, segment_col] if segment_col else [variant_col])
+        accumulator = MomentAccumulator(group_cols, metrics, ratio_metrics)
+        for chunk in chunks:
+            self._validate_passed_data(chunk, unit_col, metrics + list(ratio_metrics), assume_validated, experiment_col)
+            if segment_col and _is_numerical(chunk[segment_col]):
+                raise ValueError(
+                    "numerical segment can't be binned in the chunked evaluation. Please bin it in advance."
+                )
+            with self._stage("accumulate", rows=chunk.shape[0]):
+                accumulator.update(chunk)
+        if accumulator.moments.shape[0] == 0 and accumulator.comoments.shape[0] == 0:
+            raise ValueError("passed chunks are empty.")
+        moments = _select_experiment_metrics(accumulator.to_frame(), experiment_col, experiment_metrics)
+        return self.evaluate_from_stats(
+            moments, variant_col=variant_col, segment_col=segment_col, experiment_col=experiment_col
+        )
+
+    # ignore mypy error temporary, because the "Self" type support on mypy is ongoing. https://github.com/python/mypy/pull/11666
+    @evaluation
+    def update(
+        self,
+        data: pd.DataFrame,
+        unit_col: str,
+        metrics: list[str],
+        variant_col: str = "variant",
+        segment_col: Optional[str] = None,
+        sequential_tau: float = 0.1,
+    ) -> Self:  # type: ignore
+        """fold an increment of data (e.g., the data of a new day) into the statistics of a running experiment.
+        Per-unit sums of metrics are kept in self.unit_accumulator, so each call costs O(the increment)
+        instead of evaluating the whole cumulative data again. Units returning across increments are summed up.
+        The evaluator (or its unit_accumulator) can be pickled to continue the next day.
+
+        In addition to the t-test, the always-valid p-value of mSPRT is stored as "sequential_p_value",
+        and summary_table() shows the confidence sequence as "ci_seq_abs_diff".
+        They stay valid however many times the experiment is monitored. See msprt_p_value().
+
+        Parameters
+        ----------
+        data : pd.DataFrame
+            Dataframe has randomization unit column, variant assignment column, and metrics columns.
+            It doesn't have to be aggregated by the unit, each unit is summed up across all increments.
+        unit_col : str
+            A column name stores the randomization unit. something like user_id, session_id, ...
+        metrics : list[str]
+            Columns stores metrics you want to evaluate.
+        variant_col : str
+            A column name stores the variant assignment.
+            The control variant should have value 1.
+        segment_col : Optional[str]
+            A column name stores 'segment' you want to break down in the analysis.
+            It should be fixed for each unit, and numerical segments should be binned in advance.
+        sequential_tau : float, optional
+            The expected effect size relative to the standard deviation of the metric, by default 0.1
+            The standard deviation of the mixture of mSPRT is sequential_tau * the pooled standard deviation
+            at the first look, and it's kept in self.sequential_tau_abs for the following looks.
+
+        Returns
+        -------
+        self : object
+            Evaluator storing statistics calculated.
+        """
+        if segment_col and _is_numerical(data[segment_col]):
+            raise ValueError(
+                "numerical segment can't be binned in the incremental evaluation. Please bin it in advance."
+            )
+        if sequential_tau <= 0:
+            raise ValueError("sequential_tau should be positive number.")
+        group_cols = [variant_col, segment_col] if segment_col else [variant_col]
+        accumulator = self.unit_accumulator
+        if accumulator is None:
+            accumulator = UnitAccumulator(unit_col, group_cols, metrics)
+            previous = None
+        else:
+            if (accumulator.unit_col, accumulator.group_cols, accumulator.metrics) != (unit_col, group_cols, metrics):
+                raise ValueError("update() should be called with the same columns and metrics as the previous call.")
+            if sequential_tau != self.sequential_tau:
+                raise ValueError("sequential_tau can't be changed during the experiment.")
+            previous = self.stats
+        with self._stage("accumulate", rows=data.shape[0]) as stage:
+            accumulator.update(data)
+            stage["n_unit"] = accumulator.n_units
+
+        self.evaluate_from_stats(accumulator.to_frame(), variant_col=variant_col, segment_col=segment_col)
+        self.unit_accumulator = accumulator
+        self.sequential_tau = sequential_tau
+
+        with self._stage("sequential_test", n_group=self.stats.shape[0]):
+            stats = self.stats.copy()
+            keys = [variant_col] + self.segment_cols + ["metric"]
+            # the mixture must not be chosen by the data of later looks, so the scale is fixed at the first look
+            # of each group. Groups whose variance isn't available yet are fixed at their first look having it.
+            tau_abs = self.sequential_tau * np.sqrt((stats["var"].to_numpy() + stats["var_c"].to_numpy()) / 2)
+            fixed = np.isfinite(tau_abs) & (tau_abs > 0)
+            first_look = stats.loc[fixed, keys].assign(tau_abs=tau_abs[fixed])
+            if previous is not None:
+                first_look = pd.concat([self.sequential_tau_abs, first_look], ignore_index=True)
+            self.sequential_tau_abs = first_look.drop_duplicates(subset=keys, keep="first").reset_index(drop=True)
+
+            p_value = msprt_p_value(stats["abs_diff_mean"], stats["abs_diff_std"], self._sequential_tau_abs(stats))
+            if previous is not None:
+                # the running minimum over the looks is the always-valid p-value
+                previous_p_value = stats[keys].merge(previous[keys + ["sequential_p_value"]], on=keys, how="left")
+                p_value = np.fmin(p_value, previous_p_value["sequential_p_value"].to_numpy())
+            stats["sequential_p_value"] = p_value
+            self.stats = stats
+            self._cache = {}
         return self
 
     def summary_table(self, p_threshold: float = 0.05) -> pd.DataFrame:
         """return statistics summary.
+        The summary is cached for each p_threshold until the statistics are evaluated again.
 
         Parameters
         ----------
@@ -109,32 +445,20 @@ class ABTestEvaluator(BaseEvaluator):
             stats summary
         """
         self._validate_evaluate_executed()
+        self._warn_srm()
+        with self._stage("summary_table", n_group=self.stats.shape[0]):
+            summary = self._cached(("summary_table", p_threshold), lambda: self._build_summary_table(p_threshold))
+            return summary.copy()
 
-        stats = self.stats.copy(deep=True)
-        significance, abs_ci_width, rel_ci_width = eval_ttest_significance(self.stats, p_threshold)
-        stats["significance"] = significance
-        stats["abs_ci_width"] = abs_ci_width
-        stats["rel_ci_width"] = rel_ci_width
-        for diff_type in ["abs", "rel"]:
-            stats[f"ci_{diff_type}_diff"] = stats.apply(
-                lambda x: (
-                    x[f"{diff_type}_diff_mean"] - x[f"{diff_type}_ci_width"],
-                    x[f"{diff_type}_diff_mean"] + x[f"{diff_type}_ci_width"],
-                ),
-                axis=1,
-            )
-            del stats[f"{diff_type}_ci_width"]
-
-        srm_check_results = self._diagnose_srm()
-        for result in srm_check_results:
-            if result.significant:
-                print(f"[Warning] SRM was detected, pay attention to interpret the result. {result}")
-
-        return_cols = [col for col in stats.columns if col[-2:] != "_c"]
-        return stats.loc[:, return_cols]
-
-    def summary_plot(self, p_threshold: float = 0.05, diff_type: str = "rel", display_ci: bool = True) -> go.Figure:
+    def summary_plot(
+        self,
+        p_threshold: float = 0.05,
+        diff_type: str = "rel",
+        display_ci: bool = True,
+        experiment: Optional[Any] = None,
+    ) -> "go.Figure":
         """plot impact and confidence interval for each metric
+        The figure is cached for each option until the statistics are evaluated again.
 
         Parameters
         ----------
@@ -144,6 +468,9 @@ class ABTestEvaluator(BaseEvaluator):
             The type of difference you want to plot, by default 'rel'
         display_ci : bool, optional
             Whether to display confidence interval, by default True
+        experiment : Optional[Any], optional
+            The experiment to plot, by default None
+            It's required when many experiments were evaluated at once by passing experiment_col.
 
         Returns
         -------
@@ -152,36 +479,23 @@ class ABTestEvaluator(BaseEvaluator):
         self._validate_evaluate_executed()
         if diff_type not in ["rel", "abs"]:
             raise ValueError("Specified diff type is invalid.")
+        if self.experiment_col and experiment is None:
+            raise ValueError("Please specify the experiment to plot.")
+
+        self._warn_srm()
+        # the figure is built once for each option, and a copy is returned so that the cached one isn't modified.
+        with self._stage("summary_plot", n_group=self.stats.shape[0]):
+            figure = self._cached(
+                ("summary_plot", p_threshold, diff_type, display_ci, experiment),
+                lambda: self._build_summary_plot(p_threshold, diff_type, display_ci, experiment),
+            )
+            import plotly.graph_objs as go
 
-        stats = self.stats.copy(deep=True)
-        significance, abs_ci_width, rel_ci_width = eval_ttest_significance(self.stats, p_threshold)
-        stats["significant"] = significance
-        stats["abs_ci_width"] = abs_ci_width
-        stats["rel_ci_width"] = rel_ci_width
-
-        viz_options = {
-            "data_frame": stats.loc[stats[self.variant_col] > 1],  # not display control group
-            "x": f"{diff_type}_diff_mean",
-            "y": "metric",
-            "facet_col": self.variant_col,
-            "color": "significant",
-            "color_discrete_map": {"up": "#54A24B", "down": "#E45756", "unclear": "silver"},
-        }
-        if display_ci:
-            viz_options["error_x"] = f"{diff_type}_ci_width"
-        if len(self.segment_col) > 0:
-            viz_options["facet_row"] = self.segment_col
-            viz_options["height"] = stats[self.segment_col].nunique() * 200
-
-        srm_check_results = self._diagnose_srm()
-        for result in srm_check_results:
-            if result.significant:
-                print(f"[Warning] SRM was detected, pay attention to interpret the result. {result}")
-
-        g = px.bar(**viz_options)
-        return g
+            return go.Figure(figure)
 
-    def summary_barplot(self, p_threshold: float = 0.05, diff_type: str = "rel", display_ci: bool = True) -> go.Figure:
+    def summary_barplot(
+        self, p_threshold: float = 0.05, diff_type: str = "rel", display_ci: bool = True
+    ) -> "go.Figure":
         """plot impact and confidence interval for each metric
 
         Parameters
@@ -214,27 +528,178 @@ class ABTestEvaluator(BaseEvaluator):
         list[SRMCheckResult]
         """
         self._validate_evaluate_executed()
-        if self.segment_col:
-            stats_subset = self.stats[[self.variant_col, self.segment_col, "count", "count_c"]].drop_duplicates()
-        else:
-            stats_subset = self.stats[[self.variant_col, "count", "count_c"]].drop_duplicates()
-        chi2q, p_value = chisquare(f_obs=stats_subset[["count", "count_c"]], axis=1)
-        stats_subset["chi_square"] = chi2q
-        stats_subset["p_value"] = p_value
-        stats_subset["significant"] = p_value < 0.05
+        return list(self._cached(("srm",), self._check_srm))
+
+    def _check_srm(self) -> list[SRMCheckResult]:
+        experiment_cols = [self.experiment_col] if self.experiment_col else []
+        stats_subset = self.stats[
+            experiment_cols + [self.variant_col] + self.segment_cols + ["count", "count_c"]
+        ].drop_duplicates()
         stats_subset = stats_subset.loc[stats_subset[self.variant_col] > 1]
 
-        results = []
-        for _, row in stats_subset.iterrows():
-            result = SRMCheckResult(
-                variant=row[self.variant_col],
-                sample_size=row["count"],
-                sample_size_c=row["count_c"],
-                chi_square=row["chi_square"],
-                p_value=row["p_value"],
-                significant=row["significant"],
+        # each treatment variant is compared with the control, as a group of two rows having the equal allocation.
+        n_pair = stats_subset.shape[0]
+        pairs = pd.DataFrame(
+            {
+                "pair": np.tile(np.arange(n_pair), 2),
+                "count": np.concatenate([stats_subset["count"].to_numpy(), stats_subset["count_c"].to_numpy()]),
+            }
+        )
+        srm = srm_test(pairs, group_cols=["pair"])
+
+        results = [
+            SRMCheckResult(
+                variant=variant,
+                sample_size=sample_size,
+                sample_size_c=sample_size_c,
+                chi_square=chi_square,
+                p_value=p_value,
+                significant=p_value < 0.05,
             )
-            if self.segment_col:
-                result.segment = row[self.segment_col]
-            results.append(result)
+            for variant, sample_size, sample_size_c, chi_square, p_value in zip(
+                stats_subset[self.variant_col].tolist(),
+                stats_subset["count"].tolist(),
+                stats_subset["count_c"].tolist(),
+                srm["chi_square"].tolist(),
+                srm["p_value"].tolist(),
+            )
+        ]
+        if self.segment_cols:
+            for result, segment in zip(results, self._segment_label(stats_subset)):
+                result.segment = segment
+        if self.experiment_col:
+            for result, experiment in zip(results, stats_subset[self.experiment_col].tolist()):
+                result.experiment = experiment
         return results
+
+    def _warn_srm(self) -> None:
+        for result in self._diagnose_srm():
+            if result.significant:
+                print(f"[Warning] SRM was detected, pay attention to interpret the result. {result}")
+
+    def _significance(self, p_threshold: float) -> pd.DataFrame:
+        """return self.stats with the significance and the width of confidence intervals under p_threshold."""
+
+        def build() -> pd.DataFrame:
+            stats = self.stats.copy()
+            significance, abs_ci_width, rel_ci_width = eval_ttest_significance(self.stats, p_threshold)
+            stats["significance"] = significance
+            stats["abs_ci_width"] = abs_ci_width
+            stats["rel_ci_width"] = rel_ci_width
+            return stats
+
+        return self._cached(("significance", p_threshold), build)
+
+    def _build_summary_table(self, p_threshold: float) -> pd.DataFrame:
+        stats = self._significance(p_threshold).copy()
+        for diff_type in ["abs", "rel"]:
+            diff_mean = stats[f"{diff_type}_diff_mean"].to_numpy()
+            ci_width = stats.pop(f"{diff_type}_ci_width").to_numpy()
+            stats[f"ci_{diff_type}_diff"] = _interval(diff_mean - ci_width, diff_mean + ci_width)
+        if "sequential_p_value" in stats.columns:
+            diff_mean = stats["abs_diff_mean"].to_numpy()
+            cs_width = confidence_sequence_width(stats["abs_diff_std"], self._sequential_tau_abs(stats), p_threshold)
+            stats["ci_seq_abs_diff"] = _interval(diff_mean - cs_width, diff_mean + cs_width)
+
+        return_cols = [col for col in stats.columns if col[-2:] != "_c"]
+        return stats.loc[:, return_cols]
+
+    def _build_summary_plot(
+        self, p_threshold: float, diff_type: str, display_ci: bool, experiment: Optional[Any]
+    ) -> "go.Figure":
+        stats = self._significance(p_threshold).rename(columns={"significance": "significant"})
+        if self.experiment_col:
+            stats = stats.loc[stats[self.experiment_col] == experiment]
+            if stats.shape[0] == 0:
+                raise ValueError(f"Specified experiment {experiment} doesn't exist.")
+        viz_options = {
+            "x": f"{diff_type}_diff_mean",
+            "y": "metric",
+            "facet_col": self.variant_col,
+            "color": "significant",
+            "color_discrete_map": {"up": "#54A24B", "down": "#E45756", "unclear": "silver"},
+        }
+        if display_ci:
+            viz_options["error_x"] = f"{diff_type}_ci_width"
+        if len(self.segment_cols) == 1:
+            viz_options["facet_row"] = self.segment_col
+            viz_options["height"] = stats[self.segment_col].nunique() * 200
+        elif len(self.segment_cols) > 1:
+            stats["segment"] = self._segment_label(stats)
+            viz_options["facet_row"] = "segment"
+            viz_options["height"] = stats["segment"].nunique() * 200
+
+        import plotly.express as px
+
+        return px.bar(data_frame=stats.loc[stats[self.variant_col] > 1], **viz_options)  # not display control group
+
+    def _sequential_tau_abs(self, stats: pd.DataFrame) -> np.ndarray:
+        """the standard deviation of the mixture of mSPRT in the scale of the absolute difference of each row,
+        fixed at the first look. NaN for groups which haven't got it yet."""
+        keys = [self.variant_col] + self.segment_cols + ["metric"]
+        return stats[keys].merge(self.sequential_tau_abs, on=keys, how="left")["tau_abs"].to_numpy()
+
+    def _cached(self, key: tuple, build: Callable[[], Any]) -> Any:
+        """return the cached result of build() for the key. Every method assigning self.stats clears the cache,
+        so results derived from the previous statistics are never returned."""
+        if key not in self._cache:
+            self._cache[key] = build()
+        return self._cache[key]
+
+    def _set_segment_cols(self, segment_cols: list[str]) -> None:
+        self.segment_cols = segment_cols
+        self.segment_col = segment_cols[0] if len(segment_cols) == 1 else ""
+
+    def _segment_label(self, stats: pd.DataFrame) -> pd.Series:
+        """return the segment of each row. When multiple segment columns were evaluated, it's labeled as "column=value"."""
+        if len(self.segment_cols) == 1:
+            return stats[self.segment_col]
+        label = pd.Series(np.nan, index=stats.index, dtype=object)
+        for col in self.segment_cols:
+            filled = stats[col].notna()
+            label.loc[filled] = col + "=" + stats.loc[filled, col].astype(str)
+        return label
+
+
+def _is_numerical(segment: pd.Series) -> bool:
+    return pd_types.is_numeric_dtype(segment) and not pd_types.is_bool_dtype(segment)
+
+
+def _interval(lower: np.ndarray, upper: np.ndarray) -> np.ndarray:
+    interval = np.empty(lower.shape[0], dtype=object)
+    interval[:] = list(zip(lower.tolist(), upper.tolist()))
+    return interval
+
+
+def _validate_experiment_metrics(
+    experiment_col: Optional[str], experiment_metrics: dict[Any, list[str]], metrics: list[str]
+) -> None:
+    if len(experiment_metrics) > 0 and not experiment_col:
+        raise ValueError("experiment_metrics requires experiment_col.")
+    for experiment, experiment_metric in experiment_metrics.items():
+        unknown = set(experiment_metric) - set(metrics)
+        if unknown:
+            raise ValueError(
+                f"metrics of the experiment {experiment} aren't in the evaluated metrics: {sorted(unknown)}"
+            )
+
+
+def _select_experiment_metrics(
+    moments: pd.DataFrame, experiment_col: Optional[str], experiment_metrics: dict[Any, list[str]]
+) -> pd.DataFrame:
+    """drop moments of metrics not evaluated in the experiment. experiments not in experiment_metrics keep all metrics."""
+    if not experiment_col or len(experiment_metrics) == 0:
+        return moments
+    selected = pd.MultiIndex.from_tuples(
+        [(experiment, metric) for experiment, metrics in experiment_metrics.items() for metric in metrics],
+        names=[experiment_col, "metric"],
+    )
+    keys = pd.MultiIndex.from_frame(moments[[experiment_col, "metric"]])
+    keep = keys.isin(selected) | ~moments[experiment_col].isin(list(experiment_metrics)).to_numpy()
+    return moments.loc[keep].reset_index(drop=True)
+
+
+def _validate_control_exists(moments: pd.DataFrame, variant_col: str, group_cols: list[str]) -> None:
+    n_comparison = moments[group_cols + ["metric"]].drop_duplicates().shape[0]
+    if (moments[variant_col] == 1).sum() != n_comparison:
+        raise ValueError("the control variant seems not to exist.")
@@ -1,13 +1,89 @@
+import functools
+import time
+import tracemalloc
 from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Callable,
+    Iterator,
+    Optional,
+    TypeVar,
+    Union,
+    cast,
+)
 
 import pandas as pd
-import plotly.graph_objs as go
 from typing_extensions import Self
 
+from ..cache import ResultCache, fingerprint
+from ..native import NativeFrame
+from ..validation import validate_unit_col
+
+if TYPE_CHECKING:
+    import plotly.graph_objs as go
+
+F = TypeVar("F", bound=Callable[..., Any])
+
+
+@dataclass
+class StageRecord:
+    """elapsed time (and peak memory) of a stage of an evaluation, e.g., validate, aggregate, t_test, plot.
+    attributes have sizes processed in the stage, e.g., rows, n_metric, n_group."""
+
+    evaluator: str
+    stage: str
+    seconds: float
+    peak_memory_mb: Optional[float] = None
+    attributes: dict[str, Any] = field(default_factory=dict)
+
+
+def evaluation(method: F) -> F:
+    """decorate evaluate methods, so that profile has stages of the latest evaluation.
+    Records are reset when an evaluation starts, but not when it's called by another one. (e.g., evaluate_from_stats())
+    """
+
+    @functools.wraps(method)
+    def wrapper(self: "BaseEvaluator", *args: Any, **kwargs: Any) -> Any:
+        if self._evaluation_depth == 0:
+            self.profile_records = []
+        self._evaluation_depth += 1
+        try:
+            return method(self, *args, **kwargs)
+        finally:
+            self._evaluation_depth -= 1
+
+    return cast(F, wrapper)
+
 
 class BaseEvaluator(ABC):
+    # attributes storing the result of evaluate(), which are saved into (and restored from) result_cache.
+    _result_attributes: tuple[str, ...] = ("stats",)
+
     def __init__(self) -> None:
         self.stats: pd.DataFrame = pd.DataFrame()
+        # instrumentation of evaluations, see profile and _stage().
+        # callbacks are called with a StageRecord when each stage finishes. e.g., sending it to a metrics system.
+        self.profile_callbacks: list[Callable[[StageRecord], None]] = []
+        # when it's True, peak memory allocated in each stage is traced by tracemalloc, which slows down evaluations.
+        self.trace_memory: bool = False
+        self.profile_records: list[StageRecord] = []
+        self._evaluation_depth = 0
+        # when it's set, results of evaluate() are restored from the cache for the same data and parameters.
+        self.result_cache: Optional[ResultCache] = None
+
+    @property
+    def profile(self) -> pd.DataFrame:
+        """return a report of stages of the latest evaluation and summaries after it.
+        Each row has the stage, elapsed seconds, peak memory (MiB, when trace_memory is True) and sizes processed."""
+        records = [
+            {"stage": record.stage, "seconds": record.seconds, "peak_memory_mb": record.peak_memory_mb}
+            | record.attributes
+            for record in self.profile_records
+        ]
+        return pd.DataFrame(records, columns=None if records else ["stage", "seconds", "peak_memory_mb"])
 
     @abstractmethod
     # ignore mypy error temporary, because the "Self" type support on mypy is ongoing. https://github.com/python/mypy/pull/11666
@@ -19,15 +95,74 @@ class BaseEvaluator(ABC):
         return pd.DataFrame()
 
     @abstractmethod
-    def summary_plot(self) -> go.Figure:
+    def summary_plot(self) -> "go.Figure":
+        import plotly.graph_objs as go
+
         return go.Figure()
 
     def _validate_evaluate_executed(self) -> None:
         if self.stats.shape[0] == 0:
             raise ValueError("Evaluated statistics haven't been calculated. Please call evaluate() in advance.")
 
-    def _validate_passed_data(self, data: pd.DataFrame, unit_col: str, metrics: list[str]) -> None:
-        if data.shape[0] != data[unit_col].nunique():
-            raise ValueError("passed dataframe hasn't been aggregated by the randomization unit.")
+    @contextmanager
+    def _stage(self, stage: str, **attributes: Any) -> Iterator[dict[str, Any]]:
+        """measure a stage of an evaluation. The body can add attributes known after processing to the yielded dict.
+        Stages shouldn't be nested, because the peak memory of tracemalloc is reset at the beginning of each stage."""
+        trace_memory = self.trace_memory
+        started_tracing = False
+        if trace_memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                started_tracing = True
+            tracemalloc.reset_peak()
+        start = time.perf_counter()
+        try:
+            yield attributes
+        finally:
+            seconds = time.perf_counter() - start
+            peak_memory_mb = None
+            if trace_memory:
+                peak_memory_mb = tracemalloc.get_traced_memory()[1] / 2**20
+                if started_tracing:
+                    tracemalloc.stop()
+            record = StageRecord(type(self).__name__, stage, seconds, peak_memory_mb, attributes)
+            self.profile_records.append(record)
+            for callback in self.profile_callbacks:
+                callback(record)
+
+    def _load_result(
+        self, data: Union[pd.DataFrame, NativeFrame], columns: list[str], **params: Any
+    ) -> tuple[Optional[str], bool]:
+        """look up result_cache for the evaluation of the columns with the parameters, and restore the result if found.
+        It returns the key to store the result by _store_result(), and whether the result has been restored.
+        """
+        if self.result_cache is None:
+            return None, False
+        with self._stage("cache_lookup", rows=data.shape[0], n_column=len(columns)) as stage:
+            key = fingerprint(data, columns, evaluator=type(self).__name__, **params)
+            result = self.result_cache.get(key)
+            stage["hit"] = result is not None
+        if result is None:
+            return key, False
+        for name, value in result.items():
+            setattr(self, name, value)
+        return key, True
+
+    def _store_result(self, key: Optional[str]) -> None:
+        """store attributes of the evaluated result, listed in _result_attributes, into result_cache."""
+        if key is None or self.result_cache is None:
+            return
+        self.result_cache.put(key, {name: getattr(self, name) for name in self._result_attributes})
+
+    def _validate_passed_data(
+        self,
+        data: Union[pd.DataFrame, NativeFrame],
+        unit_col: str,
+        metrics: list[str],
+        assume_validated: bool = False,
+        experiment_col: Optional[str] = None,
+    ) -> None:
+        with self._stage("validate", rows=data.shape[0], assume_validated=assume_validated):
+            validate_unit_col(data, unit_col, assume_validated, experiment_col)
         if len(metrics) == 0:
             raise ValueError("metrics hasn't been specified.")
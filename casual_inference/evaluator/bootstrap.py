@@ -0,0 +1,381 @@
+import warnings
+from typing import TYPE_CHECKING, Optional
+
+import numpy as np
+import pandas as pd
+from scipy import sparse, special
+from typing_extensions import Self
+
+from ..statistical_testing import metric_values
+from .base import BaseEvaluator, evaluation
+from .parallel import map_blocks, resolve_n_jobs
+
+if TYPE_CHECKING:
+    import plotly.graph_objs as go
+
+# CDF of Poisson(1) scaled to 32 bits integers. A weight is the number of thresholds a random 32 bits integer exceeds,
+# it's several times faster than rng.poisson(). Weights more than 12 (probability less than 2^-32) are truncated.
+_POISSON_THRESHOLDS = np.round(special.pdtr(np.arange(12), 1.0) * 2**32).astype(np.uint64).astype(np.uint32)
+# the number of blocks summed up by a task, fixed so that the order of the summation doesn't depend on n_jobs.
+_BLOCKS_PER_TASK = 16
+
+
+class BootstrapEvaluator(BaseEvaluator):
+    _result_attributes = ("stats", "variant_col", "abs_diff_replicates", "rel_diff_replicates")
+
+    def __init__(
+        self,
+        n_bootstrap: int = 1000,
+        quantiles: Optional[list[float]] = None,
+        n_bins: int = 1000,
+        block_size: int = 4096,
+        n_jobs: Optional[int] = None,
+        random_state: Optional[int] = None,
+    ) -> None:
+        """initialize parameters affect result of evaluation.
+
+        Parameters
+        ----------
+        n_bootstrap : int, optional
+            The number of bootstrap replicates, by default 1000
+        quantiles : Optional[list[float]], optional
+            Quantiles evaluated in addition to the mean, by default None
+            e.g., [0.5, 0.9] evaluates the median and the 90th percentile of each metric.
+        n_bins : int, optional
+            The number of bins of each metric used to evaluate quantiles, by default 1000
+            Values are rounded down to the bin edges placed at quantiles of the whole data.
+            When a metric has distinct values not more than n_bins, quantiles are evaluated exactly.
+        block_size : int, optional
+            The number of units whose replicate weights are drawn at once, by default 4096
+            The memory used for the weights is about 20 * n_bootstrap * block_size bytes (for each worker process).
+        n_jobs : Optional[int], optional
+            The number of worker processes processing blocks in parallel, by default None (no worker process)
+            -1 means using all CPUs.
+        random_state : Optional[int], optional
+            Seed of replicate weights, by default None
+            The result is reproducible with the same seed and block_size, regardless of n_jobs.
+        """
+        quantiles = quantiles or []
+        if n_bootstrap <= 1:
+            raise ValueError("The number of bootstrap replicates should be more than 1.")
+        if any(not 0.0 <= q <= 1.0 for q in quantiles):
+            raise ValueError("quantiles should be in [0, 1].")
+        if n_bins <= 0 or block_size <= 0:
+            raise ValueError("n_bins and block_size should be positive number.")
+        resolve_n_jobs(n_jobs)
+
+        super().__init__()
+        self.n_bootstrap = n_bootstrap
+        self.quantiles = list(quantiles)
+        self.n_bins = n_bins
+        self.block_size = block_size
+        self.n_jobs = n_jobs
+        self.random_state = random_state
+        self.variant_col: str = ""
+        # bootstrap distributions of the differences, (rows of stats, n_bootstrap)
+        self.abs_diff_replicates = np.empty((0, n_bootstrap))
+        self.rel_diff_replicates = np.empty((0, n_bootstrap))
+
+    # ignore mypy error temporary, because the "Self" type support on mypy is ongoing. https://github.com/python/mypy/pull/11666
+    @evaluation
+    def evaluate(  # type: ignore
+        self,
+        data: pd.DataFrame,
+        unit_col: str,
+        metrics: list[str],
+        variant_col: str = "variant",
+        assume_validated: bool = False,
+    ) -> Self:
+        """evaluate the difference of the mean (and quantiles) of each metric from the control by Poisson bootstrap.
+
+        Each unit gets an independent Poisson(1) weight in each replicate, so replicates are calculated as
+        weighted sums without resampling the data. Weights are drawn for a block of units at once,
+        and sums of all metrics in each variant are calculated by a matrix product, then accumulated over blocks.
+        Therefore the memory is bounded by block_size, not by the number of units or replicates.
+        See: https://www.unofficialgoogledatascience.com/2015/08/an-introduction-to-poisson-bootstrap26.html
+
+        Parameters
+        ----------
+        data : pd.DataFrame
+            Dataframe has randomization unit column, variant assignment column, and metrics columns.
+            The data should have been aggregated by the randomization unit.
+        unit_col : str
+            A column name stores the randomization unit. something like user_id, session_id, ...
+        metrics : list[str]
+            Columns stores metrics you want to evaluate. Missing values are ignored.
+        variant_col : str
+            A column name stores the variant assignment.
+            The control variant should have value 1.
+        assume_validated : bool, optional
+            Skip checking that the data has been aggregated by the randomization unit, by default False
+
+        Returns
+        -------
+        self : object
+            Evaluator storing statistics calculated.
+        """
+        key, restored = None, False
+        # replicates are random without random_state, so they aren't cached.
+        if self.random_state is not None:
+            key, restored = self._load_result(
+                data,
+                [unit_col, variant_col] + metrics,
+                unit_col=unit_col,
+                metrics=metrics,
+                variant_col=variant_col,
+                assume_validated=assume_validated,
+                n_bootstrap=self.n_bootstrap,
+                quantiles=self.quantiles,
+                n_bins=self.n_bins,
+                block_size=self.block_size,
+                random_state=self.random_state,
+            )
+        if restored:
+            return self
+        self._validate_passed_data(data, unit_col, metrics, assume_validated)
+        variant_codes, variants = pd.factorize(data[variant_col], sort=True)
+        variants = np.asarray(variants).astype(int)
+        if (variant_codes < 0).any():
+            raise ValueError("variant column has missing values.")
+        if 1 not in variants:
+            raise ValueError("the control variant seems not to exist.")
+
+        n_unit, n_metric, n_group = data.shape[0], len(metrics), variants.shape[0]
+        with self._stage("prepare", rows=n_unit, n_metric=n_metric, n_group=n_group):
+            # metrics are kept in their own dtype without copying, and converted and masked block by block,
+            # so the memory doesn't grow with the number of units.
+            arrays = {"groups": variant_codes.astype(np.intp)}
+            for j, metric in enumerate(metrics):
+                arrays[f"metric_{j}"] = metric_values(data[metric])
+            edges = np.empty((n_metric, 0))
+            if self.quantiles:
+                edges = _bin_edges([arrays[f"metric_{j}"] for j in range(n_metric)], self.n_bins)
+                arrays["edges"] = edges
+
+        # weighted counts and sums of metrics, (n_bootstrap + 1, n_group, n_metric) are accumulated over blocks.
+        # (and weighted histograms, (n_bootstrap + 1, n_group, n_metric, n_bins) for quantiles)
+        # the last replicate has weights 1, i.e., it gives the point estimate on the original data.
+        starts = range(0, n_unit, self.block_size)
+        seeds = np.random.SeedSequence(self.random_state).spawn(len(starts))
+        blocks = [(start, min(start + self.block_size, n_unit), seed) for start, seed in zip(starts, seeds)]
+        tasks = [blocks[i : i + _BLOCKS_PER_TASK] for i in range(0, len(blocks), _BLOCKS_PER_TASK)]
+        n_bins = self.n_bins if self.quantiles else 0
+        totals: dict[str, np.ndarray] = {}
+        n_jobs = resolve_n_jobs(self.n_jobs)
+        with self._stage("resample", n_metric=n_metric, n_bootstrap=self.n_bootstrap, n_block=len(blocks)):
+            for task in map_blocks(_bootstrap_task, arrays, tasks, n_jobs, n_group, n_metric, self.n_bootstrap, n_bins):
+                for name, value in task.items():
+                    if name in totals:
+                        totals[name] += value
+                    else:
+                        totals[name] = value
+
+        # estimates of each statistic, (n_bootstrap + 1, n_group, n_metric, n_statistic)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            estimates = [totals["sum"] / totals["count"]]
+        for q in self.quantiles:
+            estimates.append(_weighted_quantile(totals["hist"], edges, q))
+        estimate = np.stack(estimates, axis=-1)
+        statistics = ["mean"] + [f"q{q:g}" for q in self.quantiles]
+
+        control = int(np.flatnonzero(variants == 1)[0])
+        treatments = [g for g in range(n_group) if g != control]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            abs_diff = estimate[:, treatments] - estimate[:, [control]]
+            rel_diff = estimate[:, treatments] / estimate[:, [control]] - 1
+        count = totals["count"][-1]
+
+        # rows are ordered by variant, metric, then statistic
+        n_statistic = len(statistics)
+        shape = (len(treatments), n_metric, n_statistic)
+        stats = pd.DataFrame()
+        stats[variant_col] = np.repeat(variants[treatments], n_metric * n_statistic)
+        stats["metric"] = np.tile(np.repeat(np.asarray(metrics, dtype=object), n_statistic), len(treatments))
+        stats["statistic"] = np.tile(np.asarray(statistics, dtype=object), len(treatments) * n_metric)
+        stats["value"] = estimate[-1, treatments].ravel()
+        stats["count"] = np.broadcast_to(count[treatments][..., np.newaxis], shape).ravel().astype(np.int64)
+        stats["value_c"] = np.broadcast_to(estimate[-1, control], shape).ravel()
+        stats["count_c"] = np.broadcast_to(count[control][..., np.newaxis], shape).ravel().astype(np.int64)
+        self.abs_diff_replicates = abs_diff[:-1].reshape(self.n_bootstrap, -1).T
+        self.rel_diff_replicates = rel_diff[:-1].reshape(self.n_bootstrap, -1).T
+        stats["abs_diff_mean"] = abs_diff[-1].ravel()
+        stats["abs_diff_std"] = self.abs_diff_replicates.std(axis=1, ddof=1)
+        stats["rel_diff_mean"] = rel_diff[-1].ravel()
+        stats["rel_diff_std"] = self.rel_diff_replicates.std(axis=1, ddof=1)
+        # two-sided p-value by inverting the percentile interval
+        below = (self.abs_diff_replicates <= 0).mean(axis=1)
+        above = (self.abs_diff_replicates >= 0).mean(axis=1)
+        stats["p_value"] = np.minimum(2 * np.minimum(below, above), 1.0)
+
+        self.stats = stats
+        self.variant_col = variant_col
+        self._store_result(key)
+        return self
+
+    def summary_table(self, p_threshold: float = 0.05) -> pd.DataFrame:
+        """return statistics summary with percentile confidence intervals of the bootstrap distributions.
+
+        Parameters
+        ----------
+        p_threshold : float, optional
+            significance level, by default 0.05
+
+        Returns
+        -------
+        pd.DataFrame
+            stats summary
+        """
+        self._validate_evaluate_executed()
+
+        stats = self.stats.copy(deep=True)
+        significant = stats["p_value"].to_numpy() <= p_threshold
+        diff = stats["abs_diff_mean"].to_numpy()
+        stats["significance"] = np.select(
+            [significant & (diff > 0), significant & (diff < 0)], ["up", "down"], "unclear"
+        ).astype(object)
+        for diff_type, replicates in [("abs", self.abs_diff_replicates), ("rel", self.rel_diff_replicates)]:
+            lower, upper = self._percentile_interval(replicates, p_threshold)
+            ci = np.empty(stats.shape[0], dtype=object)
+            ci[:] = list(zip(lower.tolist(), upper.tolist()))
+            stats[f"ci_{diff_type}_diff"] = ci
+        return stats
+
+    def summary_plot(self, p_threshold: float = 0.05, diff_type: str = "rel", display_ci: bool = True) -> "go.Figure":
+        """plot impact and percentile confidence interval for each metric
+
+        Parameters
+        ----------
+        p_threshold : float, optional
+            significance level, by default 0.05
+        diff_type : str, optional
+            The type of difference you want to plot, by default 'rel'
+        display_ci : bool, optional
+            Whether to display confidence interval, by default True
+
+        Returns
+        -------
+        go.Figure
+        """
+        self._validate_evaluate_executed()
+        if diff_type not in ["rel", "abs"]:
+            raise ValueError("Specified diff type is invalid.")
+
+        stats = self.summary_table(p_threshold)
+        lower, upper = self._percentile_interval(getattr(self, f"{diff_type}_diff_replicates"), p_threshold)
+        stats["error_plus"] = upper - stats[f"{diff_type}_diff_mean"]
+        stats["error_minus"] = stats[f"{diff_type}_diff_mean"] - lower
+
+        viz_options = {
+            "data_frame": stats,
+            "x": f"{diff_type}_diff_mean",
+            "y": "metric",
+            "facet_col": self.variant_col,
+            "color": "significance",
+            "color_discrete_map": {"up": "#54A24B", "down": "#E45756", "unclear": "silver"},
+        }
+        if display_ci:
+            viz_options["error_x"] = "error_plus"
+            viz_options["error_x_minus"] = "error_minus"
+        if self.quantiles:
+            viz_options["facet_row"] = "statistic"
+            viz_options["height"] = (len(self.quantiles) + 1) * 200
+        import plotly.express as px
+
+        return px.bar(**viz_options)
+
+    def _percentile_interval(self, replicates: np.ndarray, p_threshold: float) -> tuple[np.ndarray, np.ndarray]:
+        # relative differences are undefined (NaN) in all replicates when the statistic of the control is 0.
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", RuntimeWarning)
+            lower, upper = np.nanquantile(replicates, [p_threshold / 2, 1 - p_threshold / 2], axis=1)
+        return lower, upper
+
+
+def _bin_edges(values: list[np.ndarray], n_bins: int) -> np.ndarray:
+    """return bin edges of each metric, (n_metric, n_bins).
+    Edges are distinct values of the metric when they're not more than n_bins, otherwise quantiles of it.
+    The unused edges are filled with inf."""
+    edges = np.full((len(values), n_bins), np.inf)
+    for j, column in enumerate(values):
+        if column.dtype.kind == "f":
+            column = column[~np.isnan(column)]
+        edge = np.unique(column).astype(np.float64)
+        if edge.shape[0] > n_bins:
+            edge = np.unique(np.quantile(column, np.linspace(0.0, 1.0, n_bins, endpoint=False)))
+        edges[j, : edge.shape[0]] = edge
+    return edges
+
+
+def _bootstrap_task(
+    arrays: dict[str, np.ndarray], n_group: int, n_metric: int, n_bootstrap: int, n_bins: int, blocks: list[tuple]
+) -> dict[str, np.ndarray]:
+    """sum up results of blocks in the task sequentially."""
+    totals: dict[str, np.ndarray] = {}
+    for block in blocks:
+        for name, value in _bootstrap_block(arrays, n_group, n_metric, n_bootstrap, n_bins, block).items():
+            if name in totals:
+                totals[name] += value
+            else:
+                totals[name] = value
+    return totals
+
+
+def _bootstrap_block(
+    arrays: dict[str, np.ndarray], n_group: int, n_metric: int, n_bootstrap: int, n_bins: int, block: tuple
+) -> dict[str, np.ndarray]:
+    """calculate weighted counts, sums (and histograms) of metrics of units in the block for each replicate."""
+    start, stop, seed = block
+    groups = arrays["groups"][start:stop]
+    n_unit = groups.shape[0]
+    # metrics of the block are converted into float64, and missing values are masked by observed.
+    values = np.zeros((n_unit, n_metric))
+    observed = np.ones((n_unit, n_metric))
+    for j in range(n_metric):
+        column = arrays[f"metric_{j}"][start:stop]
+        missing = np.isnan(column) if column.dtype.kind == "f" else np.zeros(n_unit, dtype=bool)
+        values[~missing, j] = column[~missing]
+        observed[missing, j] = 0.0
+
+    # weights are laid out as (n_unit, n_bootstrap + 1), so products below don't need to copy the transpose.
+    bits = np.random.default_rng(seed).integers(0, 2**32, size=(n_unit, n_bootstrap), dtype=np.uint32)
+    counts = (bits >= _POISSON_THRESHOLDS[0]).view(np.uint8)
+    for threshold in _POISSON_THRESHOLDS[1:]:
+        counts += (bits >= threshold).view(np.uint8)
+    del bits
+    weights = np.empty((n_unit, n_bootstrap + 1))
+    weights[:, :-1] = counts
+    weights[:, -1] = 1.0
+    del counts
+
+    # features of each unit are placed at the columns of its group, then all groups are summed up by a product.
+    design = np.zeros((n_unit, n_group, 2, n_metric))
+    design[np.arange(n_unit), groups, 0] = observed
+    design[np.arange(n_unit), groups, 1] = values
+    sums = (weights.T @ design.reshape(n_unit, -1)).reshape(n_bootstrap + 1, n_group, 2, n_metric)
+    result = {"count": sums[:, :, 0], "sum": sums[:, :, 1]}
+
+    if n_bins > 0:
+        edges = arrays["edges"]
+        bins = np.empty((n_unit, n_metric), dtype=np.intp)
+        for j in range(n_metric):
+            n_edge = max(int(np.isfinite(edges[j]).sum()), 1)
+            bins[:, j] = np.searchsorted(edges[j, :n_edge], values[:, j], side="right") - 1
+        bins = np.maximum(bins, 0)
+        columns = (groups[:, np.newaxis] * n_metric + np.arange(n_metric)) * n_bins + bins
+        indicator = sparse.csr_matrix(
+            (observed.ravel(), (np.repeat(np.arange(n_unit), n_metric), columns.ravel())),
+            shape=(n_unit, n_group * n_metric * n_bins),
+        )
+        hist = np.asarray(indicator.T @ weights).T
+        result["hist"] = hist.reshape(n_bootstrap + 1, n_group, n_metric, n_bins)
+    return result
+
+
+def _weighted_quantile(hist: np.ndarray, edges: np.ndarray, q: float) -> np.ndarray:
+    """return the q-quantile (the inverted CDF) of weighted histograms, (..., n_metric, n_bins) -> (..., n_metric)."""
+    cumulative = np.cumsum(hist, axis=-1)
+    target = q * cumulative[..., -1:]
+    # the first bin whose cumulative weight reaches the target. (a tiny tolerance absorbs rounding errors)
+    index = np.argmax(cumulative >= target * (1 - 1e-12), axis=-1)
+    quantile = np.take_along_axis(np.broadcast_to(edges, hist.shape), index[..., np.newaxis], axis=-1)[..., 0]
+    return np.where(cumulative[..., -1] > 0, quantile, np.nan)
@@ -1,11 +1,36 @@
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Any
+
 import numpy as np
 import pandas as pd
-import plotly.express as px
-import plotly.graph_objs as go
-import statsmodels.formula.api as smf
+import pandas.api.types as pd_types
+from scipy import special
+from scipy.linalg import solve_triangular
 from typing_extensions import Self
 
-from .base import BaseEvaluator
+from ..statistical_testing import metric_values
+from .base import BaseEvaluator, evaluation
+
+if TYPE_CHECKING:
+    import plotly.graph_objs as go
+
+
+@dataclass
+class OLSResult:
+    """Estimated coefficients of a linear regression model, indexed by the design matrix column names.
+    Attribute names follow the statsmodels RegressionResults.
+    """
+
+    params: pd.Series
+    bse: pd.Series
+    tvalues: pd.Series
+    pvalues: pd.Series
+    nobs: int
+    df_resid: int
+
+    def conf_int(self, alpha: float = 0.05) -> pd.DataFrame:
+        width = special.stdtrit(self.df_resid, 1 - alpha / 2) * self.bse
+        return pd.DataFrame({0: self.params - width, 1: self.params + width})
 
 
 class LinearRegressionEvaluator(BaseEvaluator):
@@ -13,15 +38,19 @@ class LinearRegressionEvaluator(BaseEvaluator):
 
     Attributes
     ----------
-    models : dict[str, smf.ols]
+    models : dict[str, Any]
         linear regression models built to evaluate the impact of each metric.
+        OLSResult with the numpy engine, statsmodels RegressionResults with the statsmodels engine.
     """
 
+    _result_attributes = ("stats", "models")
+
     def __init__(self) -> None:
         super().__init__()
-        self.models: dict[str, smf.ols] = dict()
+        self.models: dict[str, Any] = dict()
 
     # ignore mypy error temporary, because the "Self" type support on mypy is ongoing. https://github.com/python/mypy/pull/11666
+    @evaluation
     def evaluate(
         self,
         data: pd.DataFrame,
@@ -29,6 +58,9 @@ class LinearRegressionEvaluator(BaseEvaluator):
         metrics: list[str],
         treatment_col: str = "treatment",
         covariates: list[str] = [],
+        engine: str = "numpy",
+        absorb: list[str] = [],
+        assume_validated: bool = False,
     ) -> Self:  # type: ignore
         """Evaluate impact by Linear Regression model
 
@@ -47,26 +79,119 @@ class LinearRegressionEvaluator(BaseEvaluator):
                 - 1: received treatment
         covariates : list[str], optional
             column names of covariate variables you want to use for the analysis, by default []
+            Non-numerical columns are treated as categorical variables (dummy coded, the first level is the reference).
+        engine : str, optional
+            How to fit the models, by default "numpy"
+                - "numpy": build the design matrix once, then solve all metrics at once with a single QR decomposition.
+                - "statsmodels": fit a statsmodels formula model per metric.
+        absorb : list[str], optional
+            column names of categorical covariates absorbed as fixed effects, by default []
+            Useful for high-cardinality categorical variables (e.g., store_id, city) since dummy variables are not built.
+            The coefficient and standard error of the treatment are the same with passing them to covariates,
+            but coefficients of the absorbed variables and the intercept are not estimated.
+            Only supported by the numpy engine.
+        assume_validated : bool, optional
+            Skip checking that the data has been aggregated by the randomization unit, by default False
+            Use it for trusted inputs, e.g., units already aggregated by an upstream pipeline.
 
         Returns
         -------
         Self
             Evaluator object has statistics calculated
         """
-        self._validate_passed_data(data, unit_col, metrics)
+        key, restored = self._load_result(
+            data,
+            [unit_col, treatment_col] + covariates + absorb + metrics,
+            unit_col=unit_col,
+            metrics=metrics,
+            treatment_col=treatment_col,
+            covariates=covariates,
+            engine=engine,
+            absorb=absorb,
+            assume_validated=assume_validated,
+        )
+        if restored:
+            return self
+        self._validate_passed_data(data, unit_col, metrics, assume_validated)
         if set(data[treatment_col].unique()) != {0, 1}:
             raise ValueError("The treatment value should be binary.")
+        if engine not in ["numpy", "statsmodels"]:
+            raise ValueError("Specified engine is invalid.")
+        if len(absorb) > 0 and engine != "numpy":
+            raise ValueError("Absorbing fixed effects is only supported by the numpy engine.")
+        if len(set(absorb) & set(covariates)) > 0:
+            raise ValueError("Absorbed columns shouldn't be passed to covariates.")
 
-        # to avoid errors in later steps
-        data[treatment_col] = data[treatment_col].astype(int)
-        for metric_col in metrics:
-            data[metric_col] = data[metric_col].astype(np.float64)
+        self.models = dict()
+        with self._stage("fit", rows=data.shape[0], n_metric=len(metrics), engine=engine):
+            if engine == "numpy":
+                self.stats = self._fit_numpy(data, metrics, treatment_col, covariates, absorb)
+            else:
+                self.stats = self._fit_statsmodels(data, metrics, treatment_col, covariates)
+        self._store_result(key)
+        return self
+
+    def _fit_numpy(
+        self, data: pd.DataFrame, metrics: list[str], treatment_col: str, covariates: list[str], absorb: list[str]
+    ) -> pd.DataFrame:
+        design = _build_design_matrix(data, treatment_col, covariates)
+        complete = (design.notna().all(axis=1) & data[absorb].notna().all(axis=1)).to_numpy()
+        # metrics are upcast column by column into the response matrix, without copying the data.
+        response = np.empty((int(complete.sum()), len(metrics)), order="F")
+        for j, metric in enumerate(metrics):
+            response[:, j] = metric_values(data[metric])[complete]
+        design = design.loc[complete]
+        fixed_effects = []
+        if len(absorb) > 0:
+            # the intercept is absorbed by the fixed effects
+            design = design.drop(columns="Intercept")
+            fixed_effects = [pd.factorize(data.loc[complete, col])[0] for col in absorb]
+
+        missing = np.isnan(response).any(axis=0)
+        if not missing.all():
+            # metrics observed in all rows share one factorization of the design matrix
+            fitted = _solve_ols(design.to_numpy(dtype=np.float64), response[:, ~missing], fixed_effects)
+            for metric, result in zip(np.asarray(metrics)[~missing], fitted):
+                self.models[metric] = _to_ols_result(design.columns, *result)
+        for j in np.flatnonzero(missing):
+            observed = ~np.isnan(response[:, j])
+            fitted = _solve_ols(
+                design.to_numpy(dtype=np.float64)[observed],
+                response[observed, j : j + 1],
+                [codes[observed] for codes in fixed_effects],
+            )
+            self.models[metrics[j]] = _to_ols_result(design.columns, *fitted[0])
+
+        rows = []
+        for metric in metrics:
+            model = self.models[metric]
+            conf_int = model.conf_int()
+            rows.append(
+                {
+                    "coef": model.params[treatment_col],
+                    "std err": model.bse[treatment_col],
+                    "t": model.tvalues[treatment_col],
+                    "P>|t|": model.pvalues[treatment_col],
+                    "[0.025": conf_int.loc[treatment_col, 0],
+                    "0.975]": conf_int.loc[treatment_col, 1],
+                    "metric": metric,
+                }
+            )
+        return pd.DataFrame(rows)
+
+    def _fit_statsmodels(
+        self, data: pd.DataFrame, metrics: list[str], treatment_col: str, covariates: list[str]
+    ) -> pd.DataFrame:
+        # statsmodels (and patsy) take seconds to import, so they're imported only when the formula path is used.
+        import statsmodels.formula.api as smf
 
         covariates_str = ""
         if len(covariates) > 0:
             covariates_str = "+ " + "+ ".join(covariates)
+        # the formula needs the integer treatment, so it's converted in a copy of the used columns.
+        data = data[list(dict.fromkeys([treatment_col] + covariates + metrics))].astype({treatment_col: int})
 
-        stats = self.stats.copy(deep=True)
+        stats = pd.DataFrame()
         for metric in metrics:
             model = smf.ols(formula=f"{metric} ~ {treatment_col} {covariates_str}", data=data).fit()
             self.models[metric] = model
@@ -76,15 +201,14 @@ class LinearRegressionEvaluator(BaseEvaluator):
             stats_partial["metric"] = metric
             stats = pd.concat([stats, stats_partial])
 
-        self.stats = stats.loc[stats["index"] == treatment_col].reset_index(drop=True).drop("index", axis=1)
-        return self
+        return stats.loc[stats["index"] == treatment_col].reset_index(drop=True).drop("index", axis=1)
 
     def summary_table(self) -> pd.DataFrame:
         self._validate_evaluate_executed()
         stats = self.stats.copy(deep=True)
         return stats
 
-    def summary_plot(self, p_threshold: float = 0.05, display_ci: bool = True) -> go.Figure:
+    def summary_plot(self, p_threshold: float = 0.05, display_ci: bool = True) -> "go.Figure":
         """Plot evaluated impact and confidence interval for each metric.
         Currently it only supports the absolute difference visualization.
 
@@ -122,5 +246,121 @@ class LinearRegressionEvaluator(BaseEvaluator):
         if display_ci:
             viz_options["error_x"] = "abs_ci_width"
 
+        import plotly.express as px
+
         g = px.bar(**viz_options)
         return g
+
+
+def _build_design_matrix(data: pd.DataFrame, treatment_col: str, covariates: list[str]) -> pd.DataFrame:
+    """build the design matrix having the same columns with the patsy formula "metric ~ treatment + covariates"."""
+    design = pd.DataFrame({"Intercept": np.ones(data.shape[0])}, index=data.index)
+    design[treatment_col] = data[treatment_col]
+    for col in covariates:
+        covariate = data[col]
+        if pd_types.is_numeric_dtype(covariate) and not pd_types.is_bool_dtype(covariate):
+            design[col] = covariate
+            continue
+        dummies = pd.get_dummies(covariate, prefix=col, prefix_sep="[T.", drop_first=True, dtype=np.float64)
+        dummies.columns = [f"{name}]" for name in dummies.columns]
+        dummies.loc[covariate.isna()] = np.nan
+        design = pd.concat([design, dummies], axis=1)
+    return design
+
+
+def _solve_ols(
+    design: np.ndarray, response: np.ndarray, fixed_effects: list[np.ndarray] = []
+) -> list[tuple[np.ndarray, np.ndarray, int, int]]:
+    """fit OLS of each response column on the same design matrix.
+
+    Parameters
+    ----------
+    design : np.ndarray
+        (n_obs, n_param) design matrix.
+    response : np.ndarray
+        (n_obs, n_response) response matrix.
+    fixed_effects : list[np.ndarray], optional
+        Group codes of categorical variables absorbed as fixed effects, by default []
+        The design matrix and responses are demeaned within each group (within transformation) before the fit.
+
+    Returns
+    -------
+    list[tuple[np.ndarray, np.ndarray, int, int]]
+        coefficients, standard errors, number of observations and residual degree of freedom of each response.
+    """
+    n_obs, n_param = design.shape
+    n_absorbed = 0
+    if len(fixed_effects) > 0:
+        demeaned = _demean(np.column_stack([design, response]), fixed_effects)
+        design, response = demeaned[:, :n_param], demeaned[:, n_param:]
+        n_absorbed = _count_absorbed(fixed_effects)
+
+    q, r = np.linalg.qr(design)
+    diagonal = np.abs(np.diag(r))
+    df_resid = n_obs - n_param - n_absorbed
+    if df_resid <= 0 or diagonal.min() <= diagonal.max() * n_param * np.finfo(np.float64).eps:
+        raise ValueError("The design matrix is rank deficient. Please check the covariates.")
+
+    coef = solve_triangular(r, q.T @ response)
+    residual = response - design @ coef
+    sigma2 = (residual**2).sum(axis=0) / df_resid
+    r_inv = solve_triangular(r, np.eye(n_param))
+    unscaled_var = (r_inv**2).sum(axis=1)
+    stderr = np.sqrt(unscaled_var[:, np.newaxis] * sigma2[np.newaxis, :])
+    return [(coef[:, j], stderr[:, j], n_obs, df_resid) for j in range(response.shape[1])]
+
+
+def _count_absorbed(fixed_effects: list[np.ndarray]) -> int:
+    """return the number of parameters absorbed by the fixed effects, i.e., the rank of their dummy variables.
+
+    Levels of fixed effects are connected when they appear in the same observation. In each connected component,
+    one level of each fixed effect other than the first one is redundant with the others.
+    It's exact for one or two fixed effects. With more of them, redundancies beyond the components can exist,
+    so the degree of freedom can be underestimated, i.e., standard errors are slightly conservative.
+    """
+    n_levels = [int(codes.max()) + 1 for codes in fixed_effects]
+    if len(fixed_effects) == 1:
+        return n_levels[0]
+    from scipy.sparse import coo_matrix
+    from scipy.sparse.csgraph import connected_components
+
+    # a graph of levels of all fixed effects, whose edges connect the level of the first one to the others.
+    offsets = np.cumsum([0] + n_levels)
+    rows = np.concatenate([fixed_effects[0]] * (len(fixed_effects) - 1))
+    cols = np.concatenate([codes + offset for codes, offset in zip(fixed_effects[1:], offsets[1:-1])])
+    graph = coo_matrix((np.ones(rows.shape[0], dtype=np.int8), (rows, cols)), shape=(offsets[-1], offsets[-1]))
+    n_components, _ = connected_components(graph, directed=False)
+    return int(offsets[-1]) - (len(fixed_effects) - 1) * n_components
+
+
+def _demean(
+    matrix: np.ndarray, fixed_effects: list[np.ndarray], tol: float = 1e-10, max_iter: int = 1000
+) -> np.ndarray:
+    """subtract group means of each fixed effect from every column.
+    Multiple fixed effects are swept alternately until the matrix converges. (method of alternating projections)
+    """
+    matrix = matrix.copy()
+    scale = np.maximum(np.abs(matrix).max(axis=0), 1.0)
+    counts = [np.bincount(codes) for codes in fixed_effects]
+    for _ in range(max_iter):
+        max_change = np.zeros(matrix.shape[1])
+        for codes, count in zip(fixed_effects, counts):
+            for j in range(matrix.shape[1]):
+                group_mean = np.bincount(codes, weights=matrix[:, j], minlength=count.shape[0]) / count
+                matrix[:, j] -= group_mean[codes]
+                max_change[j] = max(max_change[j], np.abs(group_mean).max())
+        if len(fixed_effects) == 1 or (max_change / scale).max() < tol:
+            return matrix
+    raise ValueError("Demeaning by the fixed effects didn't converge.")
+
+
+def _to_ols_result(names: pd.Index, coef: np.ndarray, stderr: np.ndarray, nobs: int, df_resid: int) -> OLSResult:
+    tvalues = coef / stderr
+    return OLSResult(
+        params=pd.Series(coef, index=names),
+        bse=pd.Series(stderr, index=names),
+        tvalues=pd.Series(tvalues, index=names),
+        pvalues=pd.Series(2 * special.stdtr(df_resid, -np.abs(tvalues)), index=names),
+        nobs=nobs,
+        df_resid=df_resid,
+    )
@@ -0,0 +1,64 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from multiprocessing.shared_memory import SharedMemory
+from typing import Any, Callable, Iterator, Optional, Sequence
+
+import numpy as np
+
+
+def resolve_n_jobs(n_jobs: Optional[int]) -> int:
+    """return the number of worker processes. None means no worker process, and -1 means all CPUs."""
+    if n_jobs is not None and (n_jobs == 0 or n_jobs < -1):
+        raise ValueError("n_jobs should be positive number or -1.")
+    return (os.cpu_count() or 1) if n_jobs == -1 else (n_jobs or 1)
+
+
+def map_blocks(
+    func: Callable[..., Any], arrays: dict[str, np.ndarray], blocks: Sequence[Any], n_jobs: int, *args: Any
+) -> Iterator[Any]:
+    """yield func(arrays, *args, block) for each block in order.
+
+    When n_jobs > 1, blocks are processed by worker processes, and the arrays are shared with them through
+    shared memory instead of being pickled for each block. The arrays are moved to the shared memory,
+    i.e., the passed dict is emptied, so that the parent process doesn't hold two copies of them.
+    func should be a module level function so that it can be pickled.
+    """
+    if n_jobs == 1 or len(blocks) <= 1:
+        for block in blocks:
+            yield func(arrays, *args, block)
+        return
+
+    shared_memories = []
+    try:
+        specs = {}
+        for name, array in arrays.items():
+            shm = SharedMemory(create=True, size=max(array.nbytes, 1))
+            shared_memories.append(shm)
+            np.ndarray(array.shape, dtype=array.dtype, buffer=shm.buf)[:] = array
+            specs[name] = (shm.name, array.shape, array.dtype.str)
+        arrays.clear()
+        with ProcessPoolExecutor(
+            max_workers=min(n_jobs, len(blocks)), initializer=_attach_shared_arrays, initargs=(specs,)
+        ) as executor:
+            yield from executor.map(partial(_call_in_worker, func, *args), blocks)
+    finally:
+        for shm in shared_memories:
+            shm.close()
+            shm.unlink()
+
+
+_worker_arrays: dict[str, np.ndarray] = {}
+_worker_shared_memories: list[SharedMemory] = []
+
+
+def _attach_shared_arrays(specs: dict[str, tuple[str, tuple[int, ...], str]]) -> None:
+    """attach arrays placed on shared memory by the parent process. (called once per worker process)"""
+    for name, (shm_name, shape, dtype) in specs.items():
+        shm = SharedMemory(name=shm_name)
+        _worker_shared_memories.append(shm)
+        _worker_arrays[name] = np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf)
+
+
+def _call_in_worker(func: Callable[..., Any], *args: Any) -> Any:
+    return func(_worker_arrays, *args)
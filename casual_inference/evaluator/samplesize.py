@@ -1,62 +1,226 @@
-from typing import Optional
+from typing import TYPE_CHECKING, Iterable, Optional, Union
 
 import numpy as np
 import pandas as pd
-import plotly.express as px
-import plotly.graph_objs as go
+from numpy.typing import ArrayLike
 from typing_extensions import Self
 
-from .base import BaseEvaluator
+from ..accumulator import MomentAccumulator
+from ..native import NativeFrame
+from ..statistical_testing import (
+    aggregate_moments,
+    calc_mde,
+    calc_sample_size,
+    moments_from_sums,
+)
+from .base import BaseEvaluator, evaluation
+
+if TYPE_CHECKING:
+    import plotly.graph_objs as go
+
+THRESHOLDS = np.arange(0.01, 1.01, 0.01)
 
 
 class SampleSizeEvaluator(BaseEvaluator):
-    def __init__(self) -> None:
+    _result_attributes = ("stats", "n_variant", "metric_stats")
+
+    def __init__(
+        self,
+        alpha: float = 0.05,
+        power: float = 0.8,
+        ratio: float = 1.0,
+        alternative: str = "two-sided",
+        bonferroni: bool = False,
+    ) -> None:
+        """initialize parameters of the power analysis.
+
+        Parameters
+        ----------
+        alpha : float, optional
+            significance level, by default 0.05
+        power : float, optional
+            statistical power (1 - type II error rate), by default 0.8
+        ratio : float, optional
+            allocation ratio, the number of units in each treatment variant divided by the control one, by default 1.0
+        alternative : str, optional
+            "two-sided" or "one-sided", by default "two-sided"
+        bonferroni : bool, optional
+            whether to divide alpha by the number of comparisons (n_variant - 1), by default False
+        """
+        if not 0.0 < alpha < 1.0 or not 0.0 < power < 1.0:
+            raise ValueError("alpha and power should be in (0, 1).")
+        if ratio <= 0:
+            raise ValueError("The allocation ratio should be positive number.")
+        if alternative not in ["two-sided", "one-sided"]:
+            raise ValueError("Specified alternative is invalid.")
+
         super().__init__()
+        self.alpha = alpha
+        self.power = power
+        self.ratio = ratio
+        self.alternative = alternative
+        self.bonferroni = bonferroni
+        self.n_variant = 2
+        self.metric_stats: pd.DataFrame = pd.DataFrame()
 
     # ignore mypy error temporary, because the "Self" type support on mypy is ongoing. https://github.com/python/mypy/pull/11666
-    def evaluate(self, data: pd.DataFrame, unit_col: str, metrics: list[str], n_variant: int = 2) -> Self:  # type: ignore
+    @evaluation
+    def evaluate(  # type: ignore
+        self,
+        data: Union[pd.DataFrame, NativeFrame],
+        unit_col: str,
+        metrics: list[str],
+        n_variant: int = 2,
+        assume_validated: bool = False,
+    ) -> Self:
         """Calculate statistics of metrics and mde with simulating A/B test threshold.
+        The threshold is the fraction of units assigned to the A/B test.
+        The sample_size column is the number of units in the control variant.
 
         Parameters
         ----------
-        data : pd.DataFrame
+        data : Union[pd.DataFrame, pyarrow.Table, polars.DataFrame]
             Dataframe has randomization unit column, and metrics columns. The data should have been aggregated by the randomization unit.
+            Arrow and Polars frames are aggregated by polars without converting them into pandas.
+        unit_col : str
+            A column name stores the randomization unit. something like user_id, session_id, ...
+        metrics : list[str]
+            Columns stores metrics you want to evaluate.
+        n_variant : int, optional
+            The number of variant planned in the A/B test, by default 2
+        assume_validated : bool, optional
+            Skip checking that the data has been aggregated by the randomization unit, by default False
+            Use it for trusted inputs, e.g., units already aggregated by an upstream pipeline.
+
+        Returns
+        -------
+        self : object
+            Evaluator storing statistics calculated.
+        """
+        key, restored = self._load_result(
+            data,
+            [unit_col] + metrics,
+            unit_col=unit_col,
+            metrics=metrics,
+            n_variant=n_variant,
+            assume_validated=assume_validated,
+            alpha=self.alpha,
+            power=self.power,
+            ratio=self.ratio,
+            alternative=self.alternative,
+            bonferroni=self.bonferroni,
+        )
+        if restored:
+            return self
+        self._validate_passed_data(data, unit_col, metrics, assume_validated)
+
+        with self._stage("aggregate", rows=data.shape[0], n_metric=len(metrics)):
+            moments = aggregate_moments(data, [], metrics)
+        self.stats = self._simulate_threshold(moments, n_variant)
+        self._store_result(key)
+        return self
+
+    # ignore mypy error temporary, because the "Self" type support on mypy is ongoing. https://github.com/python/mypy/pull/11666
+    @evaluation
+    def evaluate_chunks(
+        self,
+        chunks: Iterable[pd.DataFrame],
+        unit_col: str,
+        metrics: list[str],
+        n_variant: int = 2,
+        assume_validated: bool = False,
+    ) -> Self:  # type: ignore
+        """Same as evaluate(), but accumulate statistics of metrics from an iterator of DataFrame chunks.
+
+        Parameters
+        ----------
+        chunks : Iterable[pd.DataFrame]
+            DataFrames have the same schema with the data passed to evaluate().
+            e.g., pd.read_csv(..., chunksize=100000)
+            Each randomization unit should appear only once across all chunks.
         unit_col : str
             A column name stores the randomization unit. something like user_id, session_id, ...
         metrics : list[str]
             Columns stores metrics you want to evaluate.
         n_variant : int, optional
             The number of variant planned in the A/B test, by default 2
+        assume_validated : bool, optional
+            Skip checking that each chunk has been aggregated by the randomization unit, by default False
 
         Returns
         -------
         self : object
             Evaluator storing statistics calculated.
         """
-        self._validate_passed_data(data, unit_col, metrics)
-
-        # to avoid errors in later steps
-        for metric_col in metrics:
-            data[metric_col] = data[metric_col].astype(np.float64)
-
-        stats = pd.DataFrame()
-        for metric in metrics:
-            stats_partial = pd.DataFrame()
-            stats_partial["threshold"] = np.arange(0.01, 1.01, 0.01)
-            stats_partial["metric"] = metric
-            stats_partial["mean"] = data[metric].mean()
-            stats_partial["var"] = data[metric].var()
-            stats_partial["count"] = data[metric].count()
-            stats = pd.concat([stats, stats_partial])
-
-        stats["sample_size"] = stats["threshold"] * stats["count"] / n_variant
-        stats["mde_abs"] = 4 * np.sqrt(stats["var"] / stats["sample_size"])
-        stats["mde_rel"] = stats["mde_abs"] / stats["mean"]
-        self.stats = stats
+        accumulator = MomentAccumulator([], metrics)
+        for chunk in chunks:
+            self._validate_passed_data(chunk, unit_col, metrics, assume_validated)
+            with self._stage("accumulate", rows=chunk.shape[0]):
+                accumulator.update(chunk)
+        if accumulator.moments.shape[0] == 0:
+            raise ValueError("passed chunks are empty.")
+        self.stats = self._simulate_threshold(accumulator.to_frame(), n_variant)
         return self
 
+    # ignore mypy error temporary, because the "Self" type support on mypy is ongoing. https://github.com/python/mypy/pull/11666
+    @evaluation
+    def evaluate_from_stats(self, stats: pd.DataFrame, n_variant: int = 2) -> Self:  # type: ignore
+        """Same as evaluate(), but calculate from pre-aggregated sufficient statistics of metrics.
+
+        Parameters
+        ----------
+        stats : pd.DataFrame
+            Dataframe has "metric", "count", "sum" and "sum_sq" columns, one row for each metric.
+            e.g., the result of "SELECT COUNT(x), SUM(x), SUM(x * x) FROM ...", or query_stats() without variant_col.
+            Dataframe has "mean" and "var" (unbiased variance) columns instead of "sum" and "sum_sq" is also accepted.
+        n_variant : int, optional
+            The number of variant planned in the A/B test, by default 2
+
+        Returns
+        -------
+        self : object
+            Evaluator storing statistics calculated.
+        """
+        if "metric" not in stats.columns:
+            raise ValueError("Necessary column does not exist: metric")
+        if stats.shape[0] == 0:
+            raise ValueError("passed statistics is empty.")
+        if stats["metric"].duplicated().any():
+            raise ValueError("passed statistics has duplicated rows for the same metric.")
+
+        if "mean" in stats.columns and "var" in stats.columns:
+            moments = stats.loc[:, ["metric", "mean", "var", "count"]]
+        else:
+            moments = moments_from_sums(stats.loc[:, ["metric", "count", "sum", "sum_sq"]])
+        self.stats = self._simulate_threshold(moments, n_variant)
+        return self
+
+    def _simulate_threshold(self, moments: pd.DataFrame, n_variant: int) -> pd.DataFrame:
+        if n_variant < 2:
+            raise ValueError("n_variant should be more than or equal 2.")
+        self.n_variant = n_variant
+        self.metric_stats = moments.loc[:, ["metric", "mean", "var", "count"]].reset_index(drop=True)
+
+        n_metric, n_threshold = moments.shape[0], THRESHOLDS.shape[0]
+        with self._stage("simulate_threshold", n_metric=n_metric, n_threshold=n_threshold):
+            stats = pd.DataFrame(
+                {
+                    "threshold": np.tile(THRESHOLDS, n_metric),
+                    "metric": np.repeat(moments["metric"].to_numpy(), n_threshold),
+                    "mean": np.repeat(moments["mean"].to_numpy(), n_threshold),
+                    "var": np.repeat(moments["var"].to_numpy(), n_threshold),
+                    "count": np.repeat(moments["count"].to_numpy(), n_threshold),
+                },
+                index=np.tile(np.arange(n_threshold), n_metric),
+            )
+            stats["sample_size"] = stats["threshold"] * stats["count"] / (1 + (n_variant - 1) * self.ratio)
+            stats["mde_abs"] = self._calc_mde(stats["var"].to_numpy(), stats["sample_size"].to_numpy(), n_variant)
+            stats["mde_rel"] = stats["mde_abs"] / stats["mean"]
+        return stats
+
     def summary_table(self, target_mde: Optional[float] = None) -> pd.DataFrame:
         """Find threshold suffices the provided target MDE.
+        The required threshold is calculated in closed form, then rounded up to the simulated threshold.
 
         Parameters
         ----------
@@ -71,11 +235,127 @@ class SampleSizeEvaluator(BaseEvaluator):
         self._validate_evaluate_executed()
         _validate_target_mde(target_mde)
         stats = self.stats.copy(deep=True)
-        if target_mde:
-            return stats.loc[stats["mde_rel"] <= target_mde].groupby("metric").head(1)
-        return stats
+        if not target_mde:
+            return stats
+
+        metric_stats = self.metric_stats
+        required_size = self._calc_sample_size(
+            metric_stats["var"].to_numpy(), target_mde * np.abs(metric_stats["mean"].to_numpy()), self.n_variant
+        )
+        required_threshold = required_size * (1 + (self.n_variant - 1) * self.ratio) / metric_stats["count"].to_numpy()
+        with np.errstate(invalid="ignore"):
+            # -1e-9 absorbs floating point errors on the exact thresholds
+            threshold_idx = np.maximum(np.ceil(required_threshold * 100 - 1e-9), 1) - 1
+        n_threshold = THRESHOLDS.shape[0]
+        feasible = np.flatnonzero(threshold_idx < n_threshold)
+        positions = feasible * n_threshold + threshold_idx[feasible].astype(int)
+        summary = stats.iloc[positions]
+        return summary.loc[summary["mde_rel"].abs() <= target_mde]
 
-    def summary_plot(self, target_mde: Optional[float] = None) -> go.Figure:
+    def summary_scenarios(
+        self,
+        alpha: ArrayLike = 0.05,
+        power: ArrayLike = 0.8,
+        ratio: ArrayLike = 1.0,
+        n_variant: ArrayLike = 2,
+        target_mde: Optional[ArrayLike] = None,
+    ) -> pd.DataFrame:
+        """Calculate MDE (and required sample size) of each metric for every scenario at once.
+        Scenario parameters are broadcast against each other, then evaluated against all metrics.
+
+        Parameters
+        ----------
+        alpha : ArrayLike, optional
+            significance levels, by default 0.05
+        power : ArrayLike, optional
+            statistical powers, by default 0.8
+        ratio : ArrayLike, optional
+            allocation ratios, the number of units in each treatment variant divided by the control one, by default 1.0
+        n_variant : ArrayLike, optional
+            the number of variants including the control, by default 2
+        target_mde : Optional[ArrayLike], optional
+            The relative Minimum Detectable Effects you want to set in the A/B test.
+            When it's specified, the required sample size and threshold are also calculated.
+
+        Returns
+        -------
+        pd.DataFrame
+            A row for each (metric, scenario) pair.
+            "mde_abs" and "mde_rel" are MDE when all units are assigned to the A/B test. (threshold = 1.0)
+            "required_sample_size" is the number of units required in the control variant.
+            "required_threshold" is the fraction of units required to be assigned, larger than 1 means infeasible.
+        """
+        self._validate_evaluate_executed()
+        scenarios = {"alpha": alpha, "power": power, "ratio": ratio, "n_variant": n_variant}
+        if target_mde is not None:
+            scenarios["target_mde"] = target_mde
+        scenario = dict(zip(scenarios.keys(), (np.ravel(x) for x in np.broadcast_arrays(*scenarios.values()))))
+        if (scenario["ratio"] <= 0).any():
+            raise ValueError("The allocation ratio should be positive number.")
+
+        metric_stats = self.metric_stats
+        n_metric, n_scenario = metric_stats.shape[0], scenario["alpha"].shape[0]
+        # (n_metric, 1) statistics against (n_scenario,) parameters
+        mean = metric_stats["mean"].to_numpy()[:, np.newaxis]
+        var = metric_stats["var"].to_numpy()[:, np.newaxis]
+        count = metric_stats["count"].to_numpy()[:, np.newaxis]
+        params = {
+            "alpha": scenario["alpha"],
+            "power": scenario["power"],
+            "ratio": scenario["ratio"],
+            "n_variant": scenario["n_variant"],
+        }
+        allocation = 1 + (scenario["n_variant"] - 1) * scenario["ratio"]
+
+        summary = pd.DataFrame({"metric": np.repeat(metric_stats["metric"].to_numpy(), n_scenario)})
+        for key in ["alpha", "power", "ratio", "n_variant"]:
+            summary[key] = np.tile(scenario[key], n_metric)
+        summary["mean"] = np.repeat(mean.ravel(), n_scenario)
+        summary["var"] = np.repeat(var.ravel(), n_scenario)
+        summary["count"] = np.repeat(count.ravel(), n_scenario)
+        summary["sample_size"] = (count / allocation).ravel()
+        summary["mde_abs"] = calc_mde(
+            var=var, sample_size=count / allocation, alternative=self.alternative, bonferroni=self.bonferroni, **params
+        ).ravel()
+        summary["mde_rel"] = summary["mde_abs"] / summary["mean"]
+        if target_mde is not None:
+            required_size = calc_sample_size(
+                var=var,
+                mde=scenario["target_mde"] * np.abs(mean),
+                alternative=self.alternative,
+                bonferroni=self.bonferroni,
+                **params,
+            )
+            summary["target_mde"] = np.tile(scenario["target_mde"], n_metric)
+            summary["required_sample_size"] = np.ceil(required_size).ravel()
+            summary["required_threshold"] = (required_size * allocation / count).ravel()
+        return summary
+
+    def _calc_mde(self, var: np.ndarray, sample_size: np.ndarray, n_variant: int) -> np.ndarray:
+        return calc_mde(
+            var=var,
+            sample_size=sample_size,
+            alpha=self.alpha,
+            power=self.power,
+            ratio=self.ratio,
+            n_variant=n_variant,
+            alternative=self.alternative,
+            bonferroni=self.bonferroni,
+        )
+
+    def _calc_sample_size(self, var: np.ndarray, mde: np.ndarray, n_variant: int) -> np.ndarray:
+        return calc_sample_size(
+            var=var,
+            mde=mde,
+            alpha=self.alpha,
+            power=self.power,
+            ratio=self.ratio,
+            n_variant=n_variant,
+            alternative=self.alternative,
+            bonferroni=self.bonferroni,
+        )
+
+    def summary_plot(self, target_mde: Optional[float] = None) -> "go.Figure":
         """Plot threshold vs MDE curve
 
         Parameters
@@ -90,6 +370,8 @@ class SampleSizeEvaluator(BaseEvaluator):
         self._validate_evaluate_executed()
         _validate_target_mde(target_mde)
 
+        import plotly.express as px
+
         g = px.line(data_frame=self.stats, x="threshold", y="mde_rel", color="metric", markers=True)
         if target_mde:
             g.add_hline(y=target_mde, line_dash="dot", line_width=2)
@@ -0,0 +1,143 @@
+from typing import Any, Optional, Sequence, Union
+
+import numpy as np
+import pandas as pd
+
+# pyarrow.Table or polars.DataFrame
+NativeFrame = Any
+
+
+def is_native_frame(data: Any) -> bool:
+    """return whether the data is a pyarrow.Table or a polars.DataFrame, without importing them."""
+    module, name = type(data).__module__.split(".")[0], type(data).__name__
+    return (module, name) in [("pyarrow", "Table"), ("polars", "DataFrame")]
+
+
+def to_polars(data: NativeFrame) -> Any:
+    """return the data as a polars.DataFrame. pyarrow.Table is converted without copying the columns."""
+    try:
+        import polars as pl
+    except ImportError as e:
+        raise ImportError("polars is required to evaluate pyarrow.Table or polars.DataFrame.") from e
+
+    if isinstance(data, pl.DataFrame):
+        return data
+    return pl.from_arrow(data)
+
+
+def column(data: NativeFrame, col: str) -> pd.Series:
+    """convert a single column of the data into pd.Series. e.g., a segment column binned by pandas."""
+    return pd.Series(to_polars(data)[col].to_numpy(), name=col)
+
+
+def is_unique(data: NativeFrame, cols: list[str]) -> bool:
+    """return whether combinations of the columns are unique and not null, checked by the native engine."""
+    import polars as pl
+
+    frame = to_polars(data)
+    # NaN is treated as missing like pandas.
+    keys = frame.select([pl.col(col).fill_nan(None) if frame.schema[col].is_float() else pl.col(col) for col in cols])
+    if keys.null_count().sum_horizontal().item() > 0:
+        return False
+    # a single column is counted by the hash of its values, which is much faster than hashing rows.
+    n_unique = keys[cols[0]].n_unique() if len(cols) == 1 else keys.n_unique()
+    return n_unique == keys.height
+
+
+def aggregate_moments_multi(
+    data: NativeFrame,
+    groupings: Sequence[Sequence[Union[str, pd.Series]]],
+    metrics: list[str],
+    ratio_metrics: Optional[dict[str, tuple[str, str]]] = None,
+) -> list[pd.DataFrame]:
+    """same as statistical_testing.aggregate_moments_multi(), but reduce the data by the group-by of polars.
+    The aggregation runs in multiple threads without converting the data into pandas. A pd.Series key (e.g., binned segment) is factorized
+    and attached to the data as codes, then the codes are replaced with its values after the aggregation.
+    """
+    import polars as pl
+
+    from .statistical_testing import _delta_method
+
+    ratio_metrics = ratio_metrics or {}
+    frame = to_polars(data)
+    aggregations = []
+    for j, metric in enumerate(metrics):
+        values = _metric_expr(frame, metric)
+        aggregations += [
+            values.mean().alias(f"mean_{j}"),
+            values.var(ddof=1).alias(f"var_{j}"),
+            values.count().alias(f"count_{j}"),
+        ]
+    for j, (numerator, denominator) in enumerate(ratio_metrics.values()):
+        num, den = _metric_expr(frame, numerator), _metric_expr(frame, denominator)
+        observed = num.is_not_null() & den.is_not_null()
+        num, den = num.filter(observed), den.filter(observed)
+        aggregations += [
+            observed.sum().alias(f"ratio_count_{j}"),
+            num.mean().alias(f"ratio_mean_num_{j}"),
+            den.mean().alias(f"ratio_mean_den_{j}"),
+            num.var(ddof=1).alias(f"ratio_var_num_{j}"),
+            den.var(ddof=1).alias(f"ratio_var_den_{j}"),
+            pl.cov(num, den, ddof=1).alias(f"ratio_cov_{j}"),
+        ]
+
+    results = []
+    for group_cols in groupings:
+        keys, uniques = [], {}
+        grouped_frame = frame
+        for i, key in enumerate(group_cols):
+            if isinstance(key, str):
+                keys.append(key)
+                continue
+            name = key.name if key.name is not None else f"key_{i}"
+            codes, uniques[name] = pd.factorize(key, sort=True)
+            grouped_frame = grouped_frame.with_columns(pl.Series(name, codes).replace(-1, None))
+            keys.append(name)
+
+        if len(keys) > 0:
+            # rows whose group keys are missing don't belong to any group, same as pandas groupby.
+            reduced = (
+                grouped_frame.filter(pl.all_horizontal([pl.col(key).is_not_null() for key in keys]))
+                .group_by(keys)
+                .agg(aggregations)
+                .sort(keys)
+            )
+        else:
+            reduced = grouped_frame.select(aggregations)
+        # only the small table of moments is converted, without requiring pyarrow.
+        reduced = pd.DataFrame({col: reduced[col].to_numpy() for col in reduced.columns})
+        n_group = reduced.shape[0]
+
+        mean = reduced[[f"mean_{j}" for j in range(len(metrics))]].to_numpy(dtype=np.float64, na_value=np.nan)
+        var = reduced[[f"var_{j}" for j in range(len(metrics))]].to_numpy(dtype=np.float64, na_value=np.nan)
+        count = reduced[[f"count_{j}" for j in range(len(metrics))]].to_numpy(dtype=np.int64)
+        if len(ratio_metrics) > 0:
+            comoments = {
+                col: reduced[[f"ratio_{col}_{j}" for j in range(len(ratio_metrics))]].to_numpy(
+                    dtype=np.float64, na_value=np.nan
+                )
+                for col in ["count", "mean_num", "mean_den", "var_num", "var_den", "cov"]
+            }
+            ratio_mean, ratio_var = _delta_method(**comoments)
+            mean, var = np.hstack([mean, ratio_mean]), np.hstack([var, ratio_var])
+            count = np.hstack([count, comoments["count"].astype(np.int64)])
+        names = metrics + list(ratio_metrics)
+
+        group_keys = reduced[keys].copy() if len(keys) > 0 else pd.DataFrame(index=range(n_group))
+        for name, values in uniques.items():
+            group_keys[name] = values.take(group_keys[name].to_numpy())
+        moments = group_keys.loc[np.repeat(np.arange(n_group), len(names))].reset_index(drop=True)
+        moments["metric"] = np.tile(np.asarray(names, dtype=object), n_group)
+        moments["mean"] = mean.ravel()
+        moments["var"] = var.ravel()
+        moments["count"] = count.ravel()
+        results.append(moments)
+    return results
+
+
+def _metric_expr(frame: Any, metric: str) -> Any:
+    """expression of a metric as float64, where NaN is treated as missing like pandas."""
+    import polars as pl
+
+    values = pl.col(metric).cast(pl.Float64)
+    return values.fill_nan(None) if frame.schema[metric].is_float() else values
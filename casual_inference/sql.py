@@ -0,0 +1,191 @@
+from typing import Any, Optional
+
+import numpy as np
+import pandas as pd
+
+from .statistical_testing import RatioMetrics
+
+# columns of the sums of metrics and ratio metrics, see evaluate_from_stats() of evaluators.
+SUM_COLS = ["count", "sum", "sum_sq"]
+RATIO_SUM_COLS = ["count", "sum_num", "sum_den", "sum_sq_num", "sum_sq_den", "sum_xy"]
+
+
+def build_stats_query(
+    table: str,
+    unit_col: str,
+    metrics: list[str],
+    group_cols: Optional[list[str]] = None,
+    ratio_metrics: Optional[RatioMetrics] = None,
+    where: Optional[str] = None,
+    float_type: str = "DOUBLE PRECISION",
+) -> str:
+    """build a single aggregate query, which returns sufficient statistics of metrics for each group.
+
+    Each row of the result has the group columns, the number of rows and distinct units ("n_row", "n_unit"),
+    then the count, sum and sum of squares of each metric ("m{j}_count", "m{j}_sum", "m{j}_sum_sq"),
+    and the count, sums, sums of squares and the sum of cross-products of each ratio metric
+    ("r{j}_count", "r{j}_sum_num", ..., "r{j}_sum_xy"). Metrics are cast to float_type before being summed up,
+    so sums of squares of integer metrics don't overflow. NULL values are ignored like pandas,
+    and a ratio metric uses rows having both the numerator and the denominator.
+
+    Parameters
+    ----------
+    table : str
+        The table (or a subquery in parentheses) stores randomization unit level metrics.
+        It's embedded into the query as is, so it should be trusted.
+    unit_col : str
+        A column name stores the randomization unit. something like user_id, session_id, ...
+    metrics : list[str]
+        Columns stores metrics you want to aggregate.
+    group_cols : Optional[list[str]], optional
+        Columns used as the group keys, by default None
+        e.g., [experiment_col, variant_col, segment_col]
+    ratio_metrics : Optional[dict[str, tuple[str, str]]], optional
+        Ratio metrics, mapping from the name to (numerator column, denominator column), by default None
+    where : Optional[str], optional
+        Condition filtering rows of the table, by default None
+        It's embedded into the query as is, so it should be trusted.
+    float_type : str, optional
+        SQL type metrics are cast to, by default "DOUBLE PRECISION"
+        e.g., "FLOAT64" for BigQuery.
+
+    Returns
+    -------
+    str
+        SQL query.
+    """
+    group_cols = group_cols or []
+    ratio_metrics = ratio_metrics or {}
+    columns = [_quote(col) for col in group_cols]
+    columns += ["COUNT(*) AS n_row", f"COUNT(DISTINCT {_quote(unit_col)}) AS n_unit"]
+    for j, metric in enumerate(metrics):
+        value = f"CAST({_quote(metric)} AS {float_type})"
+        columns += [
+            f"COUNT({value}) AS m{j}_count",
+            f"SUM({value}) AS m{j}_sum",
+            f"SUM({value} * {value}) AS m{j}_sum_sq",
+        ]
+    for j, (numerator, denominator) in enumerate(ratio_metrics.values()):
+        num = f"CAST({_quote(numerator)} AS {float_type})"
+        den = f"CAST({_quote(denominator)} AS {float_type})"
+        observed = f"{_quote(numerator)} IS NOT NULL AND {_quote(denominator)} IS NOT NULL"
+        columns += [
+            f"COUNT(CASE WHEN {observed} THEN 1 END) AS r{j}_count",
+            f"SUM(CASE WHEN {observed} THEN {num} END) AS r{j}_sum_num",
+            f"SUM(CASE WHEN {observed} THEN {den} END) AS r{j}_sum_den",
+            f"SUM(CASE WHEN {observed} THEN {num} * {num} END) AS r{j}_sum_sq_num",
+            f"SUM(CASE WHEN {observed} THEN {den} * {den} END) AS r{j}_sum_sq_den",
+            f"SUM(CASE WHEN {observed} THEN {num} * {den} END) AS r{j}_sum_xy",
+        ]
+
+    query = "SELECT\n    " + ",\n    ".join(columns) + f"\nFROM {table}"
+    if where is not None:
+        query += f"\nWHERE {where}"
+    if len(group_cols) > 0:
+        keys = ", ".join(columns[: len(group_cols)])
+        query += f"\nGROUP BY {keys}\nORDER BY {keys}"
+    return query
+
+
+def query_stats(
+    connection: Any,
+    table: str,
+    unit_col: str,
+    metrics: list[str],
+    variant_col: Optional[str] = "variant",
+    segment_col: Optional[str] = None,
+    experiment_col: Optional[str] = None,
+    ratio_metrics: Optional[RatioMetrics] = None,
+    where: Optional[str] = None,
+    float_type: str = "DOUBLE PRECISION",
+    assume_validated: bool = False,
+) -> tuple[pd.DataFrame, Optional[pd.DataFrame]]:
+    """calculate sufficient statistics of metrics in the database by a single aggregate query,
+    instead of fetching randomization unit level rows. Only a row for each group is transferred.
+
+    The result can be passed to ABTestEvaluator.evaluate_from_stats(), or SampleSizeEvaluator.evaluate_from_stats()
+    when variant_col is None, and gives the same stats with evaluate() on the table.
+    Numerical segments aren't binned, so bin them in the table (or a subquery) in advance if needed.
+
+    e.g.,
+        stats, ratio_stats = query_stats(connection, "experiment_users", "user_id", ["purchases"])
+        evaluator = ABTestEvaluator().evaluate_from_stats(stats, ratio_stats=ratio_stats)
+
+    Parameters
+    ----------
+    connection : Any
+        DB-API 2.0 connection. e.g., sqlite3.connect(...), duckdb.connect(...), psycopg2.connect(...)
+    table : str
+        The table (or a subquery in parentheses) stores randomization unit level metrics.
+    unit_col : str
+        A column name stores the randomization unit. something like user_id, session_id, ...
+    metrics : list[str]
+        Columns stores metrics you want to evaluate.
+    variant_col : Optional[str], optional
+        A column name stores the variant assignment, by default "variant"
+        When it's None, the whole table is aggregated. e.g., for SampleSizeEvaluator.
+    segment_col : Optional[str], optional
+        A column name stores 'segment' you want to break down in the analysis, by default None
+    experiment_col : Optional[str], optional
+        A column name stores the experiment, by default None
+    ratio_metrics : Optional[dict[str, tuple[str, str]]], optional
+        Ratio metrics, mapping from the name to (numerator column, denominator column), by default None
+    where : Optional[str], optional
+        Condition filtering rows of the table, by default None
+    float_type : str, optional
+        SQL type metrics are cast to, by default "DOUBLE PRECISION"
+    assume_validated : bool, optional
+        Skip checking that the table has been aggregated by the randomization unit, by default False
+        The check compares the number of rows and distinct units in each group, so a unit appearing in
+        several variants isn't detected.
+
+    Returns
+    -------
+    tuple[pd.DataFrame, Optional[pd.DataFrame]]
+        stats has the group columns, "metric", "count", "sum" and "sum_sq" columns.
+        ratio_stats has the group columns, "metric", "count", "sum_num", "sum_den", "sum_sq_num", "sum_sq_den"
+        and "sum_xy" columns, or it's None when ratio_metrics is empty.
+    """
+    ratio_metrics = ratio_metrics or {}
+    if len(metrics) + len(ratio_metrics) == 0:
+        raise ValueError("metrics hasn't been specified.")
+    group_cols = [col for col in [experiment_col, variant_col, segment_col] if col is not None]
+    query = build_stats_query(table, unit_col, metrics, group_cols, ratio_metrics, where, float_type)
+
+    cursor = connection.cursor()
+    try:
+        cursor.execute(query)
+        names = [description[0] for description in cursor.description]
+        result = pd.DataFrame.from_records(cursor.fetchall(), columns=names)
+    finally:
+        cursor.close()
+
+    if not assume_validated and (result["n_row"] != result["n_unit"]).any():
+        raise ValueError("passed table hasn't been aggregated by the randomization unit.")
+    keys = result.loc[:, group_cols]
+    # groups without observed rows are dropped, same as pandas groupby.
+    keys_observed = ~keys.isna().any(axis=1).to_numpy()
+    stats = _to_long(result, keys, keys_observed, metrics, "m", SUM_COLS)
+    if len(ratio_metrics) == 0:
+        return stats, None
+    return stats, _to_long(result, keys, keys_observed, list(ratio_metrics), "r", RATIO_SUM_COLS)
+
+
+def _to_long(
+    result: pd.DataFrame, keys: pd.DataFrame, observed: np.ndarray, metrics: list[str], prefix: str, cols: list[str]
+) -> pd.DataFrame:
+    """convert wide columns "{prefix}{j}_{col}" of each metric into a long DataFrame, ordered by the group keys,
+    then by the order of metrics."""
+    n_group, n_metric = int(observed.sum()), len(metrics)
+    long = keys.loc[observed].loc[np.repeat(keys.index[observed], n_metric)].reset_index(drop=True)
+    long["metric"] = np.tile(np.asarray(metrics, dtype=object), n_group)
+    for col in cols:
+        values = result.loc[observed, [f"{prefix}{j}_{col}" for j in range(n_metric)]]
+        # SUM() of no rows is NULL
+        long[col] = np.nan_to_num(values.to_numpy(dtype=np.float64, na_value=np.nan).ravel(), nan=0.0)
+    long["count"] = long["count"].astype(np.int64)
+    return long
+
+
+def _quote(identifier: str) -> str:
+    return '"' + identifier.replace('"', '""') + '"'
@@ -1,16 +1,38 @@
+from typing import Optional, Sequence, Union
+
 import numpy as np
 import pandas as pd
-from scipy.stats import t, ttest_ind_from_stats
+from numpy.typing import ArrayLike
+from scipy import special
+
+from . import native
+from .native import NativeFrame, is_native_frame
+from .validation import validate_unit_col
 
+GroupKey = Union[str, pd.Series]
+# ratio metric name -> (numerator column, denominator column)
+RatioMetrics = dict[str, tuple[str, str]]
+# groups of all groupings reduced by one-hot matrix products at most, see _reduce_block().
+_ONE_HOT_MAX_GROUPS = 32
+# bytes of a block of metrics reduced at once, which fits in the CPU cache.
+_BLOCK_BYTES = 2**20
 
-def t_test(data: pd.DataFrame, unit_col: str, variant_col: str, metrics: list[str]) -> pd.DataFrame:
+
+def t_test(
+    data: Union[pd.DataFrame, NativeFrame],
+    unit_col: str,
+    variant_col: str,
+    metrics: list[str],
+    assume_validated: bool = False,
+) -> pd.DataFrame:
     """_summary_
 
     Parameters
     ----------
-    data : pd.DataFrame
+    data : Union[pd.DataFrame, pyarrow.Table, polars.DataFrame]
         A DataFrame has randomization unit column, variant assignment column, and metrics columns.
         The data should have been aggregated by the randomization unit.
+        Arrow and Polars frames are aggregated natively, see aggregate_moments_multi().
     unit_col : str
         A column name stores the randomization unit. something like user_id, session_id, ...
     variant_col : str
@@ -18,64 +40,657 @@ def t_test(data: pd.DataFrame, unit_col: str, variant_col: str, metrics: list[st
         The control variant should have value 1.
     metrics : list[str]
         Columns stores metrics you want to evaluate.
+    assume_validated : bool, optional
+        Skip checking that the data has been aggregated by the randomization unit, by default False
+        Use it for trusted inputs, e.g., units already aggregated by an upstream pipeline.
 
     Returns
     -------
     pd.DataFrame
         A DataFrame stores basic statistics of each variant (mean, variance, ...) and impact compared with control group.
     """
-    if data.shape[0] != data[unit_col].nunique():
-        raise ValueError("passed dataframe hasn't been aggregated by the randomization unit.")
+    validate_unit_col(data, unit_col, assume_validated)
     if len(metrics) == 0:
         raise ValueError("metrics hasn't been specified.")
-    if data[variant_col].min() != 1:
+    moments = aggregate_moments(data, [variant_col], metrics)
+    if moments[variant_col].min() != 1:
         raise ValueError("the control variant seems not to exist.")
-    means = (
-        data.groupby(variant_col)[metrics].mean().stack().reset_index().rename(columns={"level_1": "metric", 0: "mean"})
-    )
-    vars = (
-        data.groupby(variant_col)[metrics].var().stack().reset_index().rename(columns={"level_1": "metric", 0: "var"})
-    )
-    counts = (
-        data.groupby(variant_col)[metrics]
-        .count()
-        .stack()
-        .reset_index()
-        .rename(columns={"level_1": "metric", 0: "count"})
-    )
-    stats = means.merge(vars, on=[variant_col, "metric"]).merge(counts, on=[variant_col, "metric"])
+    return t_test_from_stats(moments, variant_col)
+
+
+def aggregate_moments(
+    data: Union[pd.DataFrame, NativeFrame],
+    group_cols: Sequence[GroupKey],
+    metrics: list[str],
+    ratio_metrics: Optional[RatioMetrics] = None,
+) -> pd.DataFrame:
+    """calculate mean, variance and count of each metric per group with a single grouped reduction.
+
+    The group keys are factorized once, then the count, sum and sum of squares of all metrics are reduced
+    per group at once, by multiplying blocks of rows with the one-hot matrix of the groups.
+    (by np.bincount() for each metric when there are many groups)
+    To keep the variance numerically stable, sums are taken after shifting each metric by one of its observed values.
+
+    Parameters
+    ----------
+    data : Union[pd.DataFrame, pyarrow.Table, polars.DataFrame]
+        A DataFrame has group columns and metrics columns.
+    group_cols : Sequence[Union[str, pd.Series]]
+        Columns used as the group keys. e.g., [variant_col], [variant_col, segment_col]
+        A pd.Series aligned with the data (e.g., binned segment) can be passed instead of a column name.
+        When it's empty, the whole data is aggregated as a single group.
+    metrics : list[str]
+        Columns stores metrics you want to aggregate.
+    ratio_metrics : Optional[dict[str, tuple[str, str]]], optional
+        Ratio metrics, mapping from the name to (numerator column, denominator column), by default None
+        e.g., {"ctr": ("clicks", "impressions")} when the analysis unit (impression) differs from the randomization unit.
+        They're aggregated by the delta method, see delta_method().
+
+    Returns
+    -------
+    pd.DataFrame
+        A long DataFrame has group columns, "metric", "mean", "var" and "count" columns.
+        Rows are ordered by the group keys, then by the order of the passed metrics and ratio metrics.
+    """
+    return aggregate_moments_multi(data, [group_cols], metrics, ratio_metrics)[0]
+
+
+def aggregate_moments_multi(
+    data: Union[pd.DataFrame, NativeFrame],
+    groupings: Sequence[Sequence[GroupKey]],
+    metrics: list[str],
+    ratio_metrics: Optional[RatioMetrics] = None,
+) -> list[pd.DataFrame]:
+    """same as aggregate_moments(), but aggregate by several groupings in one pass over the metrics.
+    Blocks of metrics are converted and shifted once, then reduced for every grouping by a single matrix product.
+    e.g., [[variant_col, "country"], [variant_col, "app_version"]] breaks down the data by each dimension independently.
+
+    Parameters
+    ----------
+    data : Union[pd.DataFrame, pyarrow.Table, polars.DataFrame]
+        A DataFrame has group columns and metrics columns.
+        Arrow and Polars frames are reduced by the multi-threaded group-by of polars, without converting them into
+        pandas. Only the table of moments is converted. (polars is required)
+    groupings : Sequence[Sequence[Union[str, pd.Series]]]
+        List of group keys, each of them is same as group_cols of aggregate_moments().
+    metrics : list[str]
+        Columns stores metrics you want to aggregate.
+    ratio_metrics : Optional[dict[str, tuple[str, str]]], optional
+        Ratio metrics, mapping from the name to (numerator column, denominator column), by default None
+
+    Returns
+    -------
+    list[pd.DataFrame]
+        Returned values of aggregate_moments() for each grouping.
+    """
+    ratio_metrics = ratio_metrics or {}
+    if is_native_frame(data):
+        return native.aggregate_moments_multi(data, groupings, metrics, ratio_metrics)
+    factorized = [_factorize_groups(data, group_cols) for group_cols in groupings]
+    n_metric = len(metrics)
+
+    # metrics are read in their own dtype (e.g., int8, float32) without copying, and upcast block by block.
+    values = [metric_values(data[metric]) for metric in metrics]
+    shifts = np.array([_first_observed(column) for column in values], dtype=np.float64)
+    if n_metric == 0:
+        reduced = [
+            (np.zeros((keys.shape[0], 0)), np.zeros((keys.shape[0], 0)), np.zeros((keys.shape[0], 0)))
+            for keys, _, _ in factorized
+        ]
+    elif sum(keys.shape[0] for keys, _, _ in factorized) <= _ONE_HOT_MAX_GROUPS:
+        reduced = _reduce_block(values, shifts, factorized)
+    else:
+        reduced = _reduce_bincount(values, shifts, factorized)
+
+    means, vars, counts = [], [], []
+    for count, sum_, sum_sq in reduced:
+        with np.errstate(divide="ignore", invalid="ignore"):
+            means.append(np.where(count > 0, shifts + sum_ / count, np.nan))
+            vars.append(np.where(count > 1, np.maximum(sum_sq - sum_**2 / count, 0.0) / (count - 1), np.nan))
+        counts.append(count.astype(np.int64))
+
+    if len(ratio_metrics) > 0:
+        # ratio metrics follow the ordinary metrics in each group
+        for k, comoments in enumerate(_reduce_comoments(data, factorized, ratio_metrics)):
+            mean, var = _delta_method(**comoments)
+            means[k] = np.hstack([means[k], mean])
+            vars[k] = np.hstack([vars[k], var])
+            counts[k] = np.hstack([counts[k], comoments["count"]])
+        metrics = metrics + list(ratio_metrics)
+        n_metric = len(metrics)
+
+    results = []
+    for k, (keys, _, _) in enumerate(factorized):
+        n_group = keys.shape[0]
+        moments = keys.loc[np.repeat(np.arange(n_group), n_metric)].reset_index(drop=True)
+        moments["metric"] = np.tile(np.asarray(metrics, dtype=object), n_group)
+        moments["mean"] = means[k].ravel()
+        moments["var"] = vars[k].ravel()
+        moments["count"] = counts[k].ravel()
+        results.append(moments)
+    return results
+
+
+def aggregate_comoments(
+    data: pd.DataFrame, group_cols: Sequence[GroupKey], ratio_metrics: RatioMetrics
+) -> pd.DataFrame:
+    """calculate means, variances and the covariance of the numerator and denominator of each ratio metric per group.
+    Rows missing either the numerator or the denominator are ignored.
+
+    Parameters
+    ----------
+    data : pd.DataFrame
+        A DataFrame has group columns, numerator and denominator columns.
+    group_cols : Sequence[Union[str, pd.Series]]
+        Columns used as the group keys, same as aggregate_moments().
+    ratio_metrics : dict[str, tuple[str, str]]
+        Ratio metrics, mapping from the name to (numerator column, denominator column)
+
+    Returns
+    -------
+    pd.DataFrame
+        A long DataFrame has group columns, "metric", "count", "mean_num", "mean_den", "var_num", "var_den"
+        and "cov" columns. It's converted into the schema of aggregate_moments() by delta_method().
+    """
+    factorized = [_factorize_groups(data, group_cols)]
+    keys = factorized[0][0]
+    comoments = _reduce_comoments(data, factorized, ratio_metrics)[0]
+
+    n_group, n_ratio = keys.shape[0], len(ratio_metrics)
+    result = keys.loc[np.repeat(np.arange(n_group), n_ratio)].reset_index(drop=True)
+    result["metric"] = np.tile(np.asarray(list(ratio_metrics), dtype=object), n_group)
+    for col in COMOMENT_COLS:
+        result[col] = comoments[col].ravel()
+    return result
+
+
+def comoments_from_sums(sums: pd.DataFrame) -> pd.DataFrame:
+    """convert pre-aggregated sufficient statistics of ratio metrics into the returned value of aggregate_comoments().
+
+    Parameters
+    ----------
+    sums : pd.DataFrame
+        A DataFrame has "count", "sum_num", "sum_den", "sum_sq_num", "sum_sq_den" and "sum_xy" columns,
+        plus any key columns. "sum_xy" is the sum of the products of the numerator and the denominator.
+
+    Returns
+    -------
+    pd.DataFrame
+        A DataFrame has the key columns and "count", "mean_num", "mean_den", "var_num", "var_den" and "cov" columns.
+    """
+    necessary_cols = ["count", "sum_num", "sum_den", "sum_sq_num", "sum_sq_den", "sum_xy"]
+    for col in necessary_cols:
+        if col in sums.columns:
+            continue
+        raise ValueError(f"Necessary column does not exist: {col}")
+    if (sums["count"] < 0).any():
+        raise ValueError("count should be non-negative.")
+
+    comoments = sums.drop(columns=necessary_cols)
+    for col, values in _comoments(*[sums[col].to_numpy(dtype=np.float64) for col in necessary_cols]).items():
+        comoments[col] = values
+    comoments["count"] = sums["count"].astype(np.int64)
+    return comoments
+
+
+def delta_method(comoments: pd.DataFrame) -> pd.DataFrame:
+    """convert statistics of the numerator and denominator into mean, variance and count of ratio metrics.
+
+    The mean is the ratio of means, and the variance is the delta method approximation scaled by count,
+    so that var / count is the variance of the ratio. It makes ratio metrics testable by t_test_from_stats().
+    See: Deng et al. 2018. Applying the Delta Method in Metric Analytics.
+
+    Parameters
+    ----------
+    comoments : pd.DataFrame
+        A DataFrame has the same schema with the returned value of aggregate_comoments().
+
+    Returns
+    -------
+    pd.DataFrame
+        A DataFrame has the key columns and "mean", "var" and "count" columns.
+    """
+    moments = comoments.drop(columns=COMOMENT_COLS)
+    mean, var = _delta_method(**{col: comoments[col].to_numpy(dtype=np.float64) for col in COMOMENT_COLS})
+    moments["mean"] = mean
+    moments["var"] = var
+    moments["count"] = comoments["count"].astype(np.int64)
+    return moments
+
+
+COMOMENT_COLS = ["count", "mean_num", "mean_den", "var_num", "var_den", "cov"]
+
+
+def _reduce_block(
+    values: list[np.ndarray], shifts: np.ndarray, factorized: list[tuple[pd.DataFrame, np.ndarray, np.ndarray]]
+) -> list[tuple[np.ndarray, np.ndarray, np.ndarray]]:
+    """reduce count, sum and sum of squares of the shifted metrics in each group into (n_group, n_metric) arrays
+    for each grouping. A block of rows of all metrics (and their squares) is multiplied by the one-hot matrix of
+    the groups of all groupings at once, so each value is read from memory only once.
+    Blocks are small enough to stay in the CPU cache, and it's efficient only when the number of groups is small."""
+    n_row, n_metric = values[0].shape[0], len(values)
+    n_groups = [keys.shape[0] for keys, _, _ in factorized]
+    offsets = np.cumsum([0] + n_groups)
+    group_ids = [np.arange(n_group)[:, np.newaxis] for n_group in n_groups]
+    block_size = max(256, _BLOCK_BYTES // (16 * n_metric))
+
+    # (metrics and their squares, rows) and (groups of all groupings, rows)
+    block = np.empty((2 * n_metric, block_size))
+    one_hot = np.empty((offsets[-1], block_size))
+    sums = np.zeros((offsets[-1], 2 * n_metric))
+    missing = np.zeros((offsets[-1], n_metric))
+    for start in range(0, n_row, block_size):
+        stop = min(start + block_size, n_row)
+        x, h = block[:, : stop - start], one_hot[:, : stop - start]
+        np.stack([column[start:stop] for column in values], out=x[:n_metric])
+        x[:n_metric] -= shifts[:, np.newaxis]
+        np.square(x[:n_metric], out=x[n_metric:])
+        # rows whose group keys are missing have the code n_group, so they don't belong to any group.
+        for k, (_, codes, _) in enumerate(factorized):
+            np.equal(codes[start:stop], group_ids[k], out=h[offsets[k] : offsets[k + 1]])
+        partial = h @ x.T
+        # missing values are found by NaN sums, so complete metrics (e.g., integers) are never scanned for them.
+        for j in np.flatnonzero(np.isnan(partial[:, :n_metric]).any(axis=0)):
+            is_missing = np.isnan(x[j])
+            x[[j, n_metric + j]] = np.where(is_missing, 0.0, x[[j, n_metric + j]])
+            partial[:, [j, n_metric + j]] = h @ x[[j, n_metric + j]].T
+            missing[:, j] += h @ is_missing
+        sums += partial
+
+    results = []
+    for k, (_, _, sizes) in enumerate(factorized):
+        rows = slice(offsets[k], offsets[k + 1])
+        count = sizes[: n_groups[k], np.newaxis] - missing[rows]
+        results.append((count, sums[rows, :n_metric], sums[rows, n_metric:]))
+    return results
+
+
+def _reduce_bincount(
+    values: list[np.ndarray], shifts: np.ndarray, factorized: list[tuple[pd.DataFrame, np.ndarray, np.ndarray]]
+) -> list[tuple[np.ndarray, np.ndarray, np.ndarray]]:
+    """same as _reduce_block(), but reduce each metric by np.bincount(), whose cost doesn't depend on
+    the number of groups."""
+    n_metric = len(values)
+    shapes = [(keys.shape[0], n_metric) for keys, _, _ in factorized]
+    results = [(np.empty(shape), np.empty(shape), np.empty(shape)) for shape in shapes]
+    shifted = np.empty(values[0].shape[0])
+    squared = np.empty(values[0].shape[0])
+    for j, column in enumerate(values):
+        missing = np.isnan(column) if column.dtype.kind == "f" else None
+        np.subtract(column, shifts[j], out=shifted, dtype=np.float64)
+        if missing is not None:
+            shifted[missing] = 0.0
+        np.multiply(shifted, shifted, out=squared)
+        for (keys, codes, sizes), (count, sum_, sum_sq) in zip(factorized, results):
+            n_group = keys.shape[0]
+            count[:, j] = (
+                sizes[:n_group] if missing is None else np.bincount(codes[~missing], minlength=n_group)[:n_group]
+            )
+            sum_[:, j] = np.bincount(codes, weights=shifted, minlength=n_group)[:n_group]
+            sum_sq[:, j] = np.bincount(codes, weights=squared, minlength=n_group)[:n_group]
+    return results
+
+
+def _first_observed(column: np.ndarray) -> float:
+    """return the first non-missing value of a metric, which the values are shifted by to keep variances stable."""
+    if column.shape[0] == 0:
+        return 0.0
+    if column.dtype.kind == "f" and np.isnan(column[0]):
+        missing = np.isnan(column)
+        return 0.0 if missing.all() else float(column[np.argmin(missing)])
+    return float(column[0])
+
+
+def _reduce_comoments(
+    data: pd.DataFrame,
+    factorized: list[tuple[pd.DataFrame, np.ndarray, np.ndarray]],
+    ratio_metrics: RatioMetrics,
+) -> list[dict[str, np.ndarray]]:
+    """reduce count, means, variances and covariance of numerators and denominators in each group into
+    (n_group, n_ratio) arrays for each grouping. Values are shifted like aggregate_moments_multi()."""
+    n_ratio = len(ratio_metrics)
+    results = [{col: np.empty((keys.shape[0], n_ratio)) for col in COMOMENT_COLS} for keys, _, _ in factorized]
+    for j, (numerator, denominator) in enumerate(ratio_metrics.values()):
+        num, den = metric_values(data[numerator]), metric_values(data[denominator])
+        missing = np.zeros(num.shape[0], dtype=bool)
+        for values in [num, den]:
+            if values.dtype.kind == "f":
+                missing |= np.isnan(values)
+        observed = ~missing
+        # shift both by the values of the first observed row, as aggregate_moments_multi() does
+        first = int(np.argmax(observed))
+        shift_num = float(num[first]) if observed.any() else 0.0
+        shift_den = float(den[first]) if observed.any() else 0.0
+        num_ = np.where(missing, 0.0, np.subtract(num, shift_num, dtype=np.float64))
+        den_ = np.where(missing, 0.0, np.subtract(den, shift_den, dtype=np.float64))
+        weights = [num_, den_, num_ * num_, den_ * den_, num_ * den_]
+
+        for k, (keys, codes, _) in enumerate(factorized):
+            n_group = keys.shape[0]
+            count = np.bincount(codes[observed], minlength=n_group)[:n_group].astype(np.float64)
+            comoments = _comoments(
+                count, *[np.bincount(codes, weights=w, minlength=n_group)[:n_group] for w in weights]
+            )
+            # variances and the covariance don't depend on the shifts
+            comoments["mean_num"] += shift_num
+            comoments["mean_den"] += shift_den
+            for col, values in comoments.items():
+                results[k][col][:, j] = values
+    for result in results:
+        result["count"] = result["count"].astype(np.int64)
+    return results
+
+
+def _comoments(
+    count: np.ndarray,
+    sum_num: np.ndarray,
+    sum_den: np.ndarray,
+    sum_sq_num: np.ndarray,
+    sum_sq_den: np.ndarray,
+    sum_xy: np.ndarray,
+) -> dict[str, np.ndarray]:
+    """convert sums into means, unbiased variances and covariance of numerators and denominators."""
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return {
+            "count": count,
+            "mean_num": np.where(count > 0, sum_num / count, np.nan),
+            "mean_den": np.where(count > 0, sum_den / count, np.nan),
+            "var_num": np.where(count > 1, np.maximum(sum_sq_num - sum_num**2 / count, 0.0) / (count - 1), np.nan),
+            "var_den": np.where(count > 1, np.maximum(sum_sq_den - sum_den**2 / count, 0.0) / (count - 1), np.nan),
+            "cov": np.where(count > 1, (sum_xy - sum_num * sum_den / count) / (count - 1), np.nan),
+        }
+
+
+def _delta_method(
+    count: np.ndarray,
+    mean_num: np.ndarray,
+    mean_den: np.ndarray,
+    var_num: np.ndarray,
+    var_den: np.ndarray,
+    cov: np.ndarray,
+) -> tuple[np.ndarray, np.ndarray]:
+    """return the ratio of means, and count times the delta method variance of it."""
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ratio = mean_num / mean_den
+        var = (var_num - 2 * ratio * cov + ratio**2 * var_den) / mean_den**2
+    return ratio, var
+
+
+def metric_values(column: pd.Series) -> np.ndarray:
+    """return values of a metric column without copying when it's stored as numpy bool, integer or float.
+    Other columns (e.g., nullable integer, object) are converted to float64, and missing values become NaN.
+    """
+    if isinstance(column.dtype, np.dtype) and column.dtype.kind in "biuf":
+        return column.to_numpy()
+    return column.to_numpy(dtype=np.float64, na_value=np.nan)
+
+
+def _factorize_groups(
+    data: pd.DataFrame, group_cols: Sequence[GroupKey]
+) -> tuple[pd.DataFrame, np.ndarray, np.ndarray]:
+    """return unique group keys (sorted), group code of each row and size of each group."""
+    if len(group_cols) > 0:
+        grouped = data.groupby(list(group_cols), observed=True, sort=True)
+        keys = grouped.size().index.to_frame(index=False)
+        n_group = keys.shape[0]
+        # rows whose group keys are missing don't belong to any group, so they're put in an extra bin and dropped.
+        codes = grouped.ngroup().fillna(n_group).to_numpy().astype(np.intp)
+    else:
+        keys = pd.DataFrame(index=range(1))
+        n_group = 1
+        codes = np.zeros(data.shape[0], dtype=np.intp)
+    return keys, codes, np.bincount(codes, minlength=n_group)
+
+
+def moments_from_sums(sums: pd.DataFrame) -> pd.DataFrame:
+    """convert pre-aggregated sufficient statistics into mean, variance and count.
+
+    Parameters
+    ----------
+    sums : pd.DataFrame
+        A DataFrame has "count", "sum" and "sum_sq" columns, plus any key columns.
+        "sum" and "sum_sq" are the sum and the sum of squares of the metric in each group.
+
+    Returns
+    -------
+    pd.DataFrame
+        A DataFrame has the key columns and "mean", "var" and "count" columns.
+        The variance is the unbiased one, same as pd.Series.var().
+    """
+    necessary_cols = ["count", "sum", "sum_sq"]
+    for col in necessary_cols:
+        if col in sums.columns:
+            continue
+        raise ValueError(f"Necessary column does not exist: {col}")
+    if (sums["count"] < 0).any():
+        raise ValueError("count should be non-negative.")
+
+    moments = sums.drop(columns=necessary_cols)
+    count = sums["count"].to_numpy(dtype=np.float64)
+    sum_ = sums["sum"].to_numpy(dtype=np.float64)
+    sum_sq = sums["sum_sq"].to_numpy(dtype=np.float64)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        moments["mean"] = np.where(count > 0, sum_ / count, np.nan)
+        moments["var"] = np.where(count > 1, np.maximum(sum_sq - sum_**2 / count, 0.0) / (count - 1), np.nan)
+    moments["count"] = sums["count"].astype(np.int64)
+    return moments
+
+
+def t_test_from_stats(stats: pd.DataFrame, variant_col: str, group_cols: Optional[list[str]] = None) -> pd.DataFrame:
+    """apply Welch's t-test on per-variant statistics, compared with the control variant.
+
+    Parameters
+    ----------
+    stats : pd.DataFrame
+        A DataFrame has variant column, group columns, "metric", "mean", "var" and "count" columns.
+        (e.g., returned value of aggregate_moments())
+    variant_col : str
+        A column name stores the variant assignment.
+        The control variant should have value 1.
+    group_cols : Optional[list[str]], optional
+        Columns the comparison is done within, other than the variant column, by default None
+
+    Returns
+    -------
+    pd.DataFrame
+        A DataFrame has the same schema with the returned value of t_test().
+        The group columns are appended at the end.
+    """
+    group_cols = group_cols or []
+    keys = group_cols + ["metric"]
+    stats = stats.loc[:, [variant_col] + keys + ["mean", "var", "count"]].copy()
     stats["std"] = np.sqrt(stats["var"])
     stats["stderr"] = np.sqrt(stats["var"] / stats["count"])
-    stats = stats.merge(stats.loc[stats[variant_col] == 1], on="metric", suffixes=["", "_c"]).drop(
+    stats = stats.merge(stats.loc[stats[variant_col] == 1], on=keys, suffixes=["", "_c"]).drop(
         f"{variant_col}_c", axis=1
     )
 
-    stats["abs_diff_mean"] = stats["mean"] - stats["mean_c"]
-    stats["abs_diff_std"] = np.sqrt(stats["stderr"] ** 2 + stats["stderr_c"] ** 2)
-    stats["rel_diff_mean"] = stats["mean"] / stats["mean_c"] - 1
-
-    # see: https://arxiv.org/pdf/1803.06336.pdf
-    stats["rel_diff_std"] = (
-        np.sqrt((stats["stderr"] ** 2 + (stats["mean"] ** 2 / stats["mean_c"] ** 2) * stats["stderr_c"] ** 2))
-        / stats["mean_c"]
-    )
-    stats["t_value"] = stats["abs_diff_mean"] / stats["abs_diff_std"]
-    stats["dof"] = stats["abs_diff_std"] ** 4 / (
-        stats["stderr"] ** 4 / (stats["count"] - 1) + stats["stderr_c"] ** 4 / (stats["count_c"] - 1)
-    )
-    stats["p_value"] = stats.apply(
-        lambda x: ttest_ind_from_stats(
-            mean1=x["mean"],
-            std1=x["std"],
-            nobs1=x["count"],
-            mean2=x["mean_c"],
-            std2=x["std_c"],
-            nobs2=x["count_c"],
-            equal_var=False,
-        ).pvalue,
-        axis=1,
+    welch = welch_t_test(
+        mean=stats["mean"].to_numpy(),
+        stderr=stats["stderr"].to_numpy(),
+        count=stats["count"].to_numpy(),
+        mean_c=stats["mean_c"].to_numpy(),
+        stderr_c=stats["stderr_c"].to_numpy(),
+        count_c=stats["count_c"].to_numpy(),
     )
-    return stats
+    for col, values in welch.items():
+        stats[col] = values
+
+    return_cols = [col for col in stats.columns if col not in group_cols] + group_cols
+    return stats.loc[:, return_cols]
+
+
+def welch_t_test(
+    mean: np.ndarray,
+    stderr: np.ndarray,
+    count: np.ndarray,
+    mean_c: np.ndarray,
+    stderr_c: np.ndarray,
+    count_c: np.ndarray,
+) -> dict[str, np.ndarray]:
+    """calculate the impact compared with control group and Welch's t-test statistics on whole arrays.
+    Arrays of any (broadcastable) shape are accepted. e.g., (n_simulation, n_metric)
+
+    Parameters
+    ----------
+    mean, stderr, count : np.ndarray
+        mean, standard error of the mean and sample size of the treatment variant.
+    mean_c, stderr_c, count_c : np.ndarray
+        mean, standard error of the mean and sample size of the control variant.
+
+    Returns
+    -------
+    dict[str, np.ndarray]
+        "abs_diff_mean", "abs_diff_std", "rel_diff_mean", "rel_diff_std", "t_value", "dof" and "p_value".
+    """
+    with np.errstate(divide="ignore", invalid="ignore"):
+        abs_diff_mean = mean - mean_c
+        abs_diff_std = np.sqrt(stderr**2 + stderr_c**2)
+        # see: https://arxiv.org/pdf/1803.06336.pdf
+        rel_diff_std = np.sqrt(stderr**2 + (mean**2 / mean_c**2) * stderr_c**2) / mean_c
+        t_value = abs_diff_mean / abs_diff_std
+        dof = abs_diff_std**4 / (stderr**4 / (count - 1) + stderr_c**4 / (count_c - 1))
+        return {
+            "abs_diff_mean": abs_diff_mean,
+            "abs_diff_std": abs_diff_std,
+            "rel_diff_mean": mean / mean_c - 1,
+            "rel_diff_std": rel_diff_std,
+            "t_value": t_value,
+            "dof": dof,
+            "p_value": 2 * special.stdtr(dof, -np.abs(t_value)),
+        }
+
+
+def srm_test(
+    data: pd.DataFrame, group_cols: list[str], count_col: str = "count", ratio_col: Optional[str] = None
+) -> pd.DataFrame:
+    """apply chi-square goodness of fit test to detect Sample Ratio Mismatch on many groups at once.
+    e.g., every segment of every running experiment. All groups are tested in one pass without per-group loop.
+    See this paper to understand what the SRM is: https://dl.acm.org/doi/10.1145/3292500.3330722
+
+    Parameters
+    ----------
+    data : pd.DataFrame
+        A long DataFrame each row of which stores the sample size of a variant in a group.
+        e.g., columns of (experiment, segment, variant, count, expected_ratio)
+    group_cols : list[str]
+        Columns identifying the group (e.g., ["experiment", "segment"]), each group is tested independently.
+    count_col : str, optional
+        A column name stores the observed sample size of the variant, by default "count"
+    ratio_col : Optional[str], optional
+        A column name stores the planned allocation of the variant, by default None (equal allocation)
+        They don't have to sum up to 1 within a group, e.g., 1 and 4 mean 20% and 80% allocation.
+
+    Returns
+    -------
+    pd.DataFrame
+        A DataFrame has group columns, "n_variant", "count" (total), "chi_square", "dof" and "p_value" columns.
+        Groups are sorted by the group columns. The p-value of a group having only one variant is 1.
+    """
+    necessary_cols = group_cols + [count_col] + ([ratio_col] if ratio_col else [])
+    for col in necessary_cols:
+        if col in data.columns:
+            continue
+        raise ValueError(f"Necessary column does not exist: {col}")
+
+    count = data[count_col].to_numpy(dtype=np.float64)
+    ratio = np.ones_like(count) if ratio_col is None else data[ratio_col].to_numpy(dtype=np.float64)
+    if (count < 0).any():
+        raise ValueError("count should be non-negative.")
+    if not (ratio > 0).all():
+        raise ValueError("expected ratio should be positive.")
+
+    result, codes, size = _factorize_groups(data, group_cols)
+    n_group = result.shape[0]
+    n_variant = size[:n_group]
+    total = np.bincount(codes, weights=count, minlength=n_group + 1)
+    ratio_total = np.bincount(codes, weights=ratio, minlength=n_group + 1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        expected = total[codes] * ratio / ratio_total[codes]
+        deviation = np.where(expected > 0, (count - expected) ** 2 / expected, 0.0)
+    chi_square = np.bincount(codes, weights=deviation, minlength=n_group + 1)[:n_group]
+    dof = n_variant - 1
+
+    result["n_variant"] = n_variant
+    result["count"] = total[:n_group]
+    result["chi_square"] = chi_square
+    result["dof"] = dof
+    result["p_value"] = np.where(dof > 0, special.chdtrc(np.maximum(dof, 1), chi_square), 1.0)
+    return result
+
+
+def msprt_p_value(diff_mean: ArrayLike, diff_std: ArrayLike, tau: ArrayLike) -> np.ndarray:
+    """calculate always-valid p-values of the difference by the mixture Sequential Probability Ratio Test.
+    The normal mixture N(0, tau^2) over the difference is used, see: https://arxiv.org/abs/1512.04922
+    Unlike the p-value of t-test, the running minimum of them over looks stays valid under continuous monitoring.
+
+    Parameters
+    ----------
+    diff_mean : ArrayLike
+        estimated difference at the current look. (e.g., abs_diff_mean)
+    diff_std : ArrayLike
+        standard error of the estimated difference. (e.g., abs_diff_std)
+    tau : ArrayLike
+        standard deviation of the mixing distribution, in the same scale with the difference.
+        It should be close to the effect size expected.
+
+    Returns
+    -------
+    np.ndarray
+        always-valid p-values at the current look.
+    """
+    diff_mean, var, tau_sq = np.asarray(diff_mean), np.asarray(diff_std) ** 2, np.asarray(tau) ** 2
+    with np.errstate(divide="ignore", invalid="ignore"):
+        log_likelihood_ratio = 0.5 * np.log(var / (var + tau_sq)) + diff_mean**2 * tau_sq / (2 * var * (var + tau_sq))
+    return np.minimum(np.exp(-log_likelihood_ratio), 1.0)
+
+
+def confidence_sequence_width(diff_std: ArrayLike, tau: ArrayLike, alpha: ArrayLike = 0.05) -> np.ndarray:
+    """calculate the half width of the confidence sequence of the difference corresponding to msprt_p_value().
+    The interval covers the true difference at all looks simultaneously with probability 1 - alpha.
+
+    Parameters
+    ----------
+    diff_std : ArrayLike
+        standard error of the estimated difference. (e.g., abs_diff_std)
+    tau : ArrayLike
+        standard deviation of the mixing distribution, same as msprt_p_value().
+    alpha : ArrayLike, optional
+        significance level, by default 0.05
+
+    Returns
+    -------
+    np.ndarray
+        half width of the confidence sequence at the current look.
+    """
+    var, tau_sq, alpha_ = np.asarray(diff_std) ** 2, np.asarray(tau) ** 2, np.asarray(alpha)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.sqrt(var * (var + tau_sq) / tau_sq * (np.log((var + tau_sq) / var) - 2 * np.log(alpha_)))
+
+
+def ks_uniform_test(p_values: ArrayLike) -> tuple[np.ndarray, np.ndarray]:
+    """apply the two-sided Kolmogorov Smirnov test against the uniform distribution to each column at once.
+    Results are the same with scipy.stats.kstest(column, "uniform") of each column. Columns having NaN get NaN.
+
+    Parameters
+    ----------
+    p_values : ArrayLike
+        (n_sample, n_column) array of values in [0, 1]. e.g., p-values of simulated A/A tests for each metric.
+
+    Returns
+    -------
+    tuple[np.ndarray, np.ndarray]
+        KS statistics and p-values of each column.
+    """
+    from scipy.stats import kstwo
+
+    values = np.sort(np.asarray(p_values, dtype=np.float64), axis=0)
+    n = values.shape[0]
+    cdf = np.clip(values, 0.0, 1.0)
+    rank = np.arange(1, n + 1)[:, np.newaxis]
+    statistic = np.maximum((rank / n - cdf).max(axis=0), (cdf - (rank - 1) / n).max(axis=0))
+    statistic[np.isnan(values).any(axis=0)] = np.nan
+    return statistic, np.clip(kstwo.sf(statistic, n), 0.0, 1.0)
 
 
 def eval_ttest_significance(
@@ -104,16 +719,103 @@ def eval_ttest_significance(
             continue
         raise ValueError(f"Necessary column does not exist: {col}")
 
-    significance = ttest_stats.apply(
-        lambda x: (
-            "up"
-            if x["p_value"] <= p_threshold and x["t_value"] > 0
-            else "down" if x["p_value"] <= p_threshold and x["t_value"] < 0 else "unclear"
-        ),
-        axis=1,
+    p_value = ttest_stats["p_value"].to_numpy(dtype=np.float64)
+    t_value = ttest_stats["t_value"].to_numpy(dtype=np.float64)
+    significant = p_value <= p_threshold
+    significance = pd.Series(
+        np.select([significant & (t_value > 0), significant & (t_value < 0)], ["up", "down"], "unclear"),
+        index=ttest_stats.index,
+        dtype=object,
     )
 
-    abs_ci_width = t.ppf(1 - p_threshold / 2, ttest_stats["dof"].astype(np.float64)) * ttest_stats["abs_diff_std"]
-    rel_ci_width = t.ppf(1 - p_threshold / 2, ttest_stats["dof"].astype(np.float64)) * ttest_stats["rel_diff_std"]
+    t_critical = special.stdtrit(ttest_stats["dof"].to_numpy(dtype=np.float64), 1 - p_threshold / 2)
+    abs_ci_width = ttest_stats["abs_diff_std"] * t_critical
+    rel_ci_width = ttest_stats["rel_diff_std"] * t_critical
 
     return significance, abs_ci_width, rel_ci_width
+
+
+def calc_mde(
+    var: ArrayLike,
+    sample_size: ArrayLike,
+    alpha: ArrayLike = 0.05,
+    power: ArrayLike = 0.8,
+    ratio: ArrayLike = 1.0,
+    n_variant: ArrayLike = 2,
+    alternative: str = "two-sided",
+    bonferroni: bool = False,
+) -> np.ndarray:
+    """calculate the absolute Minimum Detectable Effect by the normal approximation.
+    All arguments are broadcast against each other, e.g., (n_metric, 1) variances and (n_scenario,) alphas.
+
+    Parameters
+    ----------
+    var : ArrayLike
+        variance of the metric per unit.
+    sample_size : ArrayLike
+        the number of units in the control variant.
+    alpha : ArrayLike, optional
+        significance level, by default 0.05
+    power : ArrayLike, optional
+        statistical power (1 - type II error rate), by default 0.8
+    ratio : ArrayLike, optional
+        allocation ratio, the number of units in each treatment variant divided by the control one, by default 1.0
+    n_variant : ArrayLike, optional
+        the number of variants including the control, by default 2
+    alternative : str, optional
+        "two-sided" or "one-sided", by default "two-sided"
+    bonferroni : bool, optional
+        whether to divide alpha by the number of comparisons (n_variant - 1), by default False
+
+    Returns
+    -------
+    np.ndarray
+        the smallest absolute difference detected with the specified power.
+    """
+    multiplier = _power_multiplier(alpha, power, n_variant, alternative, bonferroni)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return multiplier * np.sqrt(np.asarray(var) * (1 + 1 / np.asarray(ratio)) / np.asarray(sample_size))
+
+
+def calc_sample_size(
+    var: ArrayLike,
+    mde: ArrayLike,
+    alpha: ArrayLike = 0.05,
+    power: ArrayLike = 0.8,
+    ratio: ArrayLike = 1.0,
+    n_variant: ArrayLike = 2,
+    alternative: str = "two-sided",
+    bonferroni: bool = False,
+) -> np.ndarray:
+    """calculate the number of units in the control variant required to detect the absolute difference (mde).
+    It's the closed-form inversion of calc_mde(), and takes the same arguments except for mde.
+    The number of units in each treatment variant is the returned value multiplied by ratio.
+
+    Returns
+    -------
+    np.ndarray
+        required sample size of the control variant. (not rounded)
+    """
+    multiplier = _power_multiplier(alpha, power, n_variant, alternative, bonferroni)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return (multiplier / np.asarray(mde)) ** 2 * np.asarray(var) * (1 + 1 / np.asarray(ratio))
+
+
+def _power_multiplier(
+    alpha: ArrayLike, power: ArrayLike, n_variant: ArrayLike, alternative: str, bonferroni: bool
+) -> np.ndarray:
+    """return z_(1 - alpha') + z_(power), alpha' is alpha adjusted for the sides and the multiple comparisons."""
+    if alternative not in ["two-sided", "one-sided"]:
+        raise ValueError("Specified alternative is invalid.")
+    alpha_ = np.asarray(alpha, dtype=np.float64)
+    power_ = np.asarray(power, dtype=np.float64)
+    n_variant_ = np.asarray(n_variant, dtype=np.float64)
+    if ((alpha_ <= 0) | (alpha_ >= 1)).any() or ((power_ <= 0) | (power_ >= 1)).any():
+        raise ValueError("alpha and power should be in (0, 1).")
+    if (n_variant_ < 2).any():
+        raise ValueError("n_variant should be more than or equal 2.")
+    if bonferroni:
+        alpha_ = alpha_ / (n_variant_ - 1)
+    if alternative == "two-sided":
+        alpha_ = alpha_ / 2
+    return special.ndtri(1 - alpha_) + special.ndtri(power_)
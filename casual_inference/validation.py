@@ -0,0 +1,55 @@
+from typing import Optional, Union
+
+import pandas as pd
+
+from .native import NativeFrame, is_native_frame, is_unique
+
+
+def validate_unit_col(
+    data: Union[pd.DataFrame, NativeFrame],
+    unit_col: str,
+    assume_validated: bool = False,
+    experiment_col: Optional[str] = None,
+) -> None:
+    """check that the data has been aggregated by the randomization unit, i.e., unit_col is unique and not null.
+
+    Evaluators check it once at the beginning of each evaluation, then pass assume_validated=True to inner calls.
+    The result isn't recorded across calls, since the DataFrame can be modified in place between them.
+    When unit_col is sorted, the uniqueness is checked by comparing adjacent values in O(n) without hashing.
+
+    Parameters
+    ----------
+    data : Union[pd.DataFrame, pyarrow.Table, polars.DataFrame]
+        A DataFrame has randomization unit column. Arrow and Polars frames are checked by polars.
+    unit_col : str
+        A column name stores the randomization unit. something like user_id, session_id, ...
+    assume_validated : bool, optional
+        Skip the check for trusted inputs, e.g., units already aggregated by an upstream pipeline, by default False
+    experiment_col : Optional[str], optional
+        A column name stores the experiment, by default None
+        When it's specified, unit_col should be unique within each experiment, since a unit can join many experiments.
+
+    Raises
+    ------
+    ValueError
+        When the same randomization unit appears more than once.
+    """
+    if assume_validated:
+        return
+    if is_native_frame(data):
+        unique = is_unique(data, [experiment_col, unit_col] if experiment_col else [unit_col])
+    elif experiment_col is None:
+        unique = _is_unique(data[unit_col])
+    else:
+        keys = data[[experiment_col, unit_col]]
+        unique = not (keys.isna().any(axis=None) or keys.duplicated().any())
+    if not unique:
+        raise ValueError("passed dataframe hasn't been aggregated by the randomization unit.")
+
+
+def _is_unique(units: pd.Series) -> bool:
+    values = units.to_numpy()
+    if units.is_monotonic_increasing or units.is_monotonic_decreasing:
+        # monotonic columns have no null, and duplicates are adjacent.
+        return bool((values[1:] != values[:-1]).all())
+    return units.nunique() == values.shape[0]
@@ -1,7 +1,10 @@
+import pickle
+
+import numpy as np
 import pandas as pd
 import pytest
 
-from casual_inference.dataset import create_sample_ab_result
+from casual_inference.dataset import create_sample_ab_result, generate_ab_chunks
 from casual_inference.evaluator import ABTestEvaluator
 
 
@@ -63,6 +66,242 @@ class TestABTestEvaluator:
         else:
             assert stats[segment].nunique() == 5
 
+    def test_evaluate_multiple_segments(self, prepare_sample_data):
+        sample_data: pd.DataFrame = prepare_sample_data
+        metrics = ["metric_bin", "metric_cont"]
+        segments = ["segment_str", "segment_numer"]
+        evaluator = ABTestEvaluator().evaluate(
+            sample_data, unit_col="rand_unit", variant_col="variant", metrics=metrics, segment_col=segments
+        )
+        stats = evaluator.stats
+
+        for segment in segments:
+            single = ABTestEvaluator().evaluate(
+                sample_data, unit_col="rand_unit", variant_col="variant", metrics=metrics, segment_col=segment
+            )
+            partial = stats.loc[stats[segment].notna()].reset_index(drop=True)
+            assert partial["count"].sum() / len(metrics) == sample_data.shape[0]
+            np.testing.assert_allclose(partial["p_value"], single.stats["p_value"])
+        assert len(evaluator._diagnose_srm()) == (3 + 5) * 3
+        evaluator.summary_plot()
+
+    @pytest.mark.parametrize("segment", (None, "segment_str"))
+    def test_evaluate_from_stats(self, prepare_sample_data, segment):
+        sample_data: pd.DataFrame = prepare_sample_data
+        metrics = ["metric_bin", "metric_cont"]
+        group_cols = ["variant", segment] if segment else ["variant"]
+        sums = []
+        for metric in metrics:
+            agg = (
+                sample_data.assign(sq=sample_data[metric] ** 2)
+                .groupby(group_cols)
+                .agg(count=(metric, "count"), sum=(metric, "sum"), sum_sq=("sq", "sum"))
+                .reset_index()
+            )
+            agg["metric"] = metric
+            sums.append(agg)
+
+        expected = ABTestEvaluator().evaluate(
+            sample_data, unit_col="rand_unit", variant_col="variant", metrics=metrics, segment_col=segment
+        )
+        evaluator = ABTestEvaluator().evaluate_from_stats(pd.concat(sums), variant_col="variant", segment_col=segment)
+
+        sort_cols = group_cols + ["metric"]
+        actual_stats = evaluator.stats.sort_values(sort_cols).reset_index(drop=True)
+        expected_stats = expected.stats.sort_values(sort_cols).reset_index(drop=True)
+        assert list(actual_stats.columns) == list(expected_stats.columns)
+        for col in ["mean", "var", "count", "abs_diff_mean", "rel_diff_std", "p_value"]:
+            np.testing.assert_allclose(actual_stats[col], expected_stats[col], rtol=1e-6)
+        assert evaluator.summary_table().shape[0] == expected.summary_table().shape[0]
+
+    def test_evaluate_from_stats_without_control(self):
+        sums = pd.DataFrame({"variant": [2, 3], "metric": "m", "count": 10, "sum": 5.0, "sum_sq": 5.0})
+        with pytest.raises(ValueError):
+            ABTestEvaluator().evaluate_from_stats(sums)
+
+    def test_evaluate_chunks(self, prepare_sample_data):
+        sample_data: pd.DataFrame = prepare_sample_data
+        metrics = ["metric_bin", "metric_cont"]
+        chunks = (sample_data.iloc[i : i + 100000] for i in range(0, sample_data.shape[0], 100000))
+        evaluator = ABTestEvaluator().evaluate_chunks(
+            chunks, unit_col="rand_unit", variant_col="variant", metrics=metrics, segment_col="segment_str"
+        )
+        expected = ABTestEvaluator().evaluate(
+            sample_data, unit_col="rand_unit", variant_col="variant", metrics=metrics, segment_col="segment_str"
+        )
+
+        sort_cols = ["segment_str", "variant", "metric"]
+        actual_stats = evaluator.stats.sort_values(sort_cols).reset_index(drop=True)
+        expected_stats = expected.stats.sort_values(sort_cols).reset_index(drop=True)
+        for col in ["mean", "var", "count", "p_value"]:
+            np.testing.assert_allclose(actual_stats[col], expected_stats[col], rtol=1e-8)
+
+    def test_evaluate_ratio_metrics(self):
+        metrics = {"metric_cont": "count", "ctr": "ratio"}
+        sample_data = next(generate_ab_chunks(100000, n_variant=3, metrics=metrics, random_state=0))
+        ratio_metrics = {"ctr": ("ctr_num", "ctr_den")}
+        evaluator = ABTestEvaluator().evaluate(
+            sample_data, unit_col="rand_unit", metrics=["metric_cont"], ratio_metrics=ratio_metrics
+        )
+        stats = evaluator.stats
+
+        assert stats["metric"].tolist() == ["metric_cont"] * 3 + ["ctr"] * 3
+        ratio = stats.loc[stats["metric"] == "ctr"].set_index("variant")
+        sums = sample_data.groupby("variant")[["ctr_num", "ctr_den"]].sum()
+        np.testing.assert_allclose(ratio["mean"], sums["ctr_num"] / sums["ctr_den"])
+        assert set(evaluator.summary_table()["metric"]) == {"metric_cont", "ctr"}
+
+        # chunked evaluation, and evaluation from sums give the same result
+        chunks = (sample_data.iloc[i : i + 30000] for i in range(0, sample_data.shape[0], 30000))
+        chunked = ABTestEvaluator().evaluate_chunks(
+            chunks, unit_col="rand_unit", metrics=["metric_cont"], ratio_metrics=ratio_metrics
+        )
+        sample_data["ctr_xy"] = sample_data["ctr_num"] * sample_data["ctr_den"]
+        sample_data["ctr_num_sq"] = sample_data["ctr_num"] ** 2
+        sample_data["ctr_den_sq"] = sample_data["ctr_den"] ** 2
+        ratio_stats = (
+            sample_data.groupby("variant")
+            .agg(
+                count=("rand_unit", "count"),
+                sum_num=("ctr_num", "sum"),
+                sum_den=("ctr_den", "sum"),
+                sum_sq_num=("ctr_num_sq", "sum"),
+                sum_sq_den=("ctr_den_sq", "sum"),
+                sum_xy=("ctr_xy", "sum"),
+            )
+            .reset_index()
+            .assign(metric="ctr")
+        )
+        from_stats = ABTestEvaluator().evaluate_from_stats(
+            stats.loc[stats["metric"] == "metric_cont"], ratio_stats=ratio_stats
+        )
+        for other in [chunked.stats, from_stats.stats]:
+            for col in ["mean", "var", "count", "p_value"]:
+                np.testing.assert_allclose(other[col], stats[col], rtol=1e-8)
+
+    def test_evaluate_native_dtypes(self, prepare_sample_data):
+        sample_data: pd.DataFrame = prepare_sample_data
+        narrow_data = sample_data.astype({"variant": np.int8, "metric_bin": bool, "metric_cont": np.float32})
+        dtypes = narrow_data.dtypes.copy()
+        metrics = ["metric_bin", "metric_cont"]
+
+        evaluator = ABTestEvaluator().evaluate(
+            narrow_data, unit_col="rand_unit", metrics=metrics, segment_col="segment_str"
+        )
+        expected = ABTestEvaluator().evaluate(
+            sample_data, unit_col="rand_unit", metrics=metrics, segment_col="segment_str"
+        )
+
+        # the passed data isn't modified
+        pd.testing.assert_series_equal(narrow_data.dtypes, dtypes)
+        assert evaluator.stats["variant"].dtype == expected.stats["variant"].dtype
+        for col in ["mean", "var", "count", "p_value"]:
+            np.testing.assert_allclose(evaluator.stats[col], expected.stats[col], rtol=1e-10)
+
+    @pytest.mark.parametrize("segment", (None, ["segment_str", "segment_numer"]))
+    def test_evaluate_polars(self, segment):
+        pl = pytest.importorskip("polars")
+        metrics = {"metric_cont": "count", "ctr": "ratio"}
+        sample_data = next(generate_ab_chunks(100000, n_variant=3, metrics=metrics, random_state=0))
+        sample_data.loc[::7, "metric_cont"] = np.nan
+        native_data = pl.DataFrame({col: sample_data[col].to_numpy() for col in sample_data.columns})
+        params = {
+            "unit_col": "rand_unit",
+            "metrics": ["metric_cont"],
+            "segment_col": segment,
+            "ratio_metrics": {"ctr": ("ctr_num", "ctr_den")},
+        }
+
+        evaluator = ABTestEvaluator().evaluate(native_data, **params)
+        expected = ABTestEvaluator().evaluate(sample_data, **params)
+        pd.testing.assert_frame_equal(evaluator.stats, expected.stats, rtol=1e-9)
+        evaluator.summary_table()
+
+        with pytest.raises(ValueError):
+            ABTestEvaluator().evaluate(pl.concat([native_data, native_data.head(1)]), **params)
+
+    @pytest.mark.parametrize("segment", (None, "segment_str"))
+    def test_evaluate_experiments(self, segment):
+        # the same unit joins every experiment
+        experiments = [create_sample_ab_result(n_variant=3, sample_size=10000, random_state=i) for i in range(3)]
+        data = pd.concat(experiments, keys=["a", "b", "c"], names=["experiment", None]).reset_index(level=0)
+        metrics = ["metric_bin", "metric_cont"]
+        evaluator = ABTestEvaluator().evaluate(
+            data,
+            unit_col="rand_unit",
+            metrics=metrics,
+            segment_col=segment,
+            experiment_col="experiment",
+            experiment_metrics={"b": ["metric_cont"]},
+        )
+
+        for experiment, sample_data in zip(["a", "b", "c"], experiments):
+            expected = ABTestEvaluator().evaluate(
+                sample_data,
+                unit_col="rand_unit",
+                metrics=["metric_cont"] if experiment == "b" else metrics,
+                segment_col=segment,
+            )
+            stats = evaluator.stats.loc[evaluator.stats["experiment"] == experiment]
+            assert stats.shape[0] == expected.stats.shape[0]
+            for col in ["mean", "var", "count", "p_value"]:
+                np.testing.assert_allclose(stats[col], expected.stats[col])
+        assert len(evaluator._diagnose_srm()) == len(expected._diagnose_srm()) * 3
+        assert "experiment" in evaluator.summary_table().columns
+        evaluator.summary_plot(experiment="a")
+        with pytest.raises(ValueError):
+            evaluator.summary_plot()
+
+        # units are unique only within each experiment
+        with pytest.raises(ValueError):
+            ABTestEvaluator().evaluate(data, unit_col="rand_unit", metrics=metrics)
+
+    def test_update(self):
+        # users return across days, and their metrics are summed up.
+        rng = np.random.default_rng(0)
+        days = []
+        for _ in range(5):
+            users = rng.integers(0, 20000, size=10000)
+            day = pd.DataFrame({"user": users, "variant": users % 2 + 1, "segment": np.where(users % 3 == 0, "a", "b")})
+            day["clicks"] = rng.poisson(1.0 + 0.1 * (day["variant"] == 2))
+            days.append(day)
+
+        evaluator = ABTestEvaluator()
+        p_values, taus = [], []
+        for i, day in enumerate(days):
+            evaluator.update(day, unit_col="user", metrics=["clicks"], segment_col="segment")
+            p_values.append(evaluator.stats["sequential_p_value"].to_numpy())
+            taus.append(evaluator.sequential_tau_abs.copy())
+        # the evaluator can be persisted and continued
+        evaluator = pickle.loads(pickle.dumps(evaluator))
+        assert evaluator.unit_accumulator.n_units == pd.concat(days)["user"].nunique()
+        # the scale of the mixture is fixed at the first look, not chosen by the data of later looks
+        first_var = taus[0].merge(evaluator.stats, on=["variant", "segment", "metric"])
+        assert (taus[0]["tau_abs"] > 0).all()
+        for tau in taus[1:] + [evaluator.sequential_tau_abs]:
+            pd.testing.assert_frame_equal(tau, taus[0])
+        assert not np.allclose(
+            first_var["tau_abs"], 0.1 * np.sqrt((first_var["var"] + first_var["var_c"]) / 2), rtol=1e-6
+        )
+
+        cumulative = pd.concat(days).groupby(["user", "variant", "segment"], as_index=False)["clicks"].sum()
+        expected = ABTestEvaluator().evaluate(cumulative, unit_col="user", metrics=["clicks"], segment_col="segment")
+        for col in ["mean", "var", "count", "p_value"]:
+            np.testing.assert_allclose(evaluator.stats[col], expected.stats[col])
+
+        # the always-valid p-value never increases, and the confidence sequence is wider than the confidence interval
+        assert (np.diff(np.nan_to_num(p_values), axis=0) <= 0).all()
+        summary = evaluator.summary_table()
+        treatment = summary.loc[summary["variant"] == 2]
+        assert (treatment["sequential_p_value"] >= treatment["p_value"]).all()
+        width = treatment["ci_seq_abs_diff"].map(lambda x: x[1] - x[0]) / treatment["ci_abs_diff"].map(
+            lambda x: x[1] - x[0]
+        )
+        assert (width > 1).all()
+
+        with pytest.raises(ValueError):
+            evaluator.update(days[0], unit_col="user", metrics=["clicks"], segment_col="segment", sequential_tau=0.2)
+
     @pytest.mark.parametrize("p_threshold", (0.01, 0.05, 0.1))
     def test_summary_table(self, p_threshold, prepare_abtest_evaluator):
         evaluator: ABTestEvaluator = prepare_abtest_evaluator
@@ -83,6 +322,52 @@ class TestABTestEvaluator:
             .all()
         )
 
+    def test_summary_table_cache(self, prepare_sample_data, prepare_abtest_evaluator):
+        evaluator: ABTestEvaluator = prepare_abtest_evaluator
+        summary = evaluator.summary_table(p_threshold=0.05)
+        summary["significance"] = "modified"
+
+        # the cached summary isn't affected by the modification of the returned one
+        pd.testing.assert_frame_equal(
+            evaluator.summary_table(p_threshold=0.05).drop(columns="significance"), summary.drop(columns="significance")
+        )
+        assert (evaluator.summary_table(p_threshold=0.05)["significance"] != "modified").all()
+        summary = evaluator.summary_table(p_threshold=1.0)
+        assert (summary.loc[summary["variant"] > 1, "significance"] != "unclear").all()
+
+        # the cache is cleared by re-evaluation
+        evaluator.evaluate(prepare_sample_data, unit_col="rand_unit", metrics=["metric_bin"])
+        assert set(evaluator.summary_table(p_threshold=0.05)["metric"]) == {"metric_bin"}
+        moments = evaluator.stats.loc[:, ["variant", "metric", "mean", "var", "count"]].assign(metric="renamed")
+        evaluator.evaluate_from_stats(moments, variant_col="variant")
+        assert set(evaluator.summary_table(p_threshold=0.05)["metric"]) == {"renamed"}
+
+    def test_profile(self, prepare_sample_data):
+        sample_data: pd.DataFrame = prepare_sample_data
+        metrics = ["metric_bin", "metric_cont"]
+        records = []
+        evaluator = ABTestEvaluator()
+        evaluator.profile_callbacks.append(records.append)
+        evaluator.trace_memory = True
+        evaluator.evaluate(sample_data, unit_col="rand_unit", metrics=metrics, segment_col="segment_str")
+        evaluator.summary_table()
+
+        profile = evaluator.profile
+        assert profile["stage"].tolist() == ["validate", "aggregate", "t_test", "summary_table"]
+        assert [record.stage for record in records] == profile["stage"].tolist()
+        assert (profile["seconds"] >= 0).all() and (profile["peak_memory_mb"] > 0).all()
+        aggregate = profile.set_index("stage").loc["aggregate"]
+        assert (aggregate["rows"], aggregate["n_metric"]) == (sample_data.shape[0], 2)
+        assert aggregate["n_group"] == 4 * sample_data["segment_str"].nunique()
+
+        # records are reset by the next evaluation, and stages of nested evaluations are kept
+        evaluator.trace_memory = False
+        chunks = (sample_data.iloc[i : i + 500000] for i in range(0, sample_data.shape[0], 500000))
+        evaluator.evaluate_chunks(chunks, unit_col="rand_unit", metrics=metrics)
+        profile = evaluator.profile
+        assert profile["stage"].tolist() == ["validate", "accumulate"] * 2 + ["t_test"]
+        assert profile["peak_memory_mb"].isna().all()
+
     @pytest.mark.parametrize("diff_type", ("rel", "abs"))
     def test_summary_plot(self, diff_type, prepare_abtest_evaluator):
         evaluator: ABTestEvaluator = prepare_abtest_evaluator
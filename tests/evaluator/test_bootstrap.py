@@ -0,0 +1,43 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from casual_inference.dataset import create_sample_ab_result
+from casual_inference.evaluator import ABTestEvaluator, BootstrapEvaluator
+
+
+@pytest.fixture
+def prepare_sample_data() -> pd.DataFrame:
+    return create_sample_ab_result(n_variant=3, sample_size=20000, simulated_lift=[0.1, -0.1], random_state=0)
+
+
+def test_evaluate(prepare_sample_data):
+    sample_data = prepare_sample_data
+    metrics = ["metric_bin", "metric_cont"]
+    evaluator = BootstrapEvaluator(n_bootstrap=500, quantiles=[0.5], random_state=0).evaluate(
+        sample_data, "rand_unit", metrics
+    )
+    stats = evaluator.stats
+    assert stats.shape[0] == 2 * 2 * 2
+    assert set(stats["statistic"]) == {"mean", "q0.5"}
+    assert evaluator.abs_diff_replicates.shape == (stats.shape[0], 500)
+
+    # the point estimate and the bootstrap standard error of the mean agree with Welch's t-test.
+    welch = ABTestEvaluator().evaluate(sample_data, "rand_unit", metrics).stats
+    welch = welch.loc[welch["variant"] > 1].set_index(["variant", "metric"])
+    means = stats.loc[stats["statistic"] == "mean"].set_index(["variant", "metric"]).loc[welch.index]
+    assert np.allclose(means["abs_diff_mean"], welch["abs_diff_mean"])
+    assert np.allclose(means["abs_diff_std"], welch["abs_diff_std"], rtol=0.15)
+
+    table = evaluator.summary_table()
+    assert table["ci_abs_diff"].map(lambda ci: ci[0] <= ci[1]).all()
+    evaluator.summary_plot()
+
+
+def test_evaluate_reproducible(prepare_sample_data):
+    sample_data = prepare_sample_data
+    params = {"n_bootstrap": 50, "quantiles": [0.9], "block_size": 1000, "random_state": 0}
+    serial = BootstrapEvaluator(**params).evaluate(sample_data, "rand_unit", ["metric_cont"])
+    parallel = BootstrapEvaluator(n_jobs=2, **params).evaluate(sample_data, "rand_unit", ["metric_cont"])
+    pd.testing.assert_frame_equal(serial.stats, parallel.stats)
+    assert np.array_equal(serial.abs_diff_replicates, parallel.abs_diff_replicates)
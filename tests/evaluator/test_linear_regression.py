@@ -1,3 +1,4 @@
+import numpy as np
 import pandas as pd
 import pytest
 
@@ -28,6 +29,67 @@ class TestABTestEvaluator:
         assert evaluator.stats is not None
         assert len(evaluator.models) > 0
 
+    def test_evaluate_engines(self, prepare_sample_data):
+        sample_data: pd.DataFrame = prepare_sample_data.head(100000).copy()
+        sample_data["target_nan"] = sample_data["target"].where(sample_data.index % 4 != 0)
+        params = {
+            "unit_col": "unit",
+            "treatment_col": "treatment",
+            "metrics": ["target", "target_nan"],
+            "covariates": ["covar_numer1", "covar_numer2", "covar_cat"],
+        }
+        evaluator = LinearRegressionEvaluator().evaluate(sample_data, engine="numpy", **params)
+        expected = LinearRegressionEvaluator().evaluate(sample_data, engine="statsmodels", **params)
+
+        assert list(evaluator.stats.columns) == list(expected.stats.columns)
+        for metric in params["metrics"]:
+            model, expected_model = evaluator.models[metric], expected.models[metric]
+            assert model.nobs == expected_model.nobs
+            pd.testing.assert_series_equal(model.params, expected_model.params.loc[model.params.index])
+            pd.testing.assert_series_equal(model.bse, expected_model.bse.loc[model.bse.index])
+        np.testing.assert_allclose(evaluator.stats["coef"], expected.stats["coef"], atol=1e-4)
+
+    def test_evaluate_absorb(self, prepare_sample_data):
+        sample_data: pd.DataFrame = prepare_sample_data.head(100000).copy()
+        sample_data["covar_store"] = (sample_data.index % 97).astype(str)
+        params = {"unit_col": "unit", "treatment_col": "treatment", "metrics": ["target"]}
+        dense = LinearRegressionEvaluator().evaluate(
+            sample_data, covariates=["covar_numer1", "covar_numer2", "covar_cat", "covar_store"], **params
+        )
+        absorbed = LinearRegressionEvaluator().evaluate(
+            sample_data, covariates=["covar_numer1", "covar_numer2"], absorb=["covar_cat", "covar_store"], **params
+        )
+
+        assert list(absorbed.stats.columns) == list(dense.stats.columns)
+        np.testing.assert_allclose(absorbed.stats["coef"], dense.stats["coef"], rtol=1e-8)
+        np.testing.assert_allclose(absorbed.stats["std err"], dense.stats["std err"], rtol=1e-8)
+        with pytest.raises(ValueError):
+            LinearRegressionEvaluator().evaluate(sample_data, engine="statsmodels", absorb=["covar_cat"], **params)
+
+    def test_evaluate_absorb_disconnected(self, prepare_sample_data):
+        # levels of fe_a 0-4 are observed only with fe_b 0-2, and the others only with fe_b 3-5.
+        sample_data: pd.DataFrame = prepare_sample_data.head(200).copy()
+        index = np.arange(sample_data.shape[0])
+        sample_data["fe_a"] = (index % 10).astype(str)
+        sample_data["fe_b"] = ((index // 10) % 3 + 3 * (index % 10 >= 5)).astype(str)
+        absorbed = LinearRegressionEvaluator().evaluate(
+            sample_data,
+            unit_col="unit",
+            treatment_col="treatment",
+            metrics=["target"],
+            covariates=["covar_numer1"],
+            absorb=["fe_a", "fe_b"],
+        )
+
+        dummies = pd.get_dummies(sample_data[["fe_a", "fe_b"]]).astype(float)
+        x = np.column_stack([sample_data["treatment"], sample_data["covar_numer1"], dummies])
+        y = sample_data["target"].to_numpy()
+        coef, _, rank, _ = np.linalg.lstsq(x, y, rcond=None)
+        resid = y - x @ coef
+        std_err = np.sqrt(np.linalg.pinv(x.T @ x)[0, 0] * (resid @ resid) / (y.shape[0] - rank))
+        np.testing.assert_allclose(absorbed.stats["coef"], coef[0], rtol=1e-8)
+        np.testing.assert_allclose(absorbed.stats["std err"], std_err, rtol=1e-8)
+
     def test_summary_table(self, prepare_evaluator):
         evaluator: LinearRegressionEvaluator = prepare_evaluator
         summary = evaluator.summary_table()
@@ -0,0 +1,86 @@
+import pickle
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from casual_inference.accumulator import MomentAccumulator, UnitAccumulator
+from casual_inference.dataset import create_sample_ab_result
+from casual_inference.statistical_testing import aggregate_moments
+
+
+@pytest.fixture
+def prepare_sample_data() -> pd.DataFrame:
+    return create_sample_ab_result(n_variant=3, sample_size=100000)
+
+
+@pytest.mark.parametrize("group_cols", ([], ["variant"], ["variant", "segment_str"]))
+def test_update_chunks(prepare_sample_data, group_cols):
+    data: pd.DataFrame = prepare_sample_data
+    metrics = ["metric_bin", "metric_cont"]
+    accumulator = MomentAccumulator(group_cols, metrics)
+    accumulator.update_chunks(data.iloc[i : i + 7777] for i in range(0, data.shape[0], 7777))
+
+    expected = aggregate_moments(data, group_cols, metrics)
+    actual = accumulator.to_frame()
+    assert list(actual.columns) == list(expected.columns)
+    assert (actual[group_cols + ["metric"]] == expected[group_cols + ["metric"]]).all().all()
+    np.testing.assert_allclose(actual["mean"], expected["mean"], rtol=1e-10)
+    np.testing.assert_allclose(actual["var"], expected["var"], rtol=1e-10)
+    assert (actual["count"] == expected["count"]).all()
+
+
+def test_merge(prepare_sample_data):
+    data: pd.DataFrame = prepare_sample_data
+    metrics = ["metric_bin", "metric_cont"]
+    shards = [
+        MomentAccumulator(["variant"], metrics).update(data.loc[data["segment_str"] == s]) for s in ["1", "2", "3"]
+    ]
+    merged = shards[0].merge(shards[1]).merge(shards[2])
+
+    expected = aggregate_moments(data, ["variant"], metrics)
+    np.testing.assert_allclose(merged.to_frame()["var"], expected["var"], rtol=1e-10)
+    assert (merged.to_frame()["count"] == expected["count"]).all()
+
+    with pytest.raises(ValueError):
+        merged.merge(MomentAccumulator(["segment_str"], metrics))
+
+
+@pytest.mark.parametrize("group_cols", ([], ["variant"], ["variant", "segment_str"]))
+def test_unit_accumulator(prepare_sample_data, group_cols):
+    data: pd.DataFrame = prepare_sample_data
+    metrics = ["metric_bin", "metric_cont"]
+    # each unit appears in 3 increments, a third of its metrics for each
+    increments = [data.assign(metric_cont=data["metric_cont"] / 3).sample(frac=1.0, random_state=i) for i in range(3)]
+    accumulator = UnitAccumulator("rand_unit", group_cols, metrics)
+    for increment in increments:
+        accumulator.update(increment)
+
+    expected = aggregate_moments(data.assign(metric_bin=data["metric_bin"] * 3), group_cols, metrics)
+    actual = accumulator.to_frame()
+    assert accumulator.n_units == data.shape[0]
+    assert (actual[group_cols + ["metric"]] == expected[group_cols + ["metric"]]).all().all()
+    np.testing.assert_allclose(actual[["mean", "var"]], expected[["mean", "var"]], rtol=1e-10)
+    assert (actual["count"] == expected["count"]).all()
+
+    with pytest.raises(ValueError):
+        accumulator.update(
+            data.assign(variant=data["variant"] % 3 + 1) if group_cols else data.drop(columns="rand_unit")
+        )
+
+
+def test_unit_accumulator_new_units(prepare_sample_data):
+    data: pd.DataFrame = prepare_sample_data
+    # units arrive in overlapping windows, so every increment has both new and returning units
+    increments = [data.iloc[start : start + 3000] for start in range(0, data.shape[0], 1000)]
+    accumulator = UnitAccumulator("rand_unit", ["variant"], ["metric_cont"])
+    for i, increment in enumerate(increments):
+        accumulator.update(increment)
+        if i == len(increments) // 2:
+            accumulator = pickle.loads(pickle.dumps(accumulator))
+
+    expected = pd.concat(increments).groupby("rand_unit", sort=False)["metric_cont"].sum()
+    actual = accumulator.unit_sums()
+    assert accumulator.n_units == data.shape[0]
+    assert (actual.index == expected.index).all()
+    np.testing.assert_allclose(actual["metric_cont"], expected, rtol=1e-10)
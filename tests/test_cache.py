@@ -0,0 +1,100 @@
+import os
+
+import pandas as pd
+import pytest
+
+from casual_inference.cache import ResultCache, fingerprint
+from casual_inference.dataset import create_sample_ab_result
+from casual_inference.evaluator import (
+    AATestEvaluator,
+    ABTestEvaluator,
+    SampleSizeEvaluator,
+)
+
+
+@pytest.fixture
+def prepare_sample_data() -> pd.DataFrame:
+    return create_sample_ab_result(n_variant=3, sample_size=10000, simulated_lift=[0.01, 0.05])
+
+
+def test_fingerprint(prepare_sample_data):
+    sample_data: pd.DataFrame = prepare_sample_data
+    columns = ["rand_unit", "variant", "metric_bin"]
+    key = fingerprint(sample_data, columns, metrics=["metric_bin"])
+
+    # the index and columns not used don't affect the key
+    reindexed = sample_data[columns].set_axis(sample_data.index + 1, axis=0)
+    assert fingerprint(reindexed, columns, metrics=["metric_bin"]) == key
+    assert fingerprint(sample_data, columns, metrics=["metric_cont"]) != key
+    modified = sample_data.copy()
+    modified.loc[0, "metric_bin"] = 1 - modified.loc[0, "metric_bin"]
+    assert fingerprint(modified, columns, metrics=["metric_bin"]) != key
+
+
+def test_evaluate_cache(prepare_sample_data):
+    sample_data: pd.DataFrame = prepare_sample_data
+    cache = ResultCache()
+    params = dict(unit_col="rand_unit", metrics=["metric_bin", "metric_cont"], segment_col="segment_str")
+    expected = ABTestEvaluator().evaluate(sample_data, **params)
+
+    for hits in [0, 1]:
+        evaluator = ABTestEvaluator()
+        evaluator.result_cache = cache
+        evaluator.evaluate(sample_data, **params)
+        assert cache.hits == hits
+        pd.testing.assert_frame_equal(evaluator.stats, expected.stats)
+        assert evaluator.segment_col == "segment_str"
+    assert evaluator.profile["stage"].tolist() == ["cache_lookup"]
+
+    # the restored result is a copy of the cached one
+    evaluator.stats["p_value"] = 0.0
+    pd.testing.assert_frame_equal(evaluator.evaluate(sample_data, **params).stats, expected.stats)
+    # different evaluators and parameters don't share results
+    evaluator.evaluate(sample_data, **params | {"segment_col": None})
+    sample_size = SampleSizeEvaluator()
+    sample_size.result_cache = cache
+    sample_size.evaluate(sample_data, unit_col="rand_unit", metrics=["metric_bin"])
+    assert (cache.hits, cache.misses) == (2, 3)
+
+
+def test_aatest_cache(prepare_sample_data):
+    sample_data: pd.DataFrame = prepare_sample_data
+    cache = ResultCache()
+    for random_state, hits in [(0, 0), (0, 1), (None, 1), (None, 1)]:
+        evaluator = AATestEvaluator(n_simulation=100, random_state=random_state)
+        evaluator.result_cache = cache
+        evaluator.evaluate(sample_data, unit_col="rand_unit", metrics=["metric_bin"])
+        assert cache.hits == hits
+    assert len(cache) == 1
+
+
+def test_result_cache_eviction(tmp_path):
+    cache = ResultCache(max_entries=2, directory=str(tmp_path), max_disk_mb=2.5)
+    for i in range(3):
+        cache.put(f"key{i}", {"values": bytes(2**20)})
+        os.utime(tmp_path / f"key{i}.pkl", (i, i))
+    assert len(cache) == 2 and cache.get("key0") is None
+
+    # older files are removed from the disk, and the rest are restored by another cache
+    cache.put("key3", {"values": bytes(2**20)})
+    assert sorted(os.listdir(tmp_path)) == ["key2.pkl", "key3.pkl"]
+    another = ResultCache(directory=str(tmp_path))
+    assert another.get("key2") == {"values": bytes(2**20)}
+    another.clear()
+    assert len(another) == 0 and os.listdir(tmp_path) == []
+
+    with pytest.raises(ValueError):
+        ResultCache(max_entries=0)
+
+
+def test_result_cache_clear(prepare_sample_data):
+    sample_data: pd.DataFrame = prepare_sample_data
+    cache = ResultCache()
+    evaluator = ABTestEvaluator()
+    evaluator.result_cache = cache
+    evaluator.evaluate(sample_data, unit_col="rand_unit", metrics=["metric_bin"])
+    cache.clear()
+    assert len(cache) == 0
+
+    evaluator.evaluate(sample_data, unit_col="rand_unit", metrics=["metric_bin"])
+    assert (cache.hits, cache.misses) == (0, 2)
@@ -1,16 +1,28 @@
+import numpy as np
+import pandas as pd
 import pandas.api.types as pd_types
+import pytest
 
-from casual_inference.dataset import create_sample_ab_result, create_sample_biased
+from casual_inference.dataset import (
+    create_sample_ab_result,
+    create_sample_biased,
+    generate_ab_chunks,
+    generate_biased_chunks,
+    write_chunks,
+)
 
 
 def test_create_sample_ab_result():
     n_variant = 4
     sample_size = 1000
+    simulated_lift = [0.1, 0.2, 0.3]
 
     sample_data = create_sample_ab_result(
-        n_variant=n_variant, sample_size=sample_size, metric_base=0.01, simulated_lift=[0.1, 0.2, 0.3]
+        n_variant=n_variant, sample_size=sample_size, metric_base=0.01, simulated_lift=simulated_lift
     )
 
+    assert simulated_lift == [0.1, 0.2, 0.3]
+
     assert sample_data["variant"].nunique() == n_variant
     assert sample_data.shape[0] == sample_size
     assert sample_data["metric_bin"].min() == 0
@@ -33,3 +45,51 @@ def test_create_sample_biased():
     assert pd_types.is_numeric_dtype(sample_data["covar_numer1"])
     assert pd_types.is_numeric_dtype(sample_data["covar_numer2"])
     assert pd_types.is_numeric_dtype(sample_data["target"])
+
+
+def test_generate_ab_chunks():
+    metrics = {"bin": "binary", "count": "count", "heavy": "heavy_tailed", "zero": "zero_inflated", "ratio": "ratio"}
+    chunks = list(generate_ab_chunks(25000, chunk_size=10000, metrics=metrics, pre_period_corr=0.8, random_state=0))
+    sample_data = pd.concat(chunks, ignore_index=True)
+
+    assert [chunk.shape[0] for chunk in chunks] == [10000, 10000, 5000]
+    assert (sample_data["rand_unit"] == np.arange(25000)).all()
+    for col in ["bin", "count", "heavy", "zero", "ratio_num", "ratio_den"]:
+        assert col in sample_data.columns
+        assert f"{col}_pre" in sample_data.columns
+    assert (sample_data["zero"] == 0).mean() == pytest.approx(0.8, abs=0.02)
+    assert (sample_data["ratio_num"] <= sample_data["ratio_den"]).all()
+    assert sample_data[["heavy", "heavy_pre"]].corr(method="spearman").iloc[0, 1] > 0.5
+
+    # reproducible with the same seed
+    pd.testing.assert_frame_equal(
+        chunks[0], next(generate_ab_chunks(25000, 10000, metrics=metrics, pre_period_corr=0.8, random_state=0))
+    )
+    biased = pd.concat(generate_biased_chunks(25000, chunk_size=10000, random_state=0), ignore_index=True)
+    pd.testing.assert_frame_equal(
+        biased, pd.concat(generate_biased_chunks(25000, 10000, random_state=0), ignore_index=True)
+    )
+
+
+def test_write_chunks(tmp_path):
+    path = str(tmp_path / "sample.npy")
+    write_chunks(generate_ab_chunks(25000, chunk_size=10000, random_state=0), path, n_rows=25000)
+
+    written = pd.DataFrame(np.load(path, mmap_mode="r"))
+    expected = pd.concat(generate_ab_chunks(25000, chunk_size=10000, random_state=0), ignore_index=True)
+    pd.testing.assert_frame_equal(written.astype({"segment_str": object}), expected)
+
+    with pytest.raises(ValueError):
+        write_chunks(generate_ab_chunks(25000, chunk_size=10000, random_state=0), path, n_rows=20000)
+
+
+def test_write_chunks_parquet(tmp_path):
+    try:
+        import pyarrow.parquet  # noqa: F401
+    except ImportError:
+        pytest.skip("pyarrow is not available.")
+    path = str(tmp_path / "sample.parquet")
+    write_chunks(generate_ab_chunks(25000, chunk_size=10000, random_state=0), path)
+
+    expected = pd.concat(generate_ab_chunks(25000, chunk_size=10000, random_state=0), ignore_index=True)
+    pd.testing.assert_frame_equal(pd.read_parquet(path), expected)
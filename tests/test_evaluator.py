@@ -1,3 +1,4 @@
+import numpy as np
 import pytest
 
 from casual_inference.dataset import create_sample_ab_result
@@ -25,6 +26,42 @@ class TestAATestEvaluator:
         evaluator: AATestEvaluator = prepare_aatest_evaluator
         assert evaluator.stats is not None
 
+    @pytest.mark.parametrize("sample_rate", (1.0, 0.5))
+    def test_evaluate_blocks(self, sample_rate):
+        sample_data = create_sample_ab_result(n_variant=2, sample_size=10000, simulated_lift=[0.0])
+        sample_data["metric_nan"] = sample_data["metric_cont"].where(sample_data.index % 3 != 0)
+        metrics = ["metric_bin", "metric_nan"]
+        evaluator = AATestEvaluator(n_simulation=25, sample_rate=sample_rate, memory_budget_mb=1.0)
+        stats = evaluator.evaluate(sample_data, unit_col="rand_unit", metrics=metrics).stats
+
+        assert stats.shape[0] == 25 * len(metrics)
+        assert evaluator.results["p_value"].shape == (25, len(metrics))
+        assert (stats["idx"].unique() == range(25)).all()
+        assert stats["p_value"].between(0.0, 1.0).all()
+        expected_count = sample_data["metric_nan"].count() * sample_rate / 2
+        count = stats.loc[stats["metric"] == "metric_nan", "count"]
+        assert count.between(expected_count * 0.9, expected_count * 1.1).all()
+
+    def test_evaluate_reproducible(self):
+        sample_data = create_sample_ab_result(n_variant=2, sample_size=10000, simulated_lift=[0.0])
+        metrics = ["metric_bin", "metric_cont"]
+        results = [
+            AATestEvaluator(n_simulation=20, random_state=0, **params).evaluate(sample_data, "rand_unit", metrics).stats
+            for params in [{}, {"memory_budget_mb": 0.5}, {"memory_budget_mb": 0.5, "n_jobs": 2}]
+        ]
+
+        for stats in results[1:]:
+            assert (stats["count"] == results[0]["count"]).all()
+            np.testing.assert_allclose(stats["p_value"], results[0]["p_value"], rtol=1e-9)
+        other_seed = AATestEvaluator(n_simulation=20, random_state=1).evaluate(sample_data, "rand_unit", metrics)
+        assert not (other_seed.stats["count"] == results[0]["count"]).all()
+
+        # narrow dtypes give the same result, without modifying the passed data
+        narrow_data = sample_data.astype({"metric_bin": np.int8, "metric_cont": np.float32})
+        narrow = AATestEvaluator(n_simulation=20, random_state=0).evaluate(narrow_data, "rand_unit", metrics)
+        assert narrow_data["metric_cont"].dtype == np.float32
+        np.testing.assert_allclose(narrow.stats["p_value"], results[0]["p_value"], rtol=1e-9)
+
     def test_summary_table(self, prepare_aatest_evaluator):
         evaluator: AATestEvaluator = prepare_aatest_evaluator
         summary = evaluator.summary_table()
@@ -37,6 +74,13 @@ class TestAATestEvaluator:
         assert "significance" in summary.columns
         assert (summary["ks_pvalue"] > 0).all()
         assert (summary["ksstat"] > 0).all()
+        assert list(summary["metric"]) == sorted(evaluator.metrics)
+
+        # summaries are aggregated from results once, and copies are returned
+        summary["ksstat"] = 0
+        assert (evaluator.summary_table()["ksstat"] > 0).all()
+        expected = evaluator.stats.groupby("metric")["p_value"].std()
+        np.testing.assert_allclose(evaluator.summary_table()[("p_value", "std")], expected)
 
     def test_summary_plot(self, prepare_aatest_evaluator):
         evaluator: AATestEvaluator = prepare_aatest_evaluator
@@ -61,6 +105,17 @@ class TestSampleSizeEvaluator:
         assert stats["mde_abs"].min() > 0
         assert stats["mde_rel"].max() <= 1.0 or stats["mde_rel"].min() > 0.0
 
+    def test_evaluate_chunks(self, prepare_samplesize_evaluator):
+        expected: SampleSizeEvaluator = prepare_samplesize_evaluator
+        sample_data = create_sample_ab_result(n_variant=2, sample_size=100000, simulated_lift=[0.0])
+        chunks = (sample_data.iloc[i : i + 30000] for i in range(0, sample_data.shape[0], 30000))
+        evaluator = SampleSizeEvaluator().evaluate_chunks(chunks, unit_col="rand_unit", metrics=["metric_bin"])
+        stats = evaluator.stats
+
+        assert list(stats.columns) == list(expected.stats.columns)
+        assert stats["count"].max() == sample_data.shape[0]
+        np.testing.assert_allclose(stats["var"], sample_data["metric_bin"].var())
+
     @pytest.mark.parametrize("target_mde", (0.03, 0.05, 0.1))
     def test_summary_table(self, target_mde, prepare_samplesize_evaluator):
         evaluator: SampleSizeEvaluator = prepare_samplesize_evaluator
@@ -68,6 +123,20 @@ class TestSampleSizeEvaluator:
         assert summary.shape[0] == evaluator.stats["metric"].nunique()
         assert (summary["mde_rel"] < target_mde).all()
 
+    def test_summary_scenarios(self, prepare_samplesize_evaluator):
+        evaluator: SampleSizeEvaluator = prepare_samplesize_evaluator
+        scenarios = evaluator.summary_scenarios(alpha=[0.01, 0.05], power=0.8, ratio=[[1.0], [2.0]], target_mde=0.05)
+        assert scenarios.shape[0] == evaluator.stats["metric"].nunique() * 4
+
+        # the default scenario at full traffic equals the last row of the threshold grid
+        default = scenarios.loc[(scenarios["alpha"] == 0.05) & (scenarios["ratio"] == 1.0)].set_index("metric")
+        full = evaluator.stats.loc[evaluator.stats["threshold"] == evaluator.stats["threshold"].max()].set_index(
+            "metric"
+        )
+        np.testing.assert_allclose(default["mde_abs"], full.loc[default.index, "mde_abs"])
+        # the required threshold achieves the target MDE exactly
+        np.testing.assert_allclose(default["required_threshold"] ** -0.5 * default["mde_rel"], 0.05, rtol=1e-9)
+
     def test_summary_plot(self, prepare_samplesize_evaluator):
         evaluator: SampleSizeEvaluator = prepare_samplesize_evaluator
         g = evaluator.summary_plot(target_mde=0.03)
@@ -0,0 +1,15 @@
+import subprocess
+import sys
+
+import pytest
+
+
+@pytest.mark.parametrize(
+    "module", ["casual_inference.evaluator", "casual_inference.evaluator.abtest", "casual_inference.dataset"]
+)
+def test_import_without_heavy_modules(module):
+    # plotly, statsmodels and scipy.stats are imported lazily by methods using them.
+    code = f"import sys; import {module}; print('\\n'.join(sys.modules))"
+    loaded = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True).stdout.split()
+    for heavy in ["plotly", "statsmodels", "scipy.stats"]:
+        assert not any(name == heavy or name.startswith(f"{heavy}.") for name in loaded), heavy
@@ -0,0 +1,65 @@
+import sqlite3
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from casual_inference.dataset import generate_ab_chunks
+from casual_inference.evaluator import ABTestEvaluator, SampleSizeEvaluator
+from casual_inference.sql import build_stats_query, query_stats
+
+
+@pytest.fixture
+def prepare_sample_data() -> pd.DataFrame:
+    metrics = {"metric_bin": "binary", "metric_cont": "count", "ctr": "ratio"}
+    sample_data = next(generate_ab_chunks(20000, n_variant=3, metrics=metrics, random_state=0))
+    sample_data["experiment"] = np.where(sample_data["rand_unit"] % 2 == 0, "a", "b")
+    sample_data.loc[::7, "metric_cont"] = np.nan
+    return sample_data
+
+
+@pytest.fixture
+def prepare_connection(prepare_sample_data) -> sqlite3.Connection:
+    connection = sqlite3.connect(":memory:")
+    prepare_sample_data.to_sql("experiment_users", connection, index=False)
+    return connection
+
+
+@pytest.mark.parametrize(
+    "params", ({}, {"segment_col": "segment_str"}, {"experiment_col": "experiment", "segment_col": "segment_str"})
+)
+def test_query_stats(prepare_sample_data, prepare_connection, params):
+    metrics = ["metric_bin", "metric_cont"]
+    ratio_metrics = {"ctr": ("ctr_num", "ctr_den")}
+    stats, ratio_stats = query_stats(
+        prepare_connection, "experiment_users", "rand_unit", metrics, ratio_metrics=ratio_metrics, **params
+    )
+    assert stats.shape[1] == len(params) + 5
+    evaluator = ABTestEvaluator().evaluate_from_stats(stats, ratio_stats=ratio_stats, **params)
+    expected = ABTestEvaluator().evaluate(
+        prepare_sample_data, "rand_unit", metrics, ratio_metrics=ratio_metrics, **params
+    )
+
+    keys = [col for col in ["experiment", "segment_str", "metric", "variant"] if col in expected.stats.columns]
+    stats = evaluator.stats.sort_values(keys).reset_index(drop=True)
+    expected_stats = expected.stats.sort_values(keys).reset_index(drop=True)
+    assert (stats["count"] == expected_stats["count"]).all()
+    for col in ["mean", "var", "p_value"]:
+        np.testing.assert_allclose(stats[col], expected_stats[col], rtol=1e-8)
+
+
+def test_query_stats_samplesize(prepare_sample_data, prepare_connection):
+    stats, _ = query_stats(
+        prepare_connection, "experiment_users", "rand_unit", ["metric_cont"], variant_col=None, where="variant = 1"
+    )
+    evaluator = SampleSizeEvaluator().evaluate_from_stats(stats)
+    control = prepare_sample_data.loc[prepare_sample_data["variant"] == 1]
+    expected = SampleSizeEvaluator().evaluate(control, "rand_unit", ["metric_cont"])
+    pd.testing.assert_frame_equal(evaluator.stats, expected.stats)
+
+
+def test_query_stats_validation(prepare_connection):
+    with pytest.raises(ValueError):
+        query_stats(prepare_connection, "experiment_users", "variant", ["metric_bin"], variant_col=None)
+    query_stats(prepare_connection, "experiment_users", "variant", ["metric_bin"], assume_validated=True)
+    assert 'SUM(CAST("a""b" AS FLOAT64))' in build_stats_query("t", "unit", ['a"b'], float_type="FLOAT64")
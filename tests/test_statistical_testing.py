@@ -1,9 +1,21 @@
 import numpy as np
 import pandas as pd
 import pytest
+from scipy.stats import chisquare, kstest, ttest_ind_from_stats
 
 from casual_inference.dataset import create_sample_ab_result
-from casual_inference.statistical_testing import eval_ttest_significance, t_test
+from casual_inference.statistical_testing import (
+    aggregate_comoments,
+    aggregate_moments,
+    calc_mde,
+    calc_sample_size,
+    confidence_sequence_width,
+    eval_ttest_significance,
+    ks_uniform_test,
+    msprt_p_value,
+    srm_test,
+    t_test,
+)
 
 
 @pytest.fixture
@@ -54,6 +66,68 @@ def test_t_test(prepare_sample_data):
     assert (np.sign(ttest_stats["abs_diff_mean"]) == np.sign(ttest_stats["t_value"])).all()
 
 
+def test_t_test_matches_scipy(prepare_sample_data):
+    data: pd.DataFrame = prepare_sample_data
+    ttest_stats = t_test(data=data, unit_col="rand_unit", variant_col="variant", metrics=["metric_bin", "metric_cont"])
+
+    for _, row in ttest_stats.iterrows():
+        expected = ttest_ind_from_stats(
+            mean1=row["mean"],
+            std1=row["std"],
+            nobs1=row["count"],
+            mean2=row["mean_c"],
+            std2=row["std_c"],
+            nobs2=row["count_c"],
+            equal_var=False,
+        )
+        assert row["t_value"] == pytest.approx(expected.statistic, nan_ok=True)
+        assert row["p_value"] == pytest.approx(expected.pvalue)
+
+
+def test_aggregate_moments_with_missing_values(prepare_sample_data):
+    data: pd.DataFrame = prepare_sample_data.head(10000).copy()
+    data["metric_cont"] = data["metric_cont"].astype(np.float64) + 1e6
+    data.loc[data.index % 7 == 0, "metric_cont"] = np.nan
+    moments = aggregate_moments(data, ["variant", "segment_str"], ["metric_bin", "metric_cont"])
+
+    grouped = data.groupby(["variant", "segment_str"])["metric_cont"]
+    expected = grouped.agg(["mean", "var", "count"]).reset_index()
+    actual = moments.loc[moments["metric"] == "metric_cont"].reset_index(drop=True)
+    assert (actual[["variant", "segment_str"]] == expected[["variant", "segment_str"]]).all().all()
+    np.testing.assert_allclose(actual["mean"], expected["mean"], rtol=1e-12)
+    np.testing.assert_allclose(actual["var"], expected["var"], rtol=1e-9)
+    assert (actual["count"] == expected["count"]).all()
+
+
+def test_aggregate_comoments(prepare_sample_data):
+    data: pd.DataFrame = prepare_sample_data
+    data = data.assign(metric_num=data["metric_cont"].where(data.index % 5 != 0), metric_den=data["metric_cont"] + 1)
+    comoments = aggregate_comoments(data, ["variant"], {"ratio": ("metric_num", "metric_den")})
+
+    for _, row in comoments.iterrows():
+        subset = data.loc[data["variant"] == row["variant"], ["metric_num", "metric_den"]].dropna()
+        assert row["count"] == subset.shape[0]
+        np.testing.assert_allclose(row[["mean_num", "mean_den"]].astype(float), subset.mean())
+        np.testing.assert_allclose(row["cov"], subset.cov().iloc[0, 1])
+        np.testing.assert_allclose(row[["var_num", "var_den"]].astype(float), subset.var())
+
+
+@pytest.mark.parametrize("alternative", ("two-sided", "one-sided"))
+def test_calc_mde(alternative):
+    var = np.array([[1.0], [4.0]])
+    alpha = np.array([0.01, 0.05, 0.1])
+    mde = calc_mde(var, 1000, alpha=alpha, power=0.8, ratio=2.0, n_variant=3, alternative=alternative, bonferroni=True)
+    assert mde.shape == (2, 3)
+    # doubled standard deviation needs doubled MDE, and a looser alpha detects smaller effect.
+    np.testing.assert_allclose(mde[1] / mde[0], 2.0)
+    assert (np.diff(mde, axis=1) < 0).all()
+
+    sample_size = calc_sample_size(
+        var, mde, alpha=alpha, power=0.8, ratio=2.0, n_variant=3, alternative=alternative, bonferroni=True
+    )
+    np.testing.assert_allclose(sample_size, 1000)
+
+
 @pytest.mark.parametrize("p_threshold", (0.001, 0.01, 0.05, 0.1))
 def test_eval_ttest_significance(prepare_sample_data, p_threshold):
     data: pd.DataFrame = prepare_sample_data
@@ -74,3 +148,54 @@ def test_eval_ttest_significance(prepare_sample_data, p_threshold):
     assert (ttest_stats.loc[ttest_stats["significance"] == "up", "rel_ci_lower"] > 0).all()
     assert (ttest_stats.loc[ttest_stats["significance"] == "down", "abs_ci_upper"] < 0).all()
     assert (ttest_stats.loc[ttest_stats["significance"] == "down", "rel_ci_upper"] < 0).all()
+
+
+def test_srm_test():
+    rng = np.random.default_rng(0)
+    n_experiment = 200
+    # experiments have 2 to 4 variants, and the control variant has doubled allocation.
+    data = pd.DataFrame(
+        [
+            (experiment, segment, variant, 2.0 if variant == 1 else 1.0)
+            for experiment in range(n_experiment)
+            for segment in ["a", "b"]
+            for variant in range(1, 2 + experiment % 3 + 1)
+        ],
+        columns=["experiment", "segment", "variant", "expected_ratio"],
+    )
+    data["count"] = rng.poisson(1000 * data["expected_ratio"])
+    result = srm_test(data, ["experiment", "segment"], ratio_col="expected_ratio")
+
+    assert result.shape[0] == n_experiment * 2
+    for experiment, segment in [(0, "a"), (1, "b"), (2, "a")]:
+        group = data.loc[(data["experiment"] == experiment) & (data["segment"] == segment)]
+        ratio = group["expected_ratio"] / group["expected_ratio"].sum()
+        chi_square, p_value = chisquare(group["count"], group["count"].sum() * ratio)
+        row = result.loc[(result["experiment"] == experiment) & (result["segment"] == segment)].iloc[0]
+        assert row["n_variant"] == group.shape[0]
+        np.testing.assert_allclose([row["chi_square"], row["p_value"]], [chi_square, p_value])
+
+    # the equal allocation is assumed without ratio_col, so the doubled control is detected.
+    assert (srm_test(data, ["experiment", "segment"])["p_value"] < 0.001).all()
+
+
+def test_msprt_p_value():
+    diff_mean = np.linspace(-1.0, 1.0, 101)
+    p_value = msprt_p_value(diff_mean, diff_std=0.2, tau=0.5)
+    width = confidence_sequence_width(diff_std=0.2, tau=0.5, alpha=0.05)
+
+    assert ((p_value > 0) & (p_value <= 1)).all()
+    # the confidence sequence excludes 0 exactly when the always-valid p-value is under alpha
+    np.testing.assert_array_equal(p_value <= 0.05, np.abs(diff_mean) >= width)
+
+
+def test_ks_uniform_test():
+    p_values = np.random.default_rng(0).uniform(size=(200, 3)) ** np.array([1.0, 1.5, 0.8])
+    p_values[0, 2] = np.nan
+    statistic, p_value = ks_uniform_test(p_values)
+
+    for j in range(2):
+        expected = kstest(p_values[:, j], "uniform")
+        assert statistic[j] == pytest.approx(expected.statistic)
+        assert p_value[j] == pytest.approx(expected.pvalue)
+    assert np.isnan(statistic[2]) and np.isnan(p_value[2])
@@ -0,0 +1,53 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from casual_inference.dataset import create_sample_ab_result
+from casual_inference.evaluator import ABTestEvaluator
+from casual_inference.validation import validate_unit_col
+
+
+@pytest.mark.parametrize(
+    "units,valid",
+    [
+        (np.arange(10), True),
+        (np.arange(10)[::-1], True),
+        (np.random.permutation(10), True),
+        (np.array([0, 1, 1, 2]), False),
+        (np.array([2, 0, 1, 0]), False),
+        (np.array([0.0, 1.0, np.nan]), False),
+        (np.array(["a", "b", "c"], dtype=object), True),
+        (np.array(["a", "b", "b"], dtype=object), False),
+    ],
+)
+@pytest.mark.parametrize("backend", ["pandas", "polars"])
+def test_validate_unit_col(units, valid, backend):
+    if backend == "polars":
+        pl = pytest.importorskip("polars")
+        data = pl.DataFrame({"unit": units.tolist()})
+    else:
+        data = pd.DataFrame({"unit": units})
+    if valid:
+        validate_unit_col(data, "unit")
+    else:
+        with pytest.raises(ValueError):
+            validate_unit_col(data, "unit")
+        # trusted inputs skip the check
+        validate_unit_col(data, "unit", assume_validated=True)
+
+
+def test_validate_modified_in_place():
+    data = create_sample_ab_result(n_variant=2, sample_size=1000)
+    evaluator = ABTestEvaluator().evaluate(data, unit_col="rand_unit", metrics=["metric_bin"])
+
+    # the unit column is checked again by the next evaluation, even on the same DataFrame
+    data["rand_unit"] = 7
+    with pytest.raises(ValueError):
+        evaluator.evaluate(data, unit_col="rand_unit", metrics=["metric_bin"])
+
+
+def test_validate_unit_col_within_experiment():
+    data = pd.DataFrame({"experiment": [1, 1, 2, 2], "unit": [0, 1, 0, 1]})
+    validate_unit_col(data, "unit", experiment_col="experiment")
+    with pytest.raises(ValueError):
+        validate_unit_col(data, "unit")